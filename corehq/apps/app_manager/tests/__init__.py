@@ -15,6 +15,7 @@ try:
     from corehq.apps.app_manager.tests.test_brief_view import *
     from .test_get_questions import *
     from .test_repeater import *
+    from .test_download import *
 except ImportError, e:
     # for some reason the test harness squashes these so log them here for clarity
     # otherwise debugging is a pain
@@ -0,0 +1,101 @@
+from datetime import datetime
+from StringIO import StringIO
+from django.http import StreamingHttpResponse
+from django.test import TestCase
+from django.test.client import RequestFactory
+from django.utils.http import http_date
+from corehq.util.download import parse_byte_range, _is_not_modified, conditional_file_response
+
+CONTENT = '0123456789'
+ETAG = 'abc123'
+BUILT_ON = datetime(2013, 10, 1, 12, 0)
+BUILT_ON_TIMESTAMP = 1380628800
+
+
+class ParseByteRangeTest(TestCase):
+
+    def test_ranges(self):
+        self.assertEqual((0, 4), parse_byte_range('bytes=0-4', 10))
+        self.assertEqual((5, 9), parse_byte_range('bytes=5-', 10))
+        self.assertEqual((7, 9), parse_byte_range('bytes=-3', 10))
+        self.assertEqual((0, 9), parse_byte_range('bytes=-30', 10))
+        # the end is clamped to the length
+        self.assertEqual((2, 9), parse_byte_range('bytes=2-100', 10))
+
+    def test_ignored(self):
+        for header in [None, '', 'bytes=-', 'items=0-4', 'bytes=0-1,3-4', 'bytes=a-b']:
+            self.assertEqual(None, parse_byte_range(header, 10))
+
+    def test_unsatisfiable(self):
+        for header in ['bytes=10-', 'bytes=5-2', 'bytes=-0']:
+            self.assertRaises(ValueError, parse_byte_range, header, 10)
+
+
+class IsNotModifiedTest(TestCase):
+
+    def _request(self, **headers):
+        return RequestFactory().get('/', **headers)
+
+    def test_etag(self):
+        self.assertTrue(_is_not_modified(self._request(HTTP_IF_NONE_MATCH='"a", "b"'), '"b"', None))
+        self.assertTrue(_is_not_modified(self._request(HTTP_IF_NONE_MATCH='*'), '"b"', None))
+        self.assertFalse(_is_not_modified(self._request(HTTP_IF_NONE_MATCH='"a"'), '"b"', None))
+
+    def test_etag_takes_precedence(self):
+        request = self._request(HTTP_IF_NONE_MATCH='"a"',
+                                HTTP_IF_MODIFIED_SINCE=http_date(BUILT_ON_TIMESTAMP))
+        self.assertFalse(_is_not_modified(request, '"b"', BUILT_ON))
+
+    def test_modified_since(self):
+        self.assertTrue(_is_not_modified(
+            self._request(HTTP_IF_MODIFIED_SINCE=http_date(BUILT_ON_TIMESTAMP)), '"b"', BUILT_ON))
+        self.assertFalse(_is_not_modified(
+            self._request(HTTP_IF_MODIFIED_SINCE=http_date(BUILT_ON_TIMESTAMP - 1)), '"b"', BUILT_ON))
+        # nothing to compare against
+        self.assertFalse(_is_not_modified(
+            self._request(HTTP_IF_MODIFIED_SINCE=http_date(BUILT_ON_TIMESTAMP)), '"b"', None))
+        self.assertFalse(_is_not_modified(self._request(), '"b"', BUILT_ON))
+
+
+class ConditionalFileResponseTest(TestCase):
+
+    def _response(self, last_modified=None, **headers):
+        request = RequestFactory().get('/', **headers)
+        response = StreamingHttpResponse(mimetype='application/xml')
+        return conditional_file_response(request, response, StringIO(CONTENT),
+                                         etag=ETAG, last_modified=last_modified)
+
+    def test_full(self):
+        response = self._response(last_modified=BUILT_ON)
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
+        self.assertEqual(CONTENT, ''.join(response.streaming_content))
+        self.assertEqual('10', response['Content-Length'])
+        self.assertEqual('"%s"' % ETAG, response['ETag'])
+        self.assertEqual('bytes', response['Accept-Ranges'])
+        self.assertEqual(http_date(BUILT_ON_TIMESTAMP), response['Last-Modified'])
+
+    def test_no_last_modified(self):
+        self.assertFalse(self._response().has_header('Last-Modified'))
+
+    def test_partial(self):
+        response = self._response(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(206, response.status_code)
+        self.assertEqual('2345', ''.join(response.streaming_content))
+        self.assertEqual('bytes 2-5/10', response['Content-Range'])
+        self.assertEqual('4', response['Content-Length'])
+
+    def test_stale_if_range(self):
+        response = self._response(HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"other"')
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(CONTENT, ''.join(response.streaming_content))
+
+    def test_not_modified(self):
+        response = self._response(HTTP_IF_NONE_MATCH='"%s"' % ETAG, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('', ''.join(response.streaming_content))
+
+    def test_unsatisfiable(self):
+        response = self._response(HTTP_RANGE='bytes=20-')
+        self.assertEqual(416, response.status_code)
+        self.assertEqual('bytes */10', response['Content-Range'])
@@ -26,7 +26,7 @@ from corehq.apps.app_manager.templatetags.xforms_extras import trans
 from corehq.apps.sms.views import get_sms_autocomplete_context
 from django.utils.http import urlencode as django_urlencode
 from couchdbkit.exceptions import ResourceConflict
-from django.http import HttpResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden
+from django.http import HttpResponse, Http404, HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
 from unidecode import unidecode
 from django.http import HttpResponseRedirect
 from django.core.urlresolvers import reverse, RegexURLResolver
@@ -44,6 +44,7 @@ from corehq.apps.domain.models import Domain
 from corehq.apps.domain.views import DomainViewMixin
 from corehq.apps.translations import system_text as st_trans
 from corehq.util.compression import decompress
+from corehq.util.download import conditional_file_response
 from couchexport.export import FormattedRow, export_raw
 from couchexport.models import Format
 from couchexport.shortcuts import export_response
@@ -53,6 +54,7 @@ from dimagi.utils.couch.resource_conflict import retry_resource
 from corehq.apps.app_manager.xform import XFormError, XFormValidationError, CaseError,\
     XForm
 from corehq.apps.builds.models import CommCareBuildConfig, BuildSpec
+from corehq.apps.hqmedia.tasks import queue_build_media_zip
 from corehq.apps.users.decorators import require_permission
 from corehq.apps.users.models import Permissions, CommCareUser
 from dimagi.utils.decorators.memoized import memoized
@@ -1634,12 +1636,15 @@ def save_copy(req, domain, app_id):
 
     if not errors:
         try:
+            previous_version = app.get_latest_app(released_only=False)
             copy = app.make_build(
                 comment=comment,
                 user_id=req.couch_user.get_id,
-                previous_version=app.get_latest_app(released_only=False)
+                previous_version=previous_version
             )
             copy.save(increment_version=False)
+            if getattr(copy, 'multimedia_map', None):
+                queue_build_media_zip(domain, copy._id, previous_version and previous_version._id)
         finally:
             # To make a RemoteApp always available for building
             if app.is_remote_app():
@@ -1766,7 +1771,7 @@ def download_file(req, domain, app_id, path):
         mimetype = mimetype_map[path.split('.')[-1]]
     except KeyError:
         mimetype = None
-    response = HttpResponse(mimetype=mimetype)
+    response = StreamingHttpResponse(mimetype=mimetype)
 
     if path in ('CommCare.jad', 'CommCare.jar'):
         set_file_download(response, path)
@@ -1785,14 +1790,12 @@ def download_file(req, domain, app_id, path):
             if type(payload) is unicode:
                 payload = payload.encode('utf-8')
             buffer = StringIO(payload)
-            metadata = {'content_type': mimetype}
+            metadata = {'content_type': mimetype, 'etag': hashlib.md5(payload).hexdigest()}
             obj.cache_put(buffer, metadata, timeout=0)
         else:
-            _, buffer = obj.get()
-            payload = buffer.getvalue()
-        response.write(payload)
-        response['Content-Length'] = len(response.content)
-        return response
+            metadata, buffer = obj.get()
+        return conditional_file_response(req, response, buffer, etag=metadata.get('etag'),
+                                         last_modified=req.app.built_on)
     except (ResourceNotFound, AssertionError):
         if req.app.copy_of:
             if req.META.get('HTTP_USER_AGENT') == 'bitlybot':
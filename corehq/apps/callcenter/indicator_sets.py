@@ -1,15 +1,16 @@
 from datetime import date, timedelta
-from couchdbkit.exceptions import MultipleResultsFound
+from django.core.cache import cache
 from sqlagg.columns import SumColumn, SimpleColumn, SumWhen, CountUniqueColumn
 from sqlagg import filters
 from corehq.apps.callcenter.utils import MAPPING_NAME_FORMS, MAPPING_NAME_CASES, MAPPING_NAME_CASE_OWNERSHIP
-from corehq.apps.hqcase.utils import get_case_by_domain_hq_user_id
+from corehq.apps.hqcase.utils import get_case_ids_by_domain_hq_user_ids
 from corehq.apps.reportfixtures.indicator_sets import SqlIndicatorSet
 from corehq.apps.reports.sqlreport import DatabaseColumn, AggregateColumn
 from corehq.apps.users.models import CommCareUser
 from dimagi.utils.decorators.memoized import memoized
 
 NO_CASE_TAG = 'NO CASE'
+CACHE_TIMEOUT = 36 * 60 * 60
 TYPE_DURATION = 'duration'
 TYPE_SUM = 'sum'
 
@@ -54,6 +55,35 @@ class CallCenter(SqlIndicatorSet):
     """
     name = 'call-center'
 
+    def __init__(self, domain, user, reference_date=None):
+        super(CallCenter, self).__init__(domain, user)
+        self.reference_date = reference_date or date.today()
+
+    @property
+    def cache_key(self):
+        return 'callcenter-indicators-%s-%s' % (self.domain.name, self.reference_date.isoformat())
+
+    @property
+    @memoized
+    def data(self):
+        """
+        The indicators don't depend on the user, so they are computed once
+        per domain per day (see tasks.calculate_indicators) and shared by
+        every restore.
+        """
+        data = cache.get(self.cache_key)
+        if data is None:
+            data = self.compute_data()
+        return data
+
+    def compute_data(self):
+        data = super(CallCenter, self).data
+        # nothing is returned when the domain's tables are missing, which
+        # shouldn't stick for the rest of the day once they've been created
+        if data:
+            cache.set(self.cache_key, data, CACHE_TIMEOUT)
+        return data
+
     @property
     def table_name(self):
         return '%s_%s' % (self.domain.name, MAPPING_NAME_FORMS)
@@ -65,11 +95,11 @@ class CallCenter(SqlIndicatorSet):
     @property
     def filter_values(self):
         return {
-            'today': date.today(),
-            'weekago': date.today() - timedelta(days=7),
-            '2weekago': date.today() - timedelta(days=14),
-            '30daysago': date.today() - timedelta(days=30),
-            '60daysago': date.today() - timedelta(days=60),
+            'today': self.reference_date,
+            'weekago': self.reference_date - timedelta(days=7),
+            '2weekago': self.reference_date - timedelta(days=14),
+            '30daysago': self.reference_date - timedelta(days=30),
+            '60daysago': self.reference_date - timedelta(days=60),
             'ccCaseType': self.domain.call_center_config.case_type,
         }
 
@@ -167,16 +197,18 @@ class CallCenter(SqlIndicatorSet):
         results = CommCareUser.by_domain(self.domain.name)
         return [[r.get_id] for r in results]
 
+    @property
+    @memoized
+    def user_case_ids(self):
+        return get_case_ids_by_domain_hq_user_ids(self.domain.name, [key[0] for key in self.keys])
+
     def get_user_case_id(self, user_id):
-        try:
-            case = get_case_by_domain_hq_user_id(self.domain.name, user_id)
-            if case:
-                return case['id']
-            else:
-                # No case for this user so return a tag instead to enable removing this
-                # row from the results
-                return NO_CASE_TAG
-        except MultipleResultsFound:
+        case_ids = self.user_case_ids.get(user_id, [])
+        if len(case_ids) == 1:
+            return case_ids[0]
+        else:
+            # No case (or more than one) for this user so return a tag instead
+            # to enable removing this row from the results
             return NO_CASE_TAG
 
     def include_row(self, key, row):
@@ -0,0 +1,36 @@
+import logging
+from celery.schedules import crontab
+from celery.task import periodic_task
+from couchdbkit.exceptions import ResourceNotFound
+from django.conf import settings
+from corehq.apps.callcenter.indicator_sets import CallCenter
+from corehq.apps.domain.models import Domain
+from corehq.elastic import es_query
+
+logger = logging.getLogger(__name__)
+
+
+def get_call_center_domains():
+    result = es_query(params={
+        'call_center_config.enabled': True,
+        'is_active': True,
+        'is_snapshot': False
+    }, q={'fields': ['name']})
+    return [hit['_id'] for hit in result.get('hits', {}).get('hits', [])]
+
+
+@periodic_task(run_every=crontab(minute=0, hour=0), queue=getattr(settings, 'CELERY_PERIODIC_QUEUE', 'celery'))
+def calculate_indicators():
+    """
+    Precompute the call center indicators for every call center domain
+    so that the first restores of the day don't have to.
+    """
+    for domain_id in get_call_center_domains():
+        try:
+            domain = Domain.get(domain_id)
+            if domain.call_center_config.enabled:
+                CallCenter(domain, None).compute_data()
+        except ResourceNotFound:
+            logger.error("Couldn't find domain %s while calculating call center indicators", domain_id)
+        except Exception:
+            logger.exception("Error calculating call center indicators for domain %s", domain_id)
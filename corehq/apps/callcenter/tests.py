@@ -0,0 +1,85 @@
+from datetime import date
+from couchdbkit.exceptions import ResourceNotFound
+from django.test import TestCase
+import mock
+from corehq.apps.callcenter import indicator_sets, tasks
+from corehq.apps.callcenter.indicator_sets import CallCenter, CACHE_TIMEOUT
+from corehq.apps.reportfixtures.indicator_sets import SqlIndicatorSet
+
+DOMAIN = 'callcenter-test'
+INDICATORS = {'user_case1': {'formsSubmittedWeek0': 3}}
+
+
+def _domain(name=DOMAIN, enabled=True):
+    domain = mock.Mock()
+    domain.name = name
+    domain.call_center_config.enabled = enabled
+    return domain
+
+
+class CallCenterCacheTest(TestCase):
+
+    def setUp(self):
+        self.indicator_set = CallCenter(_domain(), None, reference_date=date(2013, 1, 2))
+
+    def test_cache_key(self):
+        self.assertEqual('callcenter-indicators-callcenter-test-2013-01-02', self.indicator_set.cache_key)
+        # a new key every day
+        self.assertNotEqual(self.indicator_set.cache_key,
+                            CallCenter(_domain(), None, reference_date=date(2013, 1, 3)).cache_key)
+
+    def test_cached(self):
+        with mock.patch.object(indicator_sets, 'cache') as cache, \
+                mock.patch.object(SqlIndicatorSet, 'data', property(lambda self: self.fail('not cached'))):
+            cache.get.return_value = INDICATORS
+            self.assertEqual(INDICATORS, self.indicator_set.data)
+        cache.get.assert_called_once_with(self.indicator_set.cache_key)
+
+    def test_computed(self):
+        with mock.patch.object(indicator_sets, 'cache') as cache, \
+                mock.patch.object(SqlIndicatorSet, 'data', property(lambda self: INDICATORS)):
+            cache.get.return_value = None
+            self.assertEqual(INDICATORS, self.indicator_set.data)
+        cache.set.assert_called_once_with(self.indicator_set.cache_key, INDICATORS, CACHE_TIMEOUT)
+
+    def test_empty_not_cached(self):
+        # e.g. the domain's sql tables don't exist yet
+        with mock.patch.object(indicator_sets, 'cache') as cache, \
+                mock.patch.object(SqlIndicatorSet, 'data', property(lambda self: {})):
+            self.assertEqual({}, self.indicator_set.compute_data())
+        self.assertFalse(cache.set.called)
+
+
+class CalculateIndicatorsTest(TestCase):
+
+    def test_calculate_indicators(self):
+        domains = {
+            'enabled': _domain('enabled'),
+            'disabled': _domain('disabled', enabled=False),
+            'broken': _domain('broken'),
+            'enabled2': _domain('enabled2'),
+        }
+
+        def _get(domain_id):
+            if domain_id not in domains:
+                raise ResourceNotFound
+            return domains[domain_id]
+
+        def _call_center(domain, user):
+            indicator_set = mock.Mock()
+            if domain.name == 'broken':
+                indicator_set.compute_data.side_effect = Exception('no such table')
+            computed.append(domain.name)
+            return indicator_set
+
+        computed = []
+        with mock.patch.object(tasks, 'get_call_center_domains',
+                               return_value=['enabled', 'missing', 'disabled', 'broken', 'enabled2']), \
+                mock.patch.object(tasks.Domain, 'get', side_effect=_get), \
+                mock.patch.object(tasks, 'CallCenter', side_effect=_call_center), \
+                mock.patch.object(tasks, 'logger') as logger:
+            tasks.calculate_indicators()
+        # errors in one domain don't stop the rest
+        self.assertEqual(['enabled', 'broken', 'enabled2'], computed)
+        self.assertEqual(1, logger.error.call_count)
+        self.assertEqual(1, logger.exception.call_count)
@@ -15,6 +15,7 @@ from corehq import Domain
 from corehq.apps.commtrack import const
 from corehq.apps.consumption.shortcuts import get_default_consumption
 from corehq.apps.hqcase.utils import submit_case_blocks
+from corehq.apps.ota.instrumentation import instrumented_fixture_generator
 from corehq.apps.users.models import CommCareUser
 from dimagi.utils.couch.loosechange import map_reduce
 from couchforms.models import XFormInstance
@@ -162,6 +163,7 @@ class Product(Document):
         return [row['id'] for row in view_results]
 
 
+@instrumented_fixture_generator
 def product_fixture_generator(user, version, last_sync):
     if not user.domain:
         return []
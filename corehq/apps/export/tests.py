@@ -0,0 +1,112 @@
+from django.test import TestCase
+import mock
+from corehq.apps.export import transforms
+from corehq.apps.export.transforms import prefetch_transforms, clear_transform_caches, \
+    user_id_to_username, owner_id_to_display, case_id_to_case_name, _column_path
+
+USER_TRANSFORM = 'corehq.apps.export.transforms.user_id_to_username'
+OWNER_TRANSFORM = 'corehq.apps.export.transforms.owner_id_to_display'
+CASE_TRANSFORM = 'corehq.apps.export.transforms.case_id_to_case_name'
+
+COUCH_DOCS = {
+    'user1': {'_id': 'user1', 'doc_type': 'CommCareUser', 'username': 'one@domain.commcarehq.org'},
+    'group1': {'_id': 'group1', 'doc_type': 'Group', 'name': 'Group One'},
+}
+
+
+class FakeCase(dict):
+
+    @property
+    def get_id(self):
+        return self['_id']
+
+CASES = {
+    'case1': FakeCase(_id='case1', name='Case One'),
+    'case2': FakeCase(_id='case2', name='Case Two'),
+}
+
+
+def _column(index, transform=None):
+    return mock.Mock(index=index, transform=transform)
+
+
+def _table(index, columns):
+    return mock.Mock(index=index, columns=columns)
+
+
+def _form(user_id, owner_id, children):
+    return {'form': {'meta': {'userID': user_id}, 'owner': owner_id, 'child': children}}
+
+
+EXPORT = mock.Mock(tables=[
+    _table('#', [
+        _column('form.meta.userID', USER_TRANSFORM),
+        _column('form.owner', OWNER_TRANSFORM),
+    ]),
+    _table('#.form.child.#', [
+        _column('case_id', CASE_TRANSFORM),
+        _column('name'),
+    ]),
+])
+
+
+class PrefetchTransformsTest(TestCase):
+
+    def setUp(self):
+        clear_transform_caches()
+        self.patches = [
+            mock.patch.object(transforms.CouchUser, 'get_db'),
+            mock.patch.object(transforms, 'iter_docs',
+                              side_effect=lambda db, ids: [COUCH_DOCS[id] for id in ids if id in COUCH_DOCS]),
+            mock.patch.object(transforms.CommCareCase, 'bulk_get_lite',
+                              side_effect=lambda ids: [CASES[id] for id in ids if id in CASES]),
+            # the per-id lookups, which shouldn't be needed after a prefetch
+            mock.patch.object(transforms, 'cached_user_id_to_username', return_value='fallback'),
+            mock.patch.object(transforms, '_cached_owner_id_to_display', return_value='fallback'),
+            mock.patch.object(transforms, '_cached_case_id_to_case_name', return_value='fallback'),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        clear_transform_caches()
+
+    def test_column_path(self):
+        self.assertEqual(['form', 'meta', 'userID'], _column_path(EXPORT.tables[0], EXPORT.tables[0].columns[0]))
+        self.assertEqual(['form', 'child', 'case_id'], _column_path(EXPORT.tables[1], EXPORT.tables[1].columns[0]))
+        # a column index that is already a full path
+        self.assertEqual(['form', 'owner'], _column_path(EXPORT.tables[1], _column('#.form.owner')))
+
+    def test_prefetch(self):
+        prefetch_transforms(EXPORT, [
+            # a repeat with several entries, and one with a single entry
+            _form('user1', 'group1', [{'case_id': 'case1'}, {'case_id': 'case2'}]),
+            _form('demo_user', 'user1', {'case_id': 'missing-case'}),
+        ])
+        self.assertEqual('one', user_id_to_username('user1', None))
+        self.assertEqual('demo_user', user_id_to_username('demo_user', None))
+        self.assertEqual('Group One', owner_id_to_display('group1', None))
+        self.assertEqual('one', owner_id_to_display('user1', None))
+        self.assertEqual('Case One', case_id_to_case_name('case1', None))
+        self.assertEqual('Case Two', case_id_to_case_name('case2', None))
+        # ids that don't exist are cached too
+        self.assertEqual(None, case_id_to_case_name('missing-case', None))
+        self.assertFalse(transforms.cached_user_id_to_username.called)
+        self.assertFalse(transforms._cached_owner_id_to_display.called)
+        self.assertFalse(transforms._cached_case_id_to_case_name.called)
+
+    def test_only_missing_ids_fetched(self):
+        prefetch_transforms(EXPORT, [_form('user1', None, [])])
+        prefetch_transforms(EXPORT, [_form('user1', None, [{'case_id': 'case1'}])])
+        self.assertEqual([['user1']], [call[0][1] for call in transforms.iter_docs.call_args_list])
+        transforms.CommCareCase.bulk_get_lite.assert_called_once_with(['case1'])
+
+    def test_fallback_after_clear(self):
+        prefetch_transforms(EXPORT, [_form('user1', None, [{'case_id': 'case1'}])])
+        clear_transform_caches()
+        self.assertEqual('fallback', user_id_to_username('user1', None))
+        self.assertEqual('fallback', case_id_to_case_name('case1', None))
+        transforms.cached_user_id_to_username.assert_called_once_with('user1')
+        transforms._cached_case_id_to_case_name.assert_called_once_with('case1')
@@ -1,21 +1,41 @@
+from collections import defaultdict
 from couchdbkit import ResourceNotFound
 from django.core.cache import cache
 from casexml.apps.case.models import CommCareCase
 from corehq.apps.users.cases import get_wrapped_owner
 from corehq.apps.users.models import CouchUser
 from corehq.apps.users.util import cached_user_id_to_username, raw_username
+from corehq.util.lru import LRUCache
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch.database import iter_docs
 
 """
 Module for transforms used in exports.
+
+Bulk exports call prefetch_transforms for each chunk of docs, which fills
+bounded in-process caches that the transforms check before looking up a
+single id, and clear_transform_caches when they're done.
 """
 
+_missing = object()
+_usernames = LRUCache(maxsize=10000)
+_owner_names = LRUCache(maxsize=10000)
+_case_names = LRUCache(maxsize=50000)
+
+
+def _lookup(lru, id, fn):
+    ret = lru.get(id, _missing) if id else _missing
+    if ret is _missing:
+        ret = fn(id)
+    return ret
+
 
 def user_id_to_username(user_id, doc):
-    return cached_user_id_to_username(user_id)
+    return _lookup(_usernames, user_id, cached_user_id_to_username)
 
 
 def owner_id_to_display(owner_id, doc):
-    return _cached_owner_id_to_display(owner_id)
+    return _lookup(_owner_names, owner_id, _cached_owner_id_to_display)
 
 
 def _cached_owner_id_to_display(owner_id):
@@ -32,7 +52,7 @@ def _cached_owner_id_to_display(owner_id):
         return ret
 
 def case_id_to_case_name(case_id, doc):
-    return _cached_case_id_to_case_name(case_id)
+    return _lookup(_case_names, case_id, _cached_case_id_to_case_name)
 
 NULL_CACHE_VALUE = "___NULL_CACHE_VAL___"
 def _cached_case_id_to_case_name(case_id):
@@ -47,3 +67,84 @@ def _cached_case_id_to_case_name(case_id):
         ret = None
     cache.set(key, ret)
     return ret
+
+
+def _bulk_usernames(user_ids):
+    usernames = dict.fromkeys(user_ids)
+    if 'demo_user' in usernames:
+        usernames['demo_user'] = 'demo_user'
+    for doc in iter_docs(CouchUser.get_db(), user_ids):
+        usernames[doc['_id']] = raw_username(doc['username']) if 'username' in doc else None
+    return usernames
+
+
+def _bulk_owner_names(owner_ids):
+    owner_names = dict.fromkeys(owner_ids)
+    for doc in iter_docs(CouchUser.get_db(), owner_ids):
+        if doc['doc_type'] in ('CommCareUser', 'WebUser'):
+            owner_names[doc['_id']] = raw_username(doc['username'])
+        elif doc['doc_type'] == 'Group':
+            owner_names[doc['_id']] = doc.get('name')
+    return owner_names
+
+
+def _bulk_case_names(case_ids):
+    case_names = dict.fromkeys(case_ids)
+    for ids in chunked(case_ids, 100):
+        for case in CommCareCase.bulk_get_lite(list(ids)):
+            case_names[case.get_id] = case['name'] if "name" in case else None
+    return case_names
+
+
+# transform => (in-process cache, fn resolving a list of ids to {id: value})
+BULK_TRANSFORMS = {
+    'corehq.apps.export.transforms.user_id_to_username': (_usernames, _bulk_usernames),
+    'corehq.apps.export.transforms.owner_id_to_display': (_owner_names, _bulk_owner_names),
+    'corehq.apps.export.transforms.case_id_to_case_name': (_case_names, _bulk_case_names),
+}
+
+
+def _column_path(table, column):
+    index = column.index if column.index.startswith('#') else '%s.%s' % (table.index, column.index)
+    return [part for part in index.split('.') if part != '#']
+
+
+def _values_at(node, path):
+    if isinstance(node, list):
+        for child in node:
+            for value in _values_at(child, path):
+                yield value
+    elif not path:
+        if isinstance(node, basestring):
+            yield node
+    elif isinstance(node, dict):
+        for value in _values_at(node.get(path[0]), path[1:]):
+            yield value
+
+
+def prefetch_transforms(export_object, docs):
+    """
+    Resolves every id that the export's transform columns will look up
+    for `docs` with a few bulk queries, so exporting those docs costs a
+    few queries per chunk rather than one or two per row.
+    """
+    ids_by_transform = defaultdict(set)
+    for table in getattr(export_object, 'tables', None) or []:
+        for column in table.columns:
+            transform = getattr(column, 'transform', None)
+            if transform in BULK_TRANSFORMS:
+                path = _column_path(table, column)
+                for doc in docs:
+                    ids_by_transform[transform].update(_values_at(doc, path))
+
+    for transform, ids in ids_by_transform.items():
+        lru, bulk_fn = BULK_TRANSFORMS[transform]
+        missing_ids = [id for id in ids if id and id not in lru]
+        if missing_ids:
+            for id, value in bulk_fn(missing_ids).items():
+                lru.set(id, value)
+
+
+def clear_transform_caches():
+    for lru, bulk_fn in BULK_TRANSFORMS.values():
+        lru.clear()
@@ -0,0 +1,161 @@
+import uuid
+from collections import defaultdict
+from django.core import cache
+from django.core.cache import InvalidCacheBackendError
+from corehq.util.lru import LRUCache
+from dimagi.utils.couch.database import get_db
+
+FIXTURE_CACHE_TIMEOUT = 24 * 60 * 60
+VERSION_KEY = 'fixtures-version-%(domain)s'
+DATA_TYPES_KEY = 'fixtures-%(domain)s-%(version)s-data-types'
+ITEM_LIST_KEY = 'fixtures-%(domain)s-%(version)s-item-list-%(data_type_id)s'
+ITEM_KEY = 'fixtures-%(domain)s-%(version)s-item-%(item_id)s'
+OWNERSHIP_KEY = 'fixtures-%(domain)s-%(version)s-ownership-%(revision)s'
+OWNERSHIP_REVISION_KEY = 'fixtures-%(domain)s-%(version)s-ownership-revision'
+
+
+def get_fixture_cache():
+    """
+    Global item lists can be far bigger than memcached allows,
+    so use redis where it's configured.
+    """
+    try:
+        return cache.get_cache('redis')
+    except (InvalidCacheBackendError, ValueError):
+        return cache.cache
+
+
+def get_fixture_version(domain):
+    """
+    The version stamp that every cached fixture payload for the domain is
+    keyed by. Bumping it (or losing it from the cache) invalidates them all.
+    """
+    fixture_cache = get_fixture_cache()
+    key = VERSION_KEY % {'domain': domain}
+    version = fixture_cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        fixture_cache.set(key, version, FIXTURE_CACHE_TIMEOUT)
+    return version
+
+
+def bump_fixture_version(domain):
+    get_fixture_cache().set(VERSION_KEY % {'domain': domain}, uuid.uuid4().hex, FIXTURE_CACHE_TIMEOUT)
+
+
+class FixtureCache(object):
+    """
+    Serialized fixture payloads for one domain at its current version.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.version = get_fixture_version(domain)
+        self.cache = get_fixture_cache()
+
+    def _key(self, template, **kwargs):
+        kwargs.update(domain=self.domain, version=self.version)
+        return template % kwargs
+
+    def get_data_types(self):
+        return self.cache.get(self._key(DATA_TYPES_KEY))
+
+    def set_data_types(self, data_types_json):
+        self.cache.set(self._key(DATA_TYPES_KEY), data_types_json, FIXTURE_CACHE_TIMEOUT)
+
+    def get_item_list(self, data_type_id):
+        return self.cache.get(self._key(ITEM_LIST_KEY, data_type_id=data_type_id))
+
+    def set_item_list(self, data_type_id, xml):
+        self.cache.set(self._key(ITEM_LIST_KEY, data_type_id=data_type_id), xml, FIXTURE_CACHE_TIMEOUT)
+
+    def get_items(self, item_ids):
+        """
+        item_id => (data_type_id, sort_key, xml) for the items that are cached
+        """
+        keys = dict([(self._key(ITEM_KEY, item_id=item_id), item_id) for item_id in item_ids])
+        cached = self.cache.get_many(keys.keys())
+        return dict([(keys[key], value) for key, value in cached.items()])
+
+    def set_items(self, items):
+        self.cache.set_many(dict([(self._key(ITEM_KEY, item_id=item_id), value)
+                                  for item_id, value in items.items()]), FIXTURE_CACHE_TIMEOUT)
+
+    def get_ownership_revision(self):
+        """
+        The revision the ownership index is currently cached under,
+        starting a new one if there isn't one yet.
+        """
+        key = self._key(OWNERSHIP_REVISION_KEY)
+        revision = self.cache.get(key)
+        if revision is None:
+            self.cache.add(key, uuid.uuid4().hex, FIXTURE_CACHE_TIMEOUT)
+            revision = self.cache.get(key)
+        return revision
+
+    def new_ownership_revision(self):
+        self.cache.set(self._key(OWNERSHIP_REVISION_KEY), uuid.uuid4().hex, FIXTURE_CACHE_TIMEOUT)
+
+    def get_ownership(self, revision):
+        return self.cache.get(self._key(OWNERSHIP_KEY, revision=revision))
+
+    def set_ownership(self, revision, owned_items):
+        self.cache.set(self._key(OWNERSHIP_KEY, revision=revision), owned_items, FIXTURE_CACHE_TIMEOUT)
+
+
+# parsed ownership indexes, keyed by (domain, version, revision)
+_ownership_indexes = LRUCache(maxsize=50)
+
+
+class FixtureOwnershipIndex(object):
+    """
+    Which items each user and group in a domain owns, built from the
+    fixtures/ownership view. It lives in the fixture cache and, per
+    process, in memory under the current ownership revision.
+
+    Changing ownership starts a new revision rather than patching the
+    cached index, so an index built from the view while the change was
+    being saved is stored under the old revision and never read again.
+    """
+
+    def __init__(self, domain, owned_items):
+        self.domain = domain
+        self.owned_items = owned_items
+
+    @classmethod
+    def get(cls, domain):
+        fixture_cache = FixtureCache(domain)
+        revision = fixture_cache.get_ownership_revision()
+        index = _ownership_indexes.get((domain, fixture_cache.version, revision))
+        if index is not None:
+            return index
+
+        owned_items = fixture_cache.get_ownership(revision)
+        if owned_items is None:
+            owned_items = cls._build(domain)
+            fixture_cache.set_ownership(revision, owned_items)
+        index = cls(domain, owned_items)
+        _ownership_indexes.set((domain, fixture_cache.version, revision), index)
+        return index
+
+    @classmethod
+    def _build(cls, domain):
+        owned_items = defaultdict(set)
+        for owner_type in ('user', 'group'):
+            key = [domain, 'data_item by ' + owner_type]
+            for row in get_db().view('fixtures/ownership', startkey=key, endkey=key + [{}], reduce=False):
+                owned_items[(owner_type, row['key'][2])].add(row['value'])
+        return dict(owned_items)
+
+    @classmethod
+    def invalidate(cls, domain):
+        """
+        Call this once an ownership change has been saved to couch.
+        """
+        FixtureCache(domain).new_ownership_revision()
+
+    def get_item_ids(self, user_id=None, group_ids=()):
+        owners = [('group', group_id) for group_id in group_ids]
+        if user_id is not None:
+            owners.append(('user', user_id))
+        return set().union(*[self.owned_items.get(owner, ()) for owner in owners])
@@ -1,9 +1,12 @@
 from collections import defaultdict
 from xml.etree import ElementTree
+from corehq.apps.fixtures.cache import FixtureCache
 from corehq.apps.fixtures.models import FixtureDataItem, FixtureDataType
+from corehq.apps.ota.instrumentation import instrumented_fixture_generator
 from corehq.apps.users.models import CommCareUser
 
 
+@instrumented_fixture_generator
 def item_lists(user, version, last_sync):
     if isinstance(user, CommCareUser):
         pass
@@ -12,42 +15,87 @@ def item_lists(user, version, last_sync):
     else:
         return []
 
-    all_types = dict([(t._id, t) for t in FixtureDataType.by_domain(user.domain)])
+    fixture_cache = FixtureCache(user.domain)
+    all_types = dict([(t._id, t) for t in _get_data_types(fixture_cache)])
     global_types = dict([(id, t) for id, t in all_types.items() if t.is_global])
 
-    items_by_type = defaultdict(list)
-
-    def _set_cached_type(item, data_type):
-        # set the cached version used by the object so that it doesn't
-        # have to do another db trip later
-        item._data_type = data_type
-
+    item_lists_by_type = {}
     for global_fixture in global_types.values():
-        items = list(FixtureDataItem.by_data_type(user.domain, global_fixture))
-        _ = [_set_cached_type(item, global_fixture) for item in items]
-        items_by_type[global_fixture._id] = items
+        item_lists_by_type[global_fixture._id] = _get_global_item_list(fixture_cache, global_fixture)
 
-    other_items = FixtureDataItem.by_user(user)
+    user_items_by_type = _get_user_items_by_type(fixture_cache, user, all_types)
     data_types = {}
-
-    for item in other_items:
-        if item.data_type_id in global_types:
+    for data_type_id, items in user_items_by_type.items():
+        if data_type_id in global_types:
             continue  # was part of the global type so no need to add here
-        if not data_types.has_key(item.data_type_id):
-            try:
-                data_types[item.data_type_id] = all_types[item.data_type_id]
-            except (AttributeError, KeyError):
-                continue
-        items_by_type[item.data_type_id].append(item)
-        _set_cached_type(item, data_types[item.data_type_id])
+        data_types[data_type_id] = data_type = all_types[data_type_id]
+        xItemList = ElementTree.Element('%s_list' % data_type.tag)
+        for sort_key, xml in sorted(items, key=lambda x: x[0]):
+            xItemList.append(ElementTree.fromstring(xml))
+        item_lists_by_type[data_type_id] = xItemList
 
     fixtures = []
     all_types = data_types.values() + global_types.values()
     for data_type in all_types:
         xFixture = ElementTree.Element('fixture', attrib={'id': 'item-list:%s' % data_type.tag, 'user_id': user.user_id})
-        xItemList = ElementTree.Element('%s_list' % data_type.tag)
-        xFixture.append(xItemList)
-        for item in sorted(items_by_type[data_type.get_id], key=lambda x: x.sort_key):
-            xItemList.append(item.to_xml())
+        xFixture.append(item_lists_by_type[data_type.get_id])
         fixtures.append(xFixture)
     return fixtures
+
+
+def _get_data_types(fixture_cache):
+    data_types_json = fixture_cache.get_data_types()
+    if data_types_json is None:
+        data_types = list(FixtureDataType.by_domain(fixture_cache.domain))
+        fixture_cache.set_data_types([data_type.to_json() for data_type in data_types])
+        return data_types
+    return [FixtureDataType.wrap(data_type) for data_type in data_types_json]
+
+
+def _get_global_item_list(fixture_cache, data_type):
+    """
+    Global item lists are the same for every user in the domain, so they
+    are serialized once per fixture version and reused by every restore.
+    """
+    xml = fixture_cache.get_item_list(data_type.get_id)
+    if xml is not None:
+        return ElementTree.fromstring(xml)
+
+    xItemList = ElementTree.Element('%s_list' % data_type.tag)
+    items = list(FixtureDataItem.by_data_type(fixture_cache.domain, data_type))
+    for item in sorted(items, key=lambda x: x.sort_key):
+        # set the cached version used by the object so that it doesn't
+        # have to do another db trip later
+        item._data_type = data_type
+        xItemList.append(item.to_xml())
+    fixture_cache.set_item_list(data_type.get_id, ElementTree.tostring(xItemList))
+    return xItemList
+
+
+def _get_user_items_by_type(fixture_cache, user, all_types):
+    """
+    data_type_id => [(sort_key, xml), ...] for the items owned by the user
+
+    Each item is serialized once per fixture version, so only items that
+    aren't cached yet are fetched from the db.
+    """
+    item_ids = FixtureDataItem.by_user(user, wrap=False)
+    items = fixture_cache.get_items(item_ids)
+
+    missing_ids = [item_id for item_id in item_ids if item_id not in items]
+    if missing_ids:
+        new_items = {}
+        for item in FixtureDataItem.by_ids(missing_ids, user.domain):
+            if item.data_type_id not in all_types:
+                continue
+            item._data_type = all_types[item.data_type_id]
+            new_items[item.get_id] = (item.data_type_id, item.sort_key, ElementTree.tostring(item.to_xml()))
+        if new_items:
+            fixture_cache.set_items(new_items)
+        items.update(new_items)
+
+    items_by_type = defaultdict(list)
+    for data_type_id, sort_key, xml in items.values():
+        if data_type_id in all_types:
+            items_by_type[data_type_id].append((sort_key, xml))
+    return items_by_type
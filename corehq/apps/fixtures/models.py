@@ -2,6 +2,7 @@ from xml.etree import ElementTree
 from corehq.apps.users.models import CommCareUser
 from couchdbkit.ext.django.schema import Document, DictProperty, StringProperty, StringListProperty, IntegerProperty, BooleanProperty
 from corehq.apps.groups.models import Group
+from corehq.apps.fixtures.cache import bump_fixture_version, FixtureOwnershipIndex
 from dimagi.utils.couch.bulk import CouchTransaction
 from dimagi.utils.couch.database import get_db
 
@@ -15,6 +16,14 @@ class FixtureDataType(Document):
     name = StringProperty()
     fields = StringListProperty()
 
+    def save(self, *args, **kwargs):
+        super(FixtureDataType, self).save(*args, **kwargs)
+        bump_fixture_version(self.domain)
+
+    def delete(self):
+        super(FixtureDataType, self).delete()
+        bump_fixture_version(self.domain)
+
     @classmethod
     def by_domain(cls, domain):
         return cls.view('fixtures/data_types_by_domain', key=domain, reduce=False, include_docs=True)
@@ -37,6 +46,14 @@ class FixtureDataItem(Document):
     fields = DictProperty()
     sort_key = IntegerProperty()
 
+    def save(self, *args, **kwargs):
+        super(FixtureDataItem, self).save(*args, **kwargs)
+        bump_fixture_version(self.domain)
+
+    def delete(self):
+        super(FixtureDataItem, self).delete()
+        bump_fixture_version(self.domain)
+
     @property
     def data_type(self):
         if not hasattr(self, '_data_type'):
@@ -45,9 +62,14 @@ class FixtureDataItem(Document):
 
     def add_owner(self, owner, owner_type, transaction=None):
         assert(owner.domain == self.domain)
+        commits = transaction is None
         with transaction or CouchTransaction() as transaction:
             o = FixtureOwnership(domain=self.domain, owner_type=owner_type, owner_id=owner.get_id, data_item_id=self.get_id)
             transaction.save(o)
+        if commits:
+            # a caller's transaction hasn't been committed yet, so the caller
+            # invalidates (or bumps the fixture version) once it has
+            FixtureOwnershipIndex.invalidate(self.domain)
         return o
 
     def remove_owner(self, owner, owner_type):
@@ -136,48 +158,44 @@ class FixtureDataItem(Document):
             user_id = user.user_id
             user_domain = user.domain
 
-        fixture_ids = set(
-            FixtureOwnership.get_db().view('fixtures/ownership',
-                keys=[[user_domain, 'data_item by user', user_id]] + [[user_domain, 'data_item by group', group_id] for group_id in group_ids],
-                reduce=False,
-                wrapper=lambda r: r['value'],
-            )
-        )
+        fixture_ids = FixtureOwnershipIndex.get(user_domain).get_item_ids(user_id, group_ids)
         if wrap:
-            results = cls.get_db().view('_all_docs', keys=list(fixture_ids), include_docs=True)
-
-            # sort the results into those corresponding to real documents
-            # and those corresponding to deleted or non-existent documents
-            docs = []
-            deleted_fixture_ids = set()
-
-            for result in results:
-                if result.get('doc'):
-                    docs.append(cls.wrap(result['doc']))
-                elif result.get('error'):
-                    assert result['error'] == 'not_found'
-                    deleted_fixture_ids.add(result['key'])
-                else:
-                    assert result['value']['deleted'] is True
-                    deleted_fixture_ids.add(result['id'])
-
-            # fetch and delete ownership documents pointing
-            # to deleted or non-existent fixture documents
-            # this cleanup is necessary since we used to not do this
-            bad_ownerships = FixtureOwnership.for_all_item_ids(deleted_fixture_ids, user_domain)
-            FixtureOwnership.get_db().bulk_delete(bad_ownerships)
-
-            return docs
+            return cls.by_ids(fixture_ids, user_domain)
         else:
             return fixture_ids
 
+    @classmethod
+    def by_ids(cls, fixture_ids, domain):
+        results = cls.get_db().view('_all_docs', keys=list(fixture_ids), include_docs=True)
+
+        # sort the results into those corresponding to real documents
+        # and those corresponding to deleted or non-existent documents
+        docs = []
+        deleted_fixture_ids = set()
+
+        for result in results:
+            if result.get('doc'):
+                docs.append(cls.wrap(result['doc']))
+            elif result.get('error'):
+                assert result['error'] == 'not_found'
+                deleted_fixture_ids.add(result['key'])
+            else:
+                assert result['value']['deleted'] is True
+                deleted_fixture_ids.add(result['id'])
+
+        # fetch and delete ownership documents pointing
+        # to deleted or non-existent fixture documents
+        # this cleanup is necessary since we used to not do this
+        bad_ownerships = FixtureOwnership.for_all_item_ids(deleted_fixture_ids, domain)
+        if bad_ownerships:
+            FixtureOwnership.get_db().bulk_delete(bad_ownerships)
+            FixtureOwnershipIndex.invalidate(domain)
+
+        return docs
+
     @classmethod
     def by_group(cls, group, wrap=True):
-        fixture_ids = get_db().view('fixtures/ownership',
-            key=[group.domain, 'data_item by group', group.get_id],
-            reduce=False,
-            wrapper=lambda r: r['value'],
-        ).all()
+        fixture_ids = list(FixtureOwnershipIndex.get(group.domain).get_item_ids(group_ids=[group.get_id]))
 
         return cls.view('_all_docs', keys=list(fixture_ids), include_docs=True) if wrap else fixture_ids
 
@@ -235,6 +253,14 @@ class FixtureOwnership(Document):
     owner_id = StringProperty()
     owner_type = StringProperty(choices=['user', 'group'])
 
+    def save(self, *args, **kwargs):
+        super(FixtureOwnership, self).save(*args, **kwargs)
+        FixtureOwnershipIndex.invalidate(self.domain)
+
+    def delete(self):
+        super(FixtureOwnership, self).delete()
+        FixtureOwnershipIndex.invalidate(self.domain)
+
     @classmethod
     def by_item_id(cls, item_id, domain):
         ownerships = cls.view('fixtures/ownership',
@@ -2,9 +2,11 @@ from xml.etree import ElementTree
 from casexml.apps.case.tests.util import check_xml_line_by_line
 from casexml.apps.case.xml import V2
 from corehq.apps.fixtures import fixturegenerators
+from corehq.apps.fixtures.cache import FixtureOwnershipIndex
 from corehq.apps.fixtures.models import FixtureDataItem, FixtureDataType, FixtureOwnership
 from corehq.apps.users.models import CommCareUser
 from django.test import TestCase
+import mock
 
 
 class FixtureDataTest(TestCase):
@@ -85,12 +87,44 @@ class FixtureDataTest(TestCase):
 
         self.data_item.remove_user(self.user)
         self.assertItemsEqual([], self.data_item.get_all_users())
+        self.assertItemsEqual([], FixtureDataItem.by_user(self.user, wrap=False))
 
         self.fixture_ownership = self.data_item.add_user(self.user)
         self.assertItemsEqual([self.user.get_id], self.data_item.get_all_users(wrap=False))
+        self.assertItemsEqual([self.data_item.get_id], FixtureDataItem.by_user(self.user, wrap=False))
+
+    def test_item_lists_see_changes(self):
+        fixture, = fixturegenerators.item_lists(self.user, version=V2, last_sync=None)
+        self.assertEqual(1, len(fixture.find('contact_list')))
+
+        self.data_item.fields['name'] = 'Johnny'
+        self.data_item.save()
+        fixture, = fixturegenerators.item_lists(self.user, version=V2, last_sync=None)
+        self.assertEqual('Johnny', fixture.find('contact_list/contact/name').text)
 
     def test_get_indexed_items(self):
         fixtures = FixtureDataItem.get_indexed_items(self.domain,
             self.tag, 'name')
         john_num = fixtures['John']['number']
-        self.assertEqual(john_num, '+15555555555')
\ No newline at end of file
+        self.assertEqual(john_num, '+15555555555')
+
+
+class FixtureOwnershipIndexTest(TestCase):
+    domain = 'fixture-ownership-index'
+
+    def test_change_during_build(self):
+        def stale_build(domain):
+            # the ownership change is saved while the view is being read
+            FixtureOwnershipIndex.invalidate(domain)
+            return {('user', 'user1'): set()}
+
+        fresh_build = lambda domain: {('user', 'user1'): set(['item1'])}
+
+        with mock.patch.object(FixtureOwnershipIndex, '_build', side_effect=stale_build):
+            self.assertEqual(set(), FixtureOwnershipIndex.get(self.domain).get_item_ids('user1'))
+
+        with mock.patch.object(FixtureOwnershipIndex, '_build', side_effect=fresh_build) as build:
+            self.assertEqual(set(['item1']), FixtureOwnershipIndex.get(self.domain).get_item_ids('user1'))
+            # and the fresh index is cached from then on
+            self.assertEqual(set(['item1']), FixtureOwnershipIndex.get(self.domain).get_item_ids('user1'))
+        self.assertEqual(1, build.call_count)
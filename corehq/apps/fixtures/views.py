@@ -15,6 +15,7 @@ from django.views.generic.base import TemplateView
 from django.shortcuts import render
 
 from corehq.apps.domain.decorators import login_or_digest
+from corehq.apps.fixtures.cache import bump_fixture_version
 from corehq.apps.fixtures.models import FixtureDataType, FixtureDataItem, _id_from_doc
 from corehq.apps.groups.models import Group
 from corehq.apps.users.bulkupload import GroupMemoizer
@@ -80,6 +81,7 @@ def data_types(request, domain, data_type_id):
         elif request.method == 'DELETE':
             with CouchTransaction() as transaction:
                 data_type.recursive_delete(transaction)
+            bump_fixture_version(domain)
             return json_response({})
 
     elif data_type_id is None:
@@ -96,6 +98,7 @@ def data_types(request, domain, data_type_id):
             with CouchTransaction() as transaction:
                 for data_type in FixtureDataType.by_domain(domain):
                     data_type.recursive_delete(transaction)
+            bump_fixture_version(domain)
             return json_response({})
 
     return HttpResponseBadRequest()
@@ -149,6 +152,7 @@ def data_items(request, domain, data_type_id, data_item_id):
         assert(o.domain == domain and o.data_type.get_id == data_type_id)
         with CouchTransaction() as transaction:
             o.recursive_delete(transaction)
+        bump_fixture_version(domain)
         return json_response({})
     else:
         return HttpResponseBadRequest()
@@ -516,5 +520,6 @@ def run_upload(request, domain, workbook):
                         else:
                             messages.error(request, _("Unknown user: '%(name)s'. But the row is successfully added") % {'name': raw_username})
 
+    bump_fixture_version(domain)
     return_val["number_of_fixtures"] = number_of_fixtures + 1
     return return_val
\ No newline at end of file
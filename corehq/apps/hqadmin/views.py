@@ -35,6 +35,7 @@ from corehq.apps.builds.models import CommCareBuildConfig, BuildSpec
 from corehq.apps.domain.models import Domain
 from corehq.apps.hqadmin.escheck import check_es_cluster_health, check_xform_es_index, check_reportcase_es_index, check_case_es_index, check_reportxform_es_index
 from corehq.apps.hqadmin.system_info.checks import check_redis, check_rabbitmq, check_celery_health, check_memcached
+from corehq.apps.ota.instrumentation import restore_timing_stats, PERCENTILES
 from corehq.apps.ota.views import get_restore_response, get_restore_params
 from corehq.apps.reports.datatables import DataTablesColumn, DataTablesHeader, DTSortType
 from corehq.apps.reports.standard.domains import es_domain_query
@@ -748,6 +749,24 @@ def admin_restore(request):
         return HttpResponseNotFound('User %s not found.' % full_username)
     return get_restore_response(user.domain, user, **get_restore_params(request))
 
+@require_superuser
+@require_GET
+def restore_timings(request, template="hqadmin/restore_timings.html"):
+    try:
+        days = int(request.GET.get('days', 7))
+    except ValueError:
+        days = 7
+    domain = request.GET.get('domain') or None
+    context = get_hqadmin_base_context(request)
+    context.update({
+        'hide_filters': True,
+        'days': days,
+        'selected_domain': domain,
+        'percentiles': PERCENTILES,
+        'stats': restore_timing_stats(datetime.utcnow() - timedelta(days=days), domain=domain),
+    })
+    return render(request, template, context)
+
 @require_superuser
 def management_commands(request, template="hqadmin/management_commands.html"):
     commands = [(_('Remove Duplicate Domains'), 'remove_duplicate_domains')]
@@ -0,0 +1,111 @@
+import copy
+import timeit
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand
+
+from corehq.pillows.reportxform import ReportXFormPillow
+from corehq.pillows.xform import XFormPillow
+
+
+def make_large_form(domain, repeats):
+    """
+    A form with `repeats` repeat groups, each with nested questions and a
+    subcase block, roughly the shape of our biggest real world forms.
+    """
+    return {
+        "_id": "benchmark_form",
+        "doc_type": "XFormInstance",
+        "domain": domain,
+        "xmlns": "http://openrosa.org/formdesigner/benchmark",
+        "received_on": "2013-10-09T14:21:56Z",
+        "form": {
+            "@xmlns": "http://openrosa.org/formdesigner/benchmark",
+            "meta": {
+                "@xmlns": "http://openrosa.org/jr/xforms",
+                "timeStart": "2013-09-01T11:22:40Z",
+                "timeEnd": "2013-09-09T11:02:34Z",
+                "appVersion": {"@xmlns": "http://commcarehq.org/xforms", "#text": "v2.9"},
+                "userID": "some_user",
+                "instanceID": "some_form",
+            },
+            "case": {
+                "@xmlns": "http://commcarehq.org/case/transaction/v2",
+                "@case_id": "household",
+                "@date_modified": "2013-09-01T11:02:34Z",
+                "update": {"num_members": str(repeats)},
+            },
+            "member": [{
+                "name": "member %d" % i,
+                "age": str(i),
+                "vitals": {
+                    "weight": {"#text": "12", "@concept_id": "5089"},
+                    "height": {"#text": "80", "@concept_id": "5090"},
+                    "muac": "",
+                },
+                "counseling": dict(("topic_%d" % t, "yes") for t in range(10)),
+                "subcase": {
+                    "case": {
+                        "@xmlns": "http://commcarehq.org/case/transaction/v2",
+                        "@case_id": "member_%d" % i,
+                        "@date_modified": "2013-09-01T11:02:34Z",
+                        "create": {"case_type": "member", "case_name": "member %d" % i},
+                        "index": {"parent": {"@case_type": "household", "#text": "household"}},
+                        "update": dict(("prop_%d" % p, "value") for p in range(20)),
+                    },
+                },
+            } for i in range(repeats)],
+        },
+    }
+
+
+def count_new_containers(source, result):
+    """
+    Number of dicts and lists in result that aren't shared with source
+    """
+    def container_ids(node, seen):
+        if isinstance(node, (dict, list)):
+            seen.add(id(node))
+            for child in (node.itervalues() if isinstance(node, dict) else node):
+                container_ids(child, seen)
+        return seen
+    return len(container_ids(result, set()) - container_ids(source, set()))
+
+
+class Command(NoArgsCommand):
+    help = "Benchmark the xform pillow transforms against the old deepcopy based approach"
+    option_list = NoArgsCommand.option_list + (
+        make_option('--repeats',
+                    action='store',
+                    type='int',
+                    dest='repeats',
+                    default=200,
+                    help='Number of repeat groups in the benchmark form'),
+        make_option('--iterations',
+                    action='store',
+                    type='int',
+                    dest='iterations',
+                    default=50,
+                    help='Number of times to run each transform'),
+    )
+
+    def handle_noargs(self, **options):
+        domains = getattr(settings, 'ES_XFORM_FULL_INDEX_DOMAINS', []) or ['benchmark']
+        form = make_large_form(domains[0], options['repeats'])
+        iterations = options['iterations']
+
+        for pillow in [XFormPillow(online=False), ReportXFormPillow(online=False)]:
+            name = pillow.__class__.__name__
+
+            def current():
+                return pillow.change_transform(form)
+
+            def deepcopy_first():
+                # what every transform used to pay up front
+                return pillow.change_transform(copy.deepcopy(form))
+
+            for label, fn in [('deepcopy', deepcopy_first), ('shared', current)]:
+                seconds = timeit.timeit(fn, number=iterations)
+                print "%s (%s): %.2f ms per form, %d new dicts/lists per form" % (
+                    name, label, seconds * 1000 / iterations, count_new_containers(form, fn()))
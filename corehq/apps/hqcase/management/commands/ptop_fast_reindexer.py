@@ -1,4 +1,7 @@
+from collections import deque
 from datetime import datetime
+import multiprocessing
+import os
 import time
 from optparse import make_option
 import sys
@@ -6,6 +9,7 @@ import sys
 from django.core.management.base import NoArgsCommand
 import simplejson
 from pillowtop.couchdb import CachedCouchDB
+from corehq.util.couch_helpers import paginate_view
 
 CHUNK_SIZE = 500
 POOL_SIZE = 15
@@ -15,8 +19,6 @@ RETRY_DELAY = 60
 RETRY_TIME_DELAY_FACTOR = 15
 
 
-
-
 class PtopReindexer(NoArgsCommand):
     help = "View based elastic reindexer"
     option_list = NoArgsCommand.option_list + (
@@ -52,6 +54,12 @@ class PtopReindexer(NoArgsCommand):
                     dest='chunk_size',
                     default=CHUNK_SIZE,
                     help='Previous run input file prefix',),
+        make_option('--workers',
+                    action='store',
+                    type='int',
+                    dest='workers',
+                    default=1,
+                    help='Number of processes to use for a bulk load',),
     )
 
 
@@ -99,8 +107,54 @@ class PtopReindexer(NoArgsCommand):
         view_dump_filename = "%s%s_%s_data.json" % (self.file_prefix, self.pillow_class.__name__,  self.get_seq_prefix())
         return view_dump_filename
 
-    def full_couch_view_iter(self):
-        start_seq = 0
+    def get_ledger_filename(self):
+        ledger_filename = "%s%s_%s_chunks.txt" % (self.file_prefix, self.pillow_class.__name__, self.get_seq_prefix())
+        return ledger_filename
+
+    def load_ledger(self):
+        """
+        Start offsets of the bulk chunks already indexed in this run
+        """
+        try:
+            with open(self.get_ledger_filename(), 'r') as fin:
+                return set(int(line) for line in fin if line.strip())
+        except IOError:
+            return set()
+
+    def get_cursor_filename(self):
+        cursor_filename = "%s%s_%s_cursor.json" % (self.file_prefix, self.pillow_class.__name__, self.get_seq_prefix())
+        return cursor_filename
+
+    def load_cursor(self, phase):
+        """
+        Returns the view cursor last saved for the given phase ('dump' or
+        'traditional') of this run, or None if there isn't one.
+        """
+        try:
+            with open(self.get_cursor_filename(), 'r') as fin:
+                return simplejson.load(fin).get(phase)
+        except IOError:
+            return None
+
+    def save_cursor(self, phase, cursor):
+        try:
+            with open(self.get_cursor_filename(), 'r') as fin:
+                cursors = simplejson.load(fin)
+        except IOError:
+            cursors = {}
+        cursors[phase] = cursor
+
+        # write then rename so a crash never leaves a half written cursor
+        tmp_filename = "%s.tmp" % self.get_cursor_filename()
+        with open(tmp_filename, 'w') as fout:
+            simplejson.dump(cursors, fout)
+        os.rename(tmp_filename, self.get_cursor_filename())
+
+    def get_view_ranges(self):
+        """
+        List of view kwargs to iterate over, in order. Override this if a
+        reindex needs to walk several disjoint slices of a view.
+        """
         if hasattr(self.pillow, 'include_docs_when_preindexing'):
             include_docs = self.pillow.include_docs_when_preindexing
         else:
@@ -110,47 +164,81 @@ class PtopReindexer(NoArgsCommand):
             view_kwargs["key"] = self.couch_key
 
         view_kwargs.update(self.get_extra_view_kwargs())
-        view_chunk = self.db.view(
-            self.view_name,
-            reduce=False,
-            limit=self.chunk_size * self.chunk_size,
-            skip=start_seq,
-            **view_kwargs
-        )
-
-        while len(view_chunk) > 0:
-            for item in view_chunk:
+        return [view_kwargs]
+
+    def full_couch_view_iter(self, cursor=None):
+        """
+        Iterate over every row in the view ranges, resuming after `cursor`
+        if one is given. self.view_cursor always points at the last
+        row yielded so callers can persist it.
+        """
+        self.view_cursor = cursor
+        start_range = cursor['range'] if cursor else 0
+
+        for range_index, view_kwargs in enumerate(self.get_view_ranges()):
+            if range_index < start_range:
+                continue
+            range_cursor = cursor if cursor and range_index == cursor['range'] else None
+            for item in paginate_view(self.db, self.view_name, self.chunk_size * self.chunk_size,
+                                      cursor=range_cursor, **view_kwargs):
+                self.view_cursor = {
+                    'range': range_index,
+                    'startkey': item['key'],
+                    'startkey_docid': item['id'],
+                }
                 yield item
-            start_seq += self.chunk_size * self.chunk_size
-            view_chunk = self.db.view(self.view_name,
-                reduce=False,
-                limit=self.chunk_size * self.chunk_size,
-                skip=start_seq,
-                **view_kwargs
-            )
-
-    def load_from_view(self):
+
+    def load_from_view(self, resume=False):
         """
         Loads entire view, saves to file, set pillowtop checkpoint
-        """
 
-        # Set pillowtop checkpoint for doc_class
-        # though this might cause some superfluous reindexes of docs,
-        # we're going to set the checkpoint BEFORE we start our operation so that any changes
-        # that happen to cases while we're doing our reindexing would not get skipped once we
-        # finish.
+        If resume is True, continue a partially written view dump from
+        the cursor saved with it.
+        """
+        cursor = None
+        if resume:
+            cursor = self.load_cursor('dump')
+            if cursor is None or cursor.get('complete'):
+                return
+        else:
+            # Set pillowtop checkpoint for doc_class
+            # though this might cause some superfluous reindexes of docs,
+            # we're going to set the checkpoint BEFORE we start our operation so that any changes
+            # that happen to cases while we're doing our reindexing would not get skipped once we
+            # finish.
 
-        current_db_seq = self.pillow.couch_db.info()['update_seq']
-        self.pillow.set_checkpoint({'seq': current_db_seq})
+            current_db_seq = self.pillow.couch_db.info()['update_seq']
+            self.pillow.set_checkpoint({'seq': current_db_seq})
 
-        #Write sequence file to disk
-        with open(self.get_seq_filename(), 'w') as fout:
-            fout.write(str(current_db_seq))
+            #Write sequence file to disk
+            with open(self.get_seq_filename(), 'w') as fout:
+                fout.write(str(current_db_seq))
 
         #load entire view to disk
         print "Getting full view list: %s" % datetime.utcnow().isoformat()
-        with open(self.get_dump_filename(), 'w') as fout:
-            fout.write('\n'.join(simplejson.dumps(row) for row in self.full_couch_view_iter()))
+        with open(self.get_dump_filename(), 'r+' if cursor else 'w') as fout:
+            if cursor:
+                # drop anything written after the last saved cursor
+                print "Resuming view dump from %s" % cursor
+                fout.truncate(cursor['offset'])
+                fout.seek(cursor['offset'])
+                cursor = cursor['view_cursor']
+
+            for ix, row in enumerate(self.full_couch_view_iter(cursor=cursor)):
+                fout.write(simplejson.dumps(row))
+                fout.write('\n')
+                if (ix + 1) % self.chunk_size == 0:
+                    fout.flush()
+                    self.save_cursor('dump', {
+                        'offset': fout.tell(),
+                        'view_cursor': self.view_cursor,
+                    })
+            fout.flush()
+            self.save_cursor('dump', {
+                'offset': fout.tell(),
+                'view_cursor': self.view_cursor,
+                'complete': True,
+            })
         print "View and sequence written to disk: %s" % datetime.utcnow().isoformat()
 
     def load_seq_from_disk(self):
@@ -176,6 +264,7 @@ class PtopReindexer(NoArgsCommand):
         self.runfile = options['runfile']
         self.chunk_size = options.get('chunk_size', CHUNK_SIZE)
         self.start_num = options.get('seq', 0)
+        self.workers = options.get('workers') or 1
 
 
     def handle(self, *args, **options):
@@ -227,6 +316,7 @@ class PtopReindexer(NoArgsCommand):
                 sys.exit()
 
             self.set_seq_prefix(runparts[-1])
+            self.load_from_view(resume=True)
         seq = self.load_seq_from_disk()
 
         #configure index to indexing mode
@@ -266,32 +356,92 @@ class PtopReindexer(NoArgsCommand):
         Iterative view indexing - use --bulk for faster reindex.
         :return:
         """
-        for ix, item in enumerate(self.full_couch_view_iter()):
+        cursor = self.load_cursor('traditional') if self.resume else None
+        if cursor:
+            print "Resuming view iteration from %s" % cursor
+        for ix, item in enumerate(self.full_couch_view_iter(cursor=cursor)):
             print "\tProcessing item %s (%d)" % (item['id'], ix)
             self.process_row(item, ix)
+            if (ix + 1) % self.chunk_size == 0:
+                self.save_cursor('traditional', self.view_cursor)
 
-    def load_bulk(self):
+    def bulk_chunk_iter(self):
+        """
+        Yields (start, end, slice) for every chunk of the view dump that
+        still needs indexing, skipping rows before --sequence and chunks
+        already recorded in the ledger.
+        """
+        completed = self.load_ledger() if self.resume else set()
         start = self.start_num
-        end = start + self.chunk_size
+        bulk_slice = []
 
-        json_iter = self.view_data_file_iter()
+        for curr_counter, json_doc in enumerate(self.view_data_file_iter()):
+            if curr_counter < start:
+                continue
+            bulk_slice.append(json_doc)
+            if len(bulk_slice) == self.chunk_size:
+                if start not in completed:
+                    yield start, start + self.chunk_size, bulk_slice
+                bulk_slice = []
+                start += self.chunk_size
+
+        if bulk_slice and start not in completed:
+            yield start, start + self.chunk_size, bulk_slice
+
+    def load_bulk(self):
+        if self.workers > 1:
+            return self.load_bulk_parallel()
 
-        bulk_slice = []
         self.pillow.couch_db = CachedCouchDB(self.pillow.document_class.get_db().uri,
                                              readonly=True)
 
-        for curr_counter, json_doc in enumerate(json_iter):
-            if curr_counter < start:
-                continue
-            else:
-                bulk_slice.append(json_doc)
-                if len(bulk_slice) == self.chunk_size:
-                    self.send_bulk(bulk_slice, start, end)
-                    bulk_slice = []
-                    start += self.chunk_size
-                    end += self.chunk_size
+        with open(self.get_ledger_filename(), 'a') as ledger:
+            for start, end, bulk_slice in self.bulk_chunk_iter():
+                if self.send_bulk(bulk_slice, start, end):
+                    ledger.write("%d\n" % start)
+                    ledger.flush()
 
-        self.send_bulk(bulk_slice, start, end)
+    def load_bulk_parallel(self):
+        """
+        Fan chunks of the view dump out to a pool of worker processes.
+
+        Results are collected in chunk order so progress output and the
+        ledger only ever move forwards; chunks that fail are left out of
+        the ledger so a --resume run picks them up again.
+        """
+        print "Bulk loading with %d workers" % self.workers
+        pool = multiprocessing.Pool(self.workers, initializer=_init_bulk_worker, initargs=(self,))
+        pending = deque()
+        failed = 0
+
+        def collect(ledger):
+            start, end, success = pending.popleft().get()
+            if success:
+                ledger.write("%d\n" % start)
+                ledger.flush()
+                print "\t%s: Finished slice %d:%d" % (datetime.now().isoformat(), start, end)
+            else:
+                print "\t%s: Giving up on slice %d:%d" % (datetime.now().isoformat(), start, end)
+            return success
+
+        try:
+            with open(self.get_ledger_filename(), 'a') as ledger:
+                for chunk in self.bulk_chunk_iter():
+                    pending.append(pool.apply_async(_send_bulk_chunk, (chunk,)))
+                    # bound the number of chunks held in memory at once
+                    if len(pending) >= self.workers * 2:
+                        failed += not collect(ledger)
+                while pending:
+                    failed += not collect(ledger)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+        if failed:
+            print "\t%d slices failed, rerun with --resume to retry them" % failed
 
     def send_bulk(self, slice, start, end):
         doc_ids = [x['id'] for x in slice]
@@ -312,3 +462,35 @@ class PtopReindexer(NoArgsCommand):
                 time.sleep(retry_time)
                 print "\t%s: Retrying again %d:%d..." % (datetime.now().isoformat(), start, end)
                 bulk_start = datetime.utcnow() #reset timestamp when looping again
+        else:
+            return False
+        return True
+
+
+_bulk_worker = None
+
+
+def _init_bulk_worker(reindexer):
+    """
+    Pool initializer: give each worker process its own pillow (and so its
+    own ES connection) and its own couch cache.
+    """
+    global _bulk_worker
+    reindexer.pillow = reindexer.pillow_class()
+    reindexer.pillow.couch_db = CachedCouchDB(reindexer.pillow.document_class.get_db().uri,
+                                              readonly=True)
+    _bulk_worker = reindexer
+
+
+def _send_bulk_chunk(chunk):
+    """
+    send_bulk already retries the elastic load, so anything escaping it
+    (e.g. the couch bulk load failing) just marks the chunk as failed and
+    leaves it out of the ledger for a --resume run to pick up.
+    """
+    start, end, bulk_slice = chunk
+    try:
+        return start, end, _bulk_worker.send_bulk(bulk_slice, start, end)
+    except Exception, ex:
+        print "\t%s: Exception loading slice %d:%d, %s" % (datetime.now().isoformat(), start, end, ex)
+        return start, end, False
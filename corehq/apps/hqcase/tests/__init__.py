@@ -2,8 +2,11 @@ from dimagi.utils.logging import log_exception
 try:
     from .test_bugs import *
     from .test_case_assigment import *
+    from .test_case_ids_by_user import *
     from .test_case_sharing import *
+    from .test_fast_reindexer import *
     from .test_object_cache import *
+    from .test_paginate_view import *
 except ImportError, e:
     # for some reason the test harness squashes these so log them here for clarity
     # otherwise debugging is a pain
@@ -0,0 +1,32 @@
+from django.test import TestCase
+import mock
+from casexml.apps.case.models import CommCareCase
+from corehq.apps.hqcase.utils import get_case_ids_by_domain_hq_user_ids
+
+DOMAIN = 'case-ids-by-user'
+USER_CASES = {
+    'user1': ['case1'],
+    'user2': ['case2', 'case3'],
+    'user3': [],
+}
+
+
+class CaseIdsByUserTest(TestCase):
+
+    def _view(self, view_name, keys, reduce):
+        return [{'key': key, 'id': case_id}
+                for key in keys for case_id in USER_CASES[key[1]]]
+
+    def test_case_ids(self):
+        db = mock.Mock()
+        db.view.side_effect = self._view
+        with mock.patch.object(CommCareCase, 'get_db', return_value=db):
+            case_ids = get_case_ids_by_domain_hq_user_ids(DOMAIN, ['user1', 'user2', 'user3'], chunksize=2)
+        self.assertEqual(['case1'], case_ids['user1'])
+        self.assertEqual(['case2', 'case3'], case_ids['user2'])
+        self.assertEqual([], case_ids['user3'])
+        # one keyed view query per chunk of users
+        self.assertEqual([
+            [[DOMAIN, 'user1'], [DOMAIN, 'user2']],
+            [[DOMAIN, 'user3']],
+        ], [call[1]['keys'] for call in db.view.call_args_list])
@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+from django.test import TestCase
+import mock
+import simplejson
+from corehq.apps.hqcase.management.commands import ptop_fast_reindexer
+from corehq.apps.hqcase.management.commands.ptop_fast_reindexer import PtopReindexer
+
+
+class FakePillow(object):
+    document_class = mock.Mock()
+
+
+class FakeReindexer(PtopReindexer):
+    pillow_class = FakePillow
+
+    def __init__(self, failing=()):
+        super(FakeReindexer, self).__init__()
+        self.failing = set(failing)
+        self.sent = []
+
+    def send_bulk(self, slice, start, end):
+        self.sent.append((start, end, [row['id'] for row in slice]))
+        return start not in self.failing
+
+
+class FakePool(object):
+    """
+    Runs everything in process, in submission order.
+    """
+
+    def __init__(self, processes, initializer=None, initargs=()):
+        self.processes = processes
+        initializer(*initargs)
+
+    def apply_async(self, func, args):
+        result = mock.Mock()
+        result.get.return_value = func(*args)
+        return result
+
+    def close(self):
+        pass
+
+    def terminate(self):
+        pass
+
+    def join(self):
+        pass
+
+
+class FastReindexerBulkTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.reindexer = FakeReindexer()
+        self.reindexer.file_prefix = os.path.join(self.dir, 'ptop_fast_reindex_')
+        self.reindexer.set_seq_prefix('2014-01-01-0000')
+        self.reindexer.chunk_size = 3
+        self.reindexer.start_num = 0
+        self.reindexer.resume = False
+        self.reindexer.workers = 1
+        self.reindexer.pillow = FakePillow()
+        with open(self.reindexer.get_dump_filename(), 'w') as fout:
+            for i in range(8):
+                fout.write(simplejson.dumps({'id': 'doc%d' % i}))
+                fout.write('\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def _write_ledger(self, starts):
+        with open(self.reindexer.get_ledger_filename(), 'w') as ledger:
+            for start in starts:
+                ledger.write("%d\n" % start)
+
+    def _chunks(self):
+        return [(start, end, [row['id'] for row in bulk_slice])
+                for start, end, bulk_slice in self.reindexer.bulk_chunk_iter()]
+
+    def testChunking(self):
+        self.assertEqual([
+            (0, 3, ['doc0', 'doc1', 'doc2']),
+            (3, 6, ['doc3', 'doc4', 'doc5']),
+            (6, 9, ['doc6', 'doc7']),
+        ], self._chunks())
+
+    def testStartNum(self):
+        self.reindexer.start_num = 4
+        self.assertEqual([
+            (4, 7, ['doc4', 'doc5', 'doc6']),
+            (7, 10, ['doc7']),
+        ], self._chunks())
+
+    def testResumeSkipsLedger(self):
+        self._write_ledger([0, 6])
+        self.reindexer.resume = True
+        self.assertEqual([(3, 6, ['doc3', 'doc4', 'doc5'])], self._chunks())
+
+    def testLedgerIgnoredWithoutResume(self):
+        self._write_ledger([0, 6])
+        self.assertEqual([0, 3, 6], [start for start, _, _ in self._chunks()])
+
+    @mock.patch.object(ptop_fast_reindexer, 'CachedCouchDB')
+    def testLedgerOnlyRecordsSuccess(self, _):
+        self.reindexer.failing = set([3])
+        self.reindexer.load_bulk()
+        self.assertEqual(set([0, 6]), self.reindexer.load_ledger())
+
+        # a resumed run only retries the failed chunk
+        self.reindexer.failing = set()
+        self.reindexer.sent = []
+        self.reindexer.resume = True
+        self.reindexer.load_bulk()
+        self.assertEqual([(3, 6, ['doc3', 'doc4', 'doc5'])], self.reindexer.sent)
+        self.assertEqual(set([0, 3, 6]), self.reindexer.load_ledger())
+
+    @mock.patch.object(ptop_fast_reindexer, 'CachedCouchDB')
+    @mock.patch.object(ptop_fast_reindexer.multiprocessing, 'Pool', FakePool)
+    def testParallelSplitsChunks(self, _):
+        self.reindexer.workers = 2
+        self.reindexer.failing = set([6])
+        self.reindexer.load_bulk()
+        self.assertEqual([
+            (0, 3, ['doc0', 'doc1', 'doc2']),
+            (3, 6, ['doc3', 'doc4', 'doc5']),
+            (6, 9, ['doc6', 'doc7']),
+        ], self.reindexer.sent)
+        self.assertEqual(set([0, 3]), self.reindexer.load_ledger())
+
+    def testSendBulkChunkFailure(self):
+        worker = mock.Mock()
+        worker.send_bulk.side_effect = Exception('couch is down')
+        with mock.patch.object(ptop_fast_reindexer, '_bulk_worker', worker):
+            self.assertEqual((0, 3, False), ptop_fast_reindexer._send_bulk_chunk((0, 3, [])))
+        # no retry loop around the whole chunk
+        self.assertEqual(1, worker.send_bulk.call_count)
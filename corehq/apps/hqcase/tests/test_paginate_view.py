@@ -0,0 +1,46 @@
+from django.test import TestCase
+from corehq.util.couch_helpers import paginate_view
+
+
+class FakeViewDb(object):
+    """
+    Mimics couch view paging over a sorted list of rows and records the
+    kwargs of every request made.
+    """
+
+    def __init__(self, rows):
+        self.rows = sorted(rows, key=lambda row: (row['key'], row['id']))
+        self.requests = []
+
+    def view(self, view_name, reduce=False, limit=None, skip=0, **kwargs):
+        self.requests.append(dict(kwargs, limit=limit, skip=skip))
+        rows = self.rows
+        if 'startkey' in kwargs:
+            start = (kwargs['startkey'], kwargs.get('startkey_docid', ''))
+            rows = [row for row in rows if (row['key'], row['id']) >= start]
+        if 'endkey' in kwargs:
+            rows = [row for row in rows if row['key'] <= kwargs['endkey']]
+        return rows[skip:skip + limit]
+
+
+class PaginateViewTest(TestCase):
+
+    def setUp(self):
+        self.rows = [{'key': key, 'id': 'doc%02d' % i}
+                     for i, key in enumerate(['a'] * 5 + ['b'] * 4 + ['c'] * 3)]
+        self.db = FakeViewDb(self.rows)
+
+    def testAllRows(self):
+        result = list(paginate_view(self.db, 'fake/view', 5))
+        self.assertEqual(self.db.rows, result)
+        # never page by offset
+        self.assertTrue(all(request['skip'] <= 1 for request in self.db.requests))
+
+    def testResumeFromCursor(self):
+        cursor = {'startkey': 'b', 'startkey_docid': 'doc06'}
+        result = list(paginate_view(self.db, 'fake/view', 3, cursor=cursor))
+        self.assertEqual(self.db.rows[7:], result)
+
+    def testKey(self):
+        result = list(paginate_view(self.db, 'fake/view', 2, key='b'))
+        self.assertEqual([row for row in self.db.rows if row['key'] == 'b'], result)
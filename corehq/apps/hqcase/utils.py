@@ -1,7 +1,9 @@
+from collections import defaultdict
 import datetime
 import uuid
 from xml.etree import ElementTree
 from couchdbkit import ResourceNotFound
+from dimagi.utils.chunked import chunked
 from dimagi.utils.couch.database import iter_docs
 from casexml.apps.case.mock import CaseBlock
 from casexml.apps.case.models import CommCareCase
@@ -65,6 +67,21 @@ def get_case_by_domain_hq_user_id(domain, user_id, include_docs=False):
                          include_docs=include_docs).one()
 
 
+def get_case_ids_by_domain_hq_user_ids(domain, user_ids, chunksize=1000):
+    """
+    user_id => ids of the 'user cases' for each of user_ids, in one view
+    query per chunk of users rather than one per user.
+    """
+    case_ids = defaultdict(list)
+    for chunk in chunked(user_ids, chunksize):
+        rows = CommCareCase.get_db().view('hqcase/by_domain_hq_user_id',
+                                          keys=[[domain, user_id] for user_id in chunk],
+                                          reduce=False)
+        for row in rows:
+            case_ids[row['key'][1]].append(row['id'])
+    return case_ids
+
+
 def get_case_by_identifier(domain, identifier):
     # circular import
     from corehq.apps.api.es import CaseES
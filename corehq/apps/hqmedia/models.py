@@ -1,6 +1,11 @@
 from StringIO import StringIO
 import logging
 import mimetypes
+import os
+import shutil
+import tempfile
+import time
+import zipfile
 from PIL import Image
 from datetime import datetime
 import hashlib
@@ -20,6 +25,7 @@ from dimagi.utils.couch.database import get_db, SafeSaveDocument, get_safe_read_
 from django.utils.translation import ugettext as _
 
 MULTIMEDIA_PREFIX = "jr://file/"
+MEDIA_ZIP_ATTACHMENT = "multimedia.zip"
 
 
 class HQMediaLicense(DocumentSchema):
@@ -608,6 +614,95 @@ class HQMediaMixin(Document):
         """
         return [m.as_dict(lang) for m in self.all_media]
 
+    @property
+    def media_zip_stub(self):
+        """
+        The attachment stub (content_type, length, digest) of the prebuilt
+        media zip, if this build has one.
+        """
+        return (self._attachments or {}).get(MEDIA_ZIP_ATTACHMENT)
+
+    def create_media_zip(self, previous_zip=None):
+        """
+            Writes a zip of all the media in the multimedia map to a temp file.
+            Returns the path to the file and a list of errors.
+
+            Each entry's comment is the id of the multimedia it was made from, so
+            entries whose mapping hasn't changed since `previous_zip` (an open
+            ZipFile made by this method) are copied from it instead of fetching
+            the media from couch again.
+        """
+        previous_entries = {}
+        if previous_zip is not None:
+            previous_entries = dict((info.filename, info) for info in previous_zip.infolist())
+
+        def _zip_info(filename, multimedia_id):
+            info = zipfile.ZipInfo(filename, date_time=time.localtime(time.time())[:6])
+            info.external_attr = 0600 << 16L
+            info.comment = str(multimedia_id)
+            return info
+
+        errors = []
+        fd, fpath = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as tmpfile:
+            media_zip = zipfile.ZipFile(tmpfile, "w", allowZip64=True)
+            try:
+                for path, media in self.get_media_objects():
+                    folder = path.replace(MULTIMEDIA_PREFIX, "")
+                    previous_info = previous_entries.get(folder)
+                    if previous_info is not None and previous_info.comment == str(media._id):
+                        media_zip.writestr(_zip_info(folder, media._id), previous_zip.read(previous_info))
+                        continue
+                    try:
+                        data, content_type = media.get_display_file()
+                        if not isinstance(data, unicode):
+                            media_zip.writestr(_zip_info(folder, media._id), data)
+                    except NameError as e:
+                        errors.append("%(path)s produced an ERROR: %(error)s" % {
+                            'path': path,
+                            'error': e,
+                        })
+            finally:
+                media_zip.close()
+        return fpath, errors
+
+    def fetch_media_zip(self):
+        """
+            Copies this build's prebuilt media zip to a temp file and returns its path.
+        """
+        fd, fpath = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as tmpfile:
+            shutil.copyfileobj(self.fetch_attachment(MEDIA_ZIP_ATTACHMENT, True), tmpfile)
+        return fpath
+
+    def save_media_zip(self, previous_build=None):
+        """
+            Builds the media zip for this build and attaches it, reusing the
+            unchanged entries of `previous_build`'s media zip if it has one.
+            Returns the list of errors, in which case nothing is attached.
+        """
+        previous_path = None
+        if previous_build is not None and getattr(previous_build, 'media_zip_stub', None):
+            previous_path = previous_build.fetch_media_zip()
+        try:
+            previous_zip = zipfile.ZipFile(previous_path) if previous_path else None
+            fpath, errors = self.create_media_zip(previous_zip)
+        finally:
+            if previous_path:
+                os.remove(previous_path)
+
+        try:
+            if not errors:
+                with open(fpath, 'rb') as media_zip:
+                    # fetch the latest rev so the attachment doesn't conflict with
+                    # changes made to the build since it was loaded
+                    self.get_db().put_attachment(self.get_db().get(self._id), media_zip,
+                                                 MEDIA_ZIP_ATTACHMENT, "application/zip",
+                                                 content_length=os.path.getsize(fpath))
+        finally:
+            os.remove(fpath)
+        return errors
+
     def get_object_map(self):
         object_map = {}
         for path, media_obj in self.get_media_objects():
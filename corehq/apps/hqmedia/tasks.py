@@ -115,3 +115,37 @@ def process_bulk_upload_zip(processing_id, domain, app_id, username=None, share_
     status.complete = True
     status.save()
 
+
+
+BUILD_MEDIA_ZIP_KEY = 'build-media-zip-%s'
+BUILD_MEDIA_ZIP_TIMEOUT = 60 * 60
+
+
+def queue_build_media_zip(domain, build_id, previous_build_id=None):
+    """
+        Queues build_media_zip for a build unless it's already queued or
+        running, e.g. from earlier downloads of the same build.
+    """
+    if cache.add(BUILD_MEDIA_ZIP_KEY % build_id, True, BUILD_MEDIA_ZIP_TIMEOUT):
+        build_media_zip.delay(domain, build_id, previous_build_id)
+
+
+@task
+def build_media_zip(domain, build_id, previous_build_id=None):
+    """
+        Prebuilds the multimedia zip for a saved build so that downloading it
+        doesn't have to fetch and zip every media file in the request.
+    """
+    try:
+        build = get_app(domain, build_id)
+        if not getattr(build, 'multimedia_map', None):
+            return
+        previous_build = get_app(domain, previous_build_id) if previous_build_id else None
+
+        build.remove_unused_mappings()
+        errors = build.save_media_zip(previous_build)
+        if errors:
+            logging.error("Errors building multimedia zip for domain %s and build %s: %s" % (
+                domain, build_id, "; ".join(errors)))
+    finally:
+        cache.delete(BUILD_MEDIA_ZIP_KEY % build_id)
@@ -0,0 +1,111 @@
+from StringIO import StringIO
+import os
+import zipfile
+from django.test import TestCase
+from django.test.client import RequestFactory
+import mock
+from corehq.apps.hqmedia import tasks
+from corehq.apps.hqmedia.models import HQMediaMixin, MEDIA_ZIP_ATTACHMENT
+from corehq.apps.hqmedia.tasks import queue_build_media_zip, build_media_zip, BUILD_MEDIA_ZIP_KEY
+from corehq.apps.hqmedia.views import DownloadMultimediaZip
+
+DOMAIN = 'media-zip-test'
+ZIP_CONTENT = 'PK-zip-content'
+STUB = {'content_type': 'application/zip', 'length': len(ZIP_CONTENT), 'digest': 'md5-abc123'}
+
+
+def _media(media_id, data):
+    media = mock.Mock(_id=media_id)
+    media.get_display_file.return_value = (data, 'image/png')
+    return media
+
+
+class CreateMediaZipTest(TestCase):
+
+    def setUp(self):
+        self.paths = []
+
+    def tearDown(self):
+        for path in self.paths:
+            os.remove(path)
+
+    def _create_media_zip(self, media_objects, previous_zip=None):
+        with mock.patch.object(HQMediaMixin, 'get_media_objects', return_value=media_objects):
+            fpath, errors = HQMediaMixin().create_media_zip(previous_zip)
+        self.paths.append(fpath)
+        self.assertEqual([], errors)
+        return zipfile.ZipFile(fpath)
+
+    def test_entries_reused(self):
+        unchanged, replaced = _media('media1', 'image one'), _media('media2', 'image two')
+        previous_zip = self._create_media_zip([
+            ('jr://file/commcare/image1.png', unchanged),
+            ('jr://file/commcare/image2.png', replaced),
+        ])
+        unchanged.reset_mock()
+
+        new = _media('media3', 'image three')
+        media_zip = self._create_media_zip([
+            ('jr://file/commcare/image1.png', unchanged),
+            ('jr://file/commcare/image2.png', new),
+        ], previous_zip)
+        self.assertEqual('image one', media_zip.read('commcare/image1.png'))
+        self.assertEqual('image three', media_zip.read('commcare/image2.png'))
+        # only the media that changed is fetched again
+        self.assertFalse(unchanged.get_display_file.called)
+        self.assertTrue(new.get_display_file.called)
+        self.assertEqual('media1', media_zip.getinfo('commcare/image1.png').comment)
+
+
+class PrebuiltZipResponseTest(TestCase):
+
+    def _response(self, **headers):
+        app = mock.Mock(media_zip_stub=STUB)
+        app.fetch_attachment.return_value = StringIO(ZIP_CONTENT)
+        view = DownloadMultimediaZip()
+        view.request = RequestFactory().get('/', **headers)
+        with mock.patch.object(DownloadMultimediaZip, 'app', property(lambda self: app)):
+            return view.prebuilt_zip_response(), app
+
+    def test_download(self):
+        response, app = self._response()
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"md5-abc123"', response['ETag'])
+        self.assertEqual(str(len(ZIP_CONTENT)), response['Content-Length'])
+        self.assertEqual(ZIP_CONTENT, ''.join(response))
+        app.fetch_attachment.assert_called_once_with(MEDIA_ZIP_ATTACHMENT, True)
+
+    def test_not_modified(self):
+        response, app = self._response(HTTP_IF_NONE_MATCH='"md5-abc123"')
+        self.assertEqual(304, response.status_code)
+        self.assertFalse(app.fetch_attachment.called)
+
+    def test_modified(self):
+        response, app = self._response(HTTP_IF_NONE_MATCH='"md5-old"')
+        self.assertEqual(200, response.status_code)
+
+
+class QueueBuildMediaZipTest(TestCase):
+
+    def setUp(self):
+        tasks.cache.delete(BUILD_MEDIA_ZIP_KEY % 'build1')
+
+    def tearDown(self):
+        tasks.cache.delete(BUILD_MEDIA_ZIP_KEY % 'build1')
+
+    def test_queued_once(self):
+        with mock.patch.object(build_media_zip, 'delay') as delay:
+            queue_build_media_zip(DOMAIN, 'build1', 'build0')
+            queue_build_media_zip(DOMAIN, 'build1')
+        delay.assert_called_once_with(DOMAIN, 'build1', 'build0')
+
+    def test_queued_again_after_build(self):
+        build = mock.Mock(multimedia_map={'jr://file/commcare/image1.png': None})
+        build.save_media_zip.return_value = []
+        with mock.patch.object(build_media_zip, 'delay') as delay, \
+                mock.patch.object(tasks, 'get_app', return_value=build):
+            queue_build_media_zip(DOMAIN, 'build1')
+            build_media_zip(DOMAIN, 'build1')
+            self.assertEqual(None, tasks.cache.get(BUILD_MEDIA_ZIP_KEY % 'build1'))
+            queue_build_media_zip(DOMAIN, 'build1')
+        self.assertEqual(2, delay.call_count)
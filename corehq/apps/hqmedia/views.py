@@ -1,6 +1,6 @@
 from StringIO import StringIO
+import hashlib
 from mimetypes import guess_all_extensions, guess_type
-import tempfile
 import zipfile
 import logging
 import os
@@ -13,7 +13,8 @@ from django.views.generic import View, TemplateView
 
 from couchdbkit.exceptions import ResourceNotFound
 
-from django.http import HttpResponse, Http404, HttpResponseRedirect, HttpResponseServerError, HttpResponseBadRequest
+from django.http import HttpResponse, Http404, HttpResponseRedirect, HttpResponseServerError, HttpResponseBadRequest, HttpResponseNotModified, \
+    StreamingHttpResponse
 
 from django.shortcuts import render
 
@@ -23,10 +24,11 @@ from corehq.apps.app_manager.models import get_app
 from corehq.apps.hqmedia.cache import BulkMultimediaStatusCache
 from corehq.apps.hqmedia.controller import MultimediaBulkUploadController, MultimediaImageUploadController, MultimediaAudioUploadController, MultimediaVideoUploadController
 from corehq.apps.hqmedia.decorators import login_with_permission_from_post
-from corehq.apps.hqmedia.models import CommCareImage, CommCareAudio, CommCareMultimedia, MULTIMEDIA_PREFIX, CommCareVideo
-from corehq.apps.hqmedia.tasks import process_bulk_upload_zip
+from corehq.apps.hqmedia.models import CommCareImage, CommCareAudio, CommCareMultimedia, CommCareVideo, MEDIA_ZIP_ATTACHMENT
+from corehq.apps.hqmedia.tasks import process_bulk_upload_zip, queue_build_media_zip
 from corehq.apps.users.decorators import require_permission
 from corehq.apps.users.models import Permissions
+from corehq.util.download import conditional_file_response
 from dimagi.utils.decorators.memoized import memoized
 from dimagi.utils.django.cached_object import CachedObject
 from soil.util import expose_download
@@ -405,27 +407,20 @@ class DownloadMultimediaZip(View, ApplicationViewMixin):
         return super(DownloadMultimediaZip, self).dispatch(request, *args, **kwargs)
 
     def get(self, request, *args, **kwargs):
-        errors = []
+        if self.app.copy_of and self.app.media_zip_stub:
+            return self.prebuilt_zip_response()
+
         self.app.remove_unused_mappings()
         if not self.app.multimedia_map:
             return HttpResponse("You have no multimedia to download.")
 
-        fd, fpath = tempfile.mkstemp()
-        tmpfile = os.fdopen(fd, 'w')
-        media_zip = zipfile.ZipFile(tmpfile, "w")
-        for path, media in self.app.get_media_objects():
-            try:
-                data, content_type = media.get_display_file()
-                folder = path.replace(MULTIMEDIA_PREFIX, "")
-                if not isinstance(data, unicode):
-                    media_zip.writestr(os.path.join(folder), data)
-            except NameError as e:
-                errors.append("%(path)s produced an ERROR: %(error)s" % {
-                    'path': path,
-                    'error': e,
-                })
-        media_zip.close()
+        if self.app.copy_of:
+            # builds made before media zips were prebuilt
+            queue_build_media_zip(self.domain, self.app_id)
+
+        fpath, errors = self.app.create_media_zip()
         if errors:
+            os.remove(fpath)
             logging.error("Error downloading multimedia ZIP for domain %s and application %s." %
                           (self.domain, self.app_id))
             return HttpResponseServerError("Errors were encountered while "
@@ -437,6 +432,19 @@ class DownloadMultimediaZip(View, ApplicationViewMixin):
         set_file_download(response, 'commcare.zip')
         return response
 
+    def prebuilt_zip_response(self):
+        stub = self.app.media_zip_stub
+        etag = '"%s"' % stub['digest']
+        if self.request.META.get('HTTP_IF_NONE_MATCH') == etag:
+            return HttpResponseNotModified()
+
+        wrapper = FileWrapper(self.app.fetch_attachment(MEDIA_ZIP_ATTACHMENT, True))
+        response = HttpResponse(wrapper, mimetype="application/zip")
+        response['Content-Length'] = stub['length']
+        response['ETag'] = etag
+        set_file_download(response, 'commcare.zip')
+        return response
+
 
 class MultimediaUploadStatusView(View):
     name = "hqmedia_upload_status"
@@ -514,10 +522,9 @@ class ViewMultimediaFile(View):
             if self.thumb:
                 data = CommCareImage.get_thumbnail_data(data, self.thumb)
             buffer = StringIO(data)
-            metadata = {'content_type': content_type}
+            metadata = {'content_type': content_type, 'etag': hashlib.md5(data).hexdigest()}
             obj.cache_put(buffer, metadata, timeout=0)
         else:
             metadata, buffer = obj.get()
-            data = buffer.getvalue()
-            content_type = metadata['content_type']
-        return HttpResponse(data, mimetype=content_type)
+        return conditional_file_response(request, StreamingHttpResponse(mimetype=metadata['content_type']),
+                                         buffer, etag=metadata.get('etag'))
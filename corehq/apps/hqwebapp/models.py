@@ -979,6 +979,8 @@ class AdminReportsTab(UITab):
                  'url': reverse('system_info')},
                 {'title': _('Mobile User Reports'),
                  'url': reverse('mobile_user_reports')},
+                {'title': _('Restore Timings'),
+                 'url': reverse('restore_timings')},
             ]),
             (_('Administrative Operations'), admin_operations)
         ]
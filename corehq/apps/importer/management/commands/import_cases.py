@@ -2,7 +2,7 @@ import json
 from datetime import datetime
 from django.core.management import BaseCommand, CommandError
 from corehq.apps.importer.tasks import do_import
-from corehq.apps.importer.util import ImporterConfig, ExcelFile
+from corehq.apps.importer.util import ImporterConfig, open_spreadsheet
 from corehq.apps.users.models import WebUser
 
 
@@ -28,6 +28,6 @@ class Command(BaseCommand):
             config = ImporterConfig.from_json(f.read())
 
         config.couch_user_id = user._id
-        spreadsheet = ExcelFile(export_file, True)
+        spreadsheet = open_spreadsheet(export_file, True)
         print json.dumps(do_import(spreadsheet, config, domain))
         print 'finished in %s seconds' % (datetime.now() - start).seconds
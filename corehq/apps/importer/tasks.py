@@ -1,9 +1,9 @@
 from celery.task import task
 from xml.etree import ElementTree
 from dimagi.utils.couch.database import is_bigcouch
+from dimagi.utils.chunked import chunked
 from dimagi.utils.parsing import json_format_datetime
 from casexml.apps.case.mock import CaseBlock, CaseBlockError
-from casexml.apps.case.models import CommCareCase
 from corehq.apps.hqcase.utils import submit_case_blocks
 from corehq.apps.importer.const import LookupErrors
 import corehq.apps.importer.util as importer_util
@@ -11,12 +11,12 @@ from corehq.apps.users.models import CouchUser
 from soil import DownloadBase
 from casexml.apps.case.xml import V2
 from dimagi.utils.prime_views import prime_views
-from couchdbkit.exceptions import ResourceNotFound
 import uuid
 
 POOL_SIZE = 10
 PRIME_VIEW_FREQUENCY = 500
 CASEBLOCK_CHUNKSIZE = 100
+LOOKUP_WINDOW_SIZE = 500
 
 @task
 def bulk_import_async(import_id, config, domain, excel_id):
@@ -45,40 +45,28 @@ def do_import(spreadsheet, config, domain, task=None, chunksize=CASEBLOCK_CHUNKS
 
     # keep a cache of id lookup successes to help performance
     id_cache = {}
+    # kwargs for the CaseBlocks waiting to be submitted
     caseblocks = []
-    ids_seen = set()
+    # cases created by this import, by external id, so that later rows can
+    # refer to them without waiting for them to be saved and looked up
+    created_cases = {}
+    pending_creates = []
 
     def _submit_caseblocks(caseblocks):
         if caseblocks:
             submit_case_blocks(
-                [ElementTree.tostring(cb.as_xml(format_datetime=json_format_datetime)) for cb in caseblocks],
+                [ElementTree.tostring(CaseBlock(**cb).as_xml(format_datetime=json_format_datetime)) for cb in caseblocks],
                 domain,
                 username,
                 user_id,
             )
+        # the cases created so far are now in the database
+        for created in pending_creates:
+            created['caseblock'] = None
+        del pending_creates[:]
 
-    for i in range(row_count):
-        if task:
-            DownloadBase.set_progress(task, i, row_count)
-
-        # skip first row if it is a header field
-        if i == 0 and config.named_columns:
-            continue
-
-        if not is_bigcouch():
-            priming_progress = match_count + created_count + prime_offset
-            if priming_progress % PRIME_VIEW_FREQUENCY == 0:
-                prime_views(POOL_SIZE)
-                # increment so we can't possibly prime on next iteration
-                prime_offset += 1
-
-        row = spreadsheet.get_row(i)
+    def _parse_row(i, row):
         search_id = importer_util.parse_search_id(config, columns, row)
-        if config.search_field == 'external_id' and not search_id:
-            # do not allow blank external id since we save this
-            blank_external_ids.append(i + 1)
-            continue
-
         try:
             fields_to_update = importer_util.populate_updated_fields(
                 config,
@@ -86,91 +74,136 @@ def do_import(spreadsheet, config, domain, task=None, chunksize=CASEBLOCK_CHUNKS
                 row
             )
         except importer_util.InvalidDateException:
-            invalid_dates.append(i + 1)
-            continue
-
-        external_id = fields_to_update.pop('external_id', None)
-        parent_id = fields_to_update.pop('parent_id', None)
-        parent_external_id = fields_to_update.pop('parent_external_id', None)
-        parent_type = fields_to_update.pop('parent_type', config.case_type)
-        parent_ref = fields_to_update.pop('parent_ref', 'parent')
-        to_close = fields_to_update.pop('close', False)
-
-        if any([lookup_id and lookup_id in ids_seen for lookup_id in [search_id, parent_id, parent_external_id]]):
-            # clear out the queue to make sure we've processed any potential
-            # cases we want to look up
-            # note: these three lines are repeated a few places, and could be converted
-            # to a function that makes use of closures (and globals) to do the same thing,
-            # but that seems sketchier than just beeing a little RY
-            _submit_caseblocks(caseblocks)
-            num_chunks += 1
-            caseblocks = []
-            ids_seen = set()  # also clear ids_seen, since all the cases will now be in the database
-
-        case, error = importer_util.lookup_case(
-            config.search_field,
-            search_id,
-            domain,
-            config.case_type
+            fields_to_update = None
+        return i, search_id, fields_to_update
+
+    def _rows():
+        # a single streaming pass over the sheet
+        for i, row in enumerate(spreadsheet.iter_rows()):
+            # skip first row if it is a header field
+            if i == 0 and config.named_columns:
+                continue
+            yield i, row
+
+    for window in chunked(_rows(), LOOKUP_WINDOW_SIZE):
+        parsed_rows = [_parse_row(i, row) for i, row in window]
+
+        # resolve every id this window refers to in bulk
+        case_lookup = importer_util.BulkCaseLookup(domain)
+        case_ids = []
+        external_ids = []
+        for i, search_id, fields_to_update in parsed_rows:
+            if config.search_field == 'case_id':
+                case_ids.append(search_id)
+            elif config.search_field == 'external_id':
+                external_ids.append(search_id)
+            if fields_to_update:
+                case_ids.append(fields_to_update.get('parent_id'))
+                external_ids.append(fields_to_update.get('parent_external_id'))
+        case_lookup.prefetch(
+            case_ids=case_ids,
+            external_ids=[id for id in external_ids if id not in created_cases],
         )
 
-        if case:
-            if case.type != config.case_type:
+        for i, search_id, fields_to_update in parsed_rows:
+            if task:
+                DownloadBase.set_progress(task, i, row_count)
+
+            if not is_bigcouch():
+                priming_progress = match_count + created_count + prime_offset
+                if priming_progress % PRIME_VIEW_FREQUENCY == 0:
+                    prime_views(POOL_SIZE)
+                    # increment so we can't possibly prime on next iteration
+                    prime_offset += 1
+
+            if config.search_field == 'external_id' and not search_id:
+                # do not allow blank external id since we save this
+                blank_external_ids.append(i + 1)
                 continue
-        elif error == LookupErrors.NotFound:
-            if not config.create_new_cases:
+
+            if fields_to_update is None:
+                invalid_dates.append(i + 1)
                 continue
-        elif error == LookupErrors.MultipleResults:
-            too_many_matches += 1
-            continue
-
-        uploaded_owner_id = fields_to_update.pop('owner_id', None)
-        if uploaded_owner_id:
-            # If an owner_id mapping exists, verify it is a valid user
-            # or case sharing group
-            if importer_util.is_valid_id(uploaded_owner_id, domain, id_cache):
-                owner_id = uploaded_owner_id
-                id_cache[uploaded_owner_id] = True
+
+            external_id = fields_to_update.pop('external_id', None)
+            parent_id = fields_to_update.pop('parent_id', None)
+            parent_external_id = fields_to_update.pop('parent_external_id', None)
+            parent_type = fields_to_update.pop('parent_type', config.case_type)
+            parent_ref = fields_to_update.pop('parent_ref', 'parent')
+            to_close = fields_to_update.pop('close', False)
+
+            created = None
+            if config.search_field == 'external_id' and search_id in created_cases:
+                # a case created earlier in this file
+                created = created_cases[search_id]
+                case, error = None, None
             else:
-                owner_id_errors.append(i + 1)
-                id_cache[uploaded_owner_id] = False
-                continue
-        else:
-            # if they didn't supply an owner_id mapping, default to current
-            # user
-            owner_id = user_id
+                case, error = case_lookup.lookup_case(
+                    config.search_field,
+                    search_id,
+                    config.case_type
+                )
 
-        extras = {}
-        if parent_id:
-            try:
-                parent_case = CommCareCase.get(parent_id)
+            if case:
+                if case.type != config.case_type:
+                    continue
+            elif not created:
+                if error == LookupErrors.NotFound:
+                    if not config.create_new_cases:
+                        continue
+                elif error == LookupErrors.MultipleResults:
+                    too_many_matches += 1
+                    continue
+
+            uploaded_owner_id = fields_to_update.pop('owner_id', None)
+            if uploaded_owner_id:
+                # If an owner_id mapping exists, verify it is a valid user
+                # or case sharing group
+                if importer_util.is_valid_id(uploaded_owner_id, domain, id_cache):
+                    owner_id = uploaded_owner_id
+                    id_cache[uploaded_owner_id] = True
+                else:
+                    owner_id_errors.append(i + 1)
+                    id_cache[uploaded_owner_id] = False
+                    continue
+            else:
+                # if they didn't supply an owner_id mapping, default to current
+                # user
+                owner_id = user_id
+
+            extras = {}
+            if parent_id:
+                parent_case = case_lookup.get_case(parent_id)
+                if not parent_case:
+                    continue
 
                 if parent_case.domain == domain:
                     extras['index'] = {
                         parent_ref: (parent_case.type, parent_id)
                     }
-            except ResourceNotFound:
-                continue
-        elif parent_external_id:
-            parent_case, error = importer_util.lookup_case(
-                'external_id',
-                parent_external_id,
-                domain,
-                parent_type
-            )
-            if parent_case:
-                extras['index'] = {
-                    parent_ref: (parent_type, parent_case._id)
-                }
+            elif parent_external_id:
+                if parent_external_id in created_cases and parent_type == config.case_type:
+                    extras['index'] = {
+                        parent_ref: (parent_type, created_cases[parent_external_id]['case_id'])
+                    }
+                else:
+                    parent_case, error = case_lookup.lookup_case(
+                        'external_id',
+                        parent_external_id,
+                        parent_type
+                    )
+                    if parent_case:
+                        extras['index'] = {
+                            parent_ref: (parent_type, parent_case._id)
+                        }
 
-        if not case:
-            id = uuid.uuid4().hex
+            if not case and not created:
+                id = uuid.uuid4().hex
 
-            if config.search_field == 'external_id':
-                extras['external_id'] = search_id
+                if config.search_field == 'external_id':
+                    extras['external_id'] = search_id
 
-            try:
-                caseblock = CaseBlock(
+                caseblock = dict(
                     create=True,
                     case_id=id,
                     version=V2,
@@ -180,39 +213,63 @@ def do_import(spreadsheet, config, domain, task=None, chunksize=CASEBLOCK_CHUNKS
                     update=fields_to_update,
                     **extras
                 )
-                caseblocks.append(caseblock)
-                created_count += 1
+                try:
+                    CaseBlock(**caseblock)
+                except CaseBlockError:
+                    errors += 1
+                else:
+                    caseblocks.append(caseblock)
+                    created_count += 1
+                    if external_id or 'external_id' in extras:
+                        created = {
+                            'case_id': id,
+                            'caseblock': caseblock,
+                        }
+                        created_cases[extras.get('external_id', external_id)] = created
+                        pending_creates.append(created)
+            else:
                 if external_id:
-                    ids_seen.add(external_id)
-            except CaseBlockError:
-                errors += 1
-        else:
-            if external_id:
-                extras['external_id'] = external_id
-            if uploaded_owner_id:
-                extras['owner_id'] = owner_id
-            if to_close == 'yes':
-                extras['close'] = True
-
-            try:
-                caseblock = CaseBlock(
-                    create=False,
-                    case_id=case._id,
-                    version=V2,
-                    update=fields_to_update,
-                    **extras
-                )
-                caseblocks.append(caseblock)
-                match_count += 1
-            except CaseBlockError:
-                errors += 1
-
-        # check if we've reached a reasonable chunksize
-        # and if so submit
-        if len(caseblocks) >= chunksize:
-            _submit_caseblocks(caseblocks)
-            num_chunks += 1
-            caseblocks = []
+                    extras['external_id'] = external_id
+                if uploaded_owner_id:
+                    extras['owner_id'] = owner_id
+                if to_close == 'yes':
+                    extras['close'] = True
+
+                if created and created['caseblock']:
+                    # the case hasn't been submitted yet, so fold this row's
+                    # changes into the block that creates it
+                    caseblock = dict(created['caseblock'], **extras)
+                    caseblock['update'] = dict(created['caseblock']['update'])
+                    caseblock['update'].update(fields_to_update)
+                    if 'index' in extras:
+                        caseblock['index'] = dict(created['caseblock'].get('index') or {})
+                        caseblock['index'].update(extras['index'])
+                else:
+                    caseblock = dict(
+                        create=False,
+                        case_id=case._id if case else created['case_id'],
+                        version=V2,
+                        update=fields_to_update,
+                        **extras
+                    )
+
+                try:
+                    CaseBlock(**caseblock)
+                except CaseBlockError:
+                    errors += 1
+                else:
+                    if caseblock.get('create'):
+                        created['caseblock'].update(caseblock)
+                    else:
+                        caseblocks.append(caseblock)
+                    match_count += 1
+
+            # check if we've reached a reasonable chunksize
+            # and if so submit
+            if len(caseblocks) >= chunksize:
+                _submit_caseblocks(caseblocks)
+                num_chunks += 1
+                caseblocks = []
 
 
     # final purge of anything left in the queue
@@ -1,10 +1,12 @@
+import os
+import tempfile
 from django.test import TestCase
 from casexml.apps.case.models import CommCareCase
 from casexml.apps.case.tests import delete_all_cases
 from corehq.apps.domain.shortcuts import create_domain
 from corehq.apps.hqcase.utils import get_case_ids_in_domain, get_cases_in_domain
 from corehq.apps.importer.tasks import do_import
-from corehq.apps.importer.util import ImporterConfig
+from corehq.apps.importer.util import ImporterConfig, open_spreadsheet, CsvFile
 from corehq.apps.users.models import WebUser
 
 
@@ -28,6 +30,10 @@ class MockExcelFile(object):
     def get_row(self, index):
         return self.row_generator(self, index)
 
+    def iter_rows(self):
+        for index in range(self.num_rows):
+            yield self.get_row(index)
+
 def default_row_generator(excel_file, index):
     # by default, just return [propertyname-rowid] for every cell
     return ['{col}-{row}'.format(row=index, col=col) for col in excel_file.header_columns]
@@ -214,7 +220,8 @@ class ImporterTest(TestCase):
         self.assertEqual(1, res['created_count'])
         self.assertEqual(2, res['match_count'])
         self.assertEqual(0, res['errors'])
-        self.assertEqual(2, res['num_chunks']) # the lookup causes an extra chunk
+        # the updates are folded into the pending create so no extra chunk is needed
+        self.assertEqual(1, res['num_chunks'])
 
         # should just create the one case
         self.assertEqual(1, len(get_case_ids_in_domain(self.domain)))
@@ -222,3 +229,45 @@ class ImporterTest(TestCase):
         self.assertEqual(external_id, case.external_id)
         for prop in self.default_headers[1:]:
             self.assertTrue(prop in case.get_case_property(prop))
+
+    def testParentExternalIdInSameFile(self):
+        headers = ['external_id', 'parent_external_id']
+        config = self._config(headers, search_field='external_id')
+        rows = [['parent-external-id', ''], ['child-external-id', 'parent-external-id']]
+        file = MockExcelFile(header_columns=headers, num_rows=2,
+                             row_generator=lambda excel_file, index: rows[index])
+
+        # the child should be linked to the parent created earlier in the file
+        # without having to submit the parent first
+        res = do_import(file, config, self.domain)
+        self.assertEqual(2, res['created_count'])
+        self.assertEqual(1, res['num_chunks'])
+
+        cases = dict((case.external_id, case) for case in get_cases_in_domain(self.domain))
+        [index] = cases['child-external-id'].indices
+        self.assertEqual(cases['parent-external-id']._id, index.referenced_id)
+
+
+class SpreadsheetFileTest(TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as f:
+            f.write('case_id,name,dob\nabc,b\xc3\xa1r,2013-01-02\ndef,foo,\n')
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def testCsv(self):
+        spreadsheet = open_spreadsheet(self.path, True)
+        self.assertTrue(isinstance(spreadsheet, CsvFile))
+        self.assertFalse(spreadsheet.has_errors)
+        self.assertEqual(['case_id', 'name', 'dob'], spreadsheet.get_header_columns())
+        self.assertEqual(3, spreadsheet.get_num_rows())
+        self.assertEqual([u'abc', u'b\xe1r', u'2013-01-02'], list(spreadsheet.iter_rows())[1])
+        self.assertEqual(set(['abc', 'def']), set(spreadsheet.get_unique_column_values(0)))
+
+    def testNoColumnHeaders(self):
+        spreadsheet = open_spreadsheet(self.path, False)
+        self.assertEqual(['Column 0', 'Column 1', 'Column 2'], spreadsheet.get_header_columns())
+        self.assertEqual(3, len(spreadsheet.get_column_values(0)))
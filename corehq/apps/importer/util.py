@@ -1,10 +1,12 @@
+import csv
 import json
 import xlrd
-from dimagi.utils.couch.database import get_db
+from dimagi.utils.couch.database import get_db, iter_docs
 from corehq.apps.importer.const import LookupErrors
-from datetime import date
+from datetime import date, datetime
 from casexml.apps.case.models import CommCareCase
 from xlrd import xldate_as_tuple
+from openpyxl.reader.excel import load_workbook
 from corehq.apps.groups.models import Group
 from corehq.apps.users.cases import get_wrapped_owner
 
@@ -100,20 +102,18 @@ class ImporterConfig(object):
 
         )
 
-class ExcelFile(object):
+class SpreadsheetFile(object):
     """
-    Class to deal with Excel files.
+    Base class for the spreadsheet formats the importer reads.
 
-    xlrd support for .xlsx isn't complete
-    NOTE: other code makes the assumption that this is the only supported
-    extension so if you fix this you should also fix these assumptions
-    (see get_spreadsheet)
+    Rows are read with iter_rows(), which streams through the file so that
+    the importer never needs the whole sheet in memory. The first row is
+    returned too, whether or not it is a header.
     """
 
-    ALLOWED_EXTENSIONS = ['xls']
+    ALLOWED_EXTENSIONS = ['xls', 'xlsx', 'csv']
 
     file_path = ''
-    workbook = None
     column_headers = False
     has_errors = False
 
@@ -121,8 +121,62 @@ class ExcelFile(object):
         self.file_path = file_path
         self.column_headers = column_headers
 
+    def iter_rows(self):
+        raise NotImplementedError()
+
+    def get_num_rows(self):
+        raise NotImplementedError()
+
+    def get_first_row(self):
+        for row in self.iter_rows():
+            return row
+        return []
+
+    def get_header_columns(self):
+        first_row = self.get_first_row()
+
+        if first_row:
+            if self.column_headers:
+                return first_row
+            else:
+                return ["Column %i" % (colnum,) for colnum in range(len(first_row))]
+        else:
+            return []
+
+    def _iter_data_rows(self):
+        rows = self.iter_rows()
+        if self.column_headers:
+            next(rows, None)
+        return rows
+
+    def get_column_values(self, column_index):
+        return [row[column_index] if column_index < len(row) else ''
+                for row in self._iter_data_rows()]
+
+    def get_unique_column_values(self, column_index):
+        return list(set(row[column_index] if column_index < len(row) else ''
+                        for row in self._iter_data_rows()))
+
+    def get_row(self, index):
+        for i, row in enumerate(self.iter_rows()):
+            if i == index:
+                return row
+
+
+class ExcelFile(SpreadsheetFile):
+    """
+    Excel 97/2000 .xls files.
+
+    xlrd can't stream .xls files, but it only loads the first sheet.
+    """
+
+    workbook = None
+
+    def __init__(self, file_path, column_headers):
+        super(ExcelFile, self).__init__(file_path, column_headers)
+
         try:
-            self.workbook = xlrd.open_workbook(self.file_path)
+            self.workbook = xlrd.open_workbook(self.file_path, on_demand=True)
         except Exception:
             self.has_errors = True
 
@@ -132,22 +186,12 @@ class ExcelFile(object):
         else:
             return None
 
-    def get_header_columns(self):
+    def get_first_row(self):
         sheet = self.get_first_sheet()
 
-        if sheet and sheet.ncols > 0:
-            columns = []
-
-            # get columns
-            if self.column_headers:
-                columns = sheet.row_values(0)
-            else:
-                for colnum in range(sheet.ncols):
-                    columns.append("Column %i" % (colnum,))
-
-            return columns
-        else:
-            return []
+        if sheet and sheet.nrows > 0:
+            return sheet.row_values(0)
+        return []
 
     def get_column_values(self, column_index):
         sheet = self.get_first_sheet()
@@ -160,9 +204,6 @@ class ExcelFile(object):
         else:
             return []
 
-    def get_unique_column_values(self, column_index):
-        return list(set(self.get_column_values(column_index)))
-
     def get_num_rows(self):
         sheet = self.get_first_sheet()
 
@@ -175,6 +216,89 @@ class ExcelFile(object):
         if sheet:
             return sheet.row_values(index)
 
+    def iter_rows(self):
+        sheet = self.get_first_sheet()
+
+        if sheet:
+            for index in range(sheet.nrows):
+                yield sheet.row_values(index)
+
+
+class XlsxFile(SpreadsheetFile):
+    """
+    Excel 2007+ .xlsx files, read with openpyxl's streaming iterators so
+    only the current row is ever in memory.
+    """
+
+    worksheet = None
+
+    def __init__(self, file_path, column_headers):
+        super(XlsxFile, self).__init__(file_path, column_headers)
+
+        try:
+            workbook = load_workbook(filename=self.file_path, use_iterators=True)
+            self.worksheet = workbook.worksheets[0]
+        except Exception:
+            self.has_errors = True
+
+    def get_num_rows(self):
+        if self.worksheet:
+            return self.worksheet.get_highest_row()
+
+    def iter_rows(self):
+        if self.worksheet:
+            for row in self.worksheet.iter_rows():
+                yield [cell.internal_value if cell.internal_value is not None else ''
+                       for cell in row]
+
+
+class CsvFile(SpreadsheetFile):
+    """
+    UTF-8 encoded .csv files, read one line at a time.
+    """
+
+    def __init__(self, file_path, column_headers):
+        super(CsvFile, self).__init__(file_path, column_headers)
+        self._num_rows = None
+
+    def get_num_rows(self):
+        """
+        Counted with a pass over the file that doesn't decode or keep any
+        of its rows, the first time it's asked for.
+        """
+        if self._num_rows is None:
+            with open(self.file_path, 'rb') as f:
+                self._num_rows = sum(1 for row in csv.reader(f))
+        return self._num_rows
+
+    def iter_rows(self):
+        with open(self.file_path, 'rb') as f:
+            for row in csv.reader(f):
+                yield [cell.decode('utf-8', 'replace') for cell in row]
+
+
+XLS_SIGNATURE = '\xd0\xcf\x11\xe0'
+XLSX_SIGNATURE = 'PK\x03\x04'
+
+
+def open_spreadsheet(file_path, column_headers):
+    """
+    Returns the right SpreadsheetFile for the file, going by its contents
+    since uploaded files are stored without their extension.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            signature = f.read(4)
+    except IOError:
+        signature = XLS_SIGNATURE  # let ExcelFile report the error
+
+    if signature == XLS_SIGNATURE:
+        return ExcelFile(file_path, column_headers)
+    elif signature == XLSX_SIGNATURE:
+        return XlsxFile(file_path, column_headers)
+    else:
+        return CsvFile(file_path, column_headers)
+
 def convert_custom_fields_to_struct(config):
     excel_fields = config.excel_fields
     case_fields = config.case_fields
@@ -202,7 +326,18 @@ class InvalidDateException(Exception):
 
 def parse_excel_date(date_val):
     """ Convert field value from excel to a date value """
-    if date_val:
+    if isinstance(date_val, datetime):
+        # .xlsx date cells come back as datetimes
+        parsed_date = str(date_val.date())
+    elif isinstance(date_val, date):
+        parsed_date = str(date_val)
+    elif isinstance(date_val, basestring) and date_val:
+        # .csv cells are plain text
+        try:
+            parsed_date = str(datetime.strptime(date_val.strip(), '%Y-%m-%d').date())
+        except ValueError:
+            raise InvalidDateException
+    elif date_val:
         try:
             parsed_date = str(date(*xldate_as_tuple(date_val, 0)[:3]))
         except Exception:
@@ -297,6 +432,68 @@ def lookup_case(search_field, search_id, domain, case_type):
     else:
         return (None, LookupErrors.NotFound)
 
+class BulkCaseLookup(object):
+    """
+    Answers the same questions as lookup_case, but for many rows at once.
+
+    Ids are registered in bulk with prefetch(), which fetches all the cases
+    by id in one _all_docs request and all the cases by external id in one
+    keyed view request. Lookups are then answered from memory, falling back
+    to a fetch for anything that wasn't prefetched.
+    """
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.cases_by_id = {}
+        self.cases_by_external_id = {}
+
+    def prefetch(self, case_ids=(), external_ids=()):
+        case_ids = set(filter(None, case_ids)) - set(self.cases_by_id)
+        if case_ids:
+            for case_id in case_ids:
+                self.cases_by_id[case_id] = None
+            for doc in iter_docs(CommCareCase.get_db(), list(case_ids)):
+                self.cases_by_id[doc['_id']] = CommCareCase.wrap(doc)
+
+        external_ids = set(filter(None, external_ids)) - set(self.cases_by_external_id)
+        if external_ids:
+            for external_id in external_ids:
+                self.cases_by_external_id[external_id] = []
+            results = CommCareCase.get_db().view(
+                'hqcase/by_domain_external_id',
+                keys=[[self.domain, external_id] for external_id in external_ids],
+                reduce=False,
+                include_docs=True,
+            )
+            for row in results:
+                self.cases_by_external_id[row['key'][1]].append(CommCareCase.wrap(row['doc']))
+
+    def get_case(self, case_id):
+        if case_id not in self.cases_by_id:
+            self.prefetch(case_ids=[case_id])
+        return self.cases_by_id.get(case_id)
+
+    def lookup_case(self, search_field, search_id, case_type):
+        """
+        Same contract as lookup_case: returns a tuple with case (if found)
+        and an error code (if there was an error in lookup).
+        """
+        if search_field == 'case_id':
+            case = self.get_case(search_id)
+            if case and case.domain == self.domain and case.type == case_type:
+                return (case, None)
+        elif search_field == 'external_id':
+            if search_id not in self.cases_by_external_id:
+                self.prefetch(external_ids=[search_id])
+            cases_by_type = [case for case in self.cases_by_external_id.get(search_id, [])
+                             if case.type == case_type]
+            if len(cases_by_type) > 1:
+                return (None, LookupErrors.MultipleResults)
+            elif cases_by_type:
+                return (cases_by_type[0], None)
+
+        return (None, LookupErrors.NotFound)
+
 def populate_updated_fields(config, columns, row):
     """
     Returns a dict map of fields that were marked to be updated
@@ -342,7 +539,7 @@ def populate_updated_fields(config, columns, row):
 def get_spreadsheet(download_ref, column_headers=True):
     if not download_ref:
         return None
-    return ExcelFile(download_ref.get_filename(), column_headers)
+    return open_spreadsheet(download_ref.get_filename(), column_headers)
 
 def is_user_or_case_sharing_group(owner):
     return not isinstance(owner, Group) or owner.case_sharing
@@ -2,7 +2,7 @@ import os.path
 from django.http import HttpResponseRedirect, HttpResponseServerError
 from casexml.apps.case.models import CommCareCase
 from corehq.apps.importer import base
-from corehq.apps.importer.util import ExcelFile, ImporterConfig
+from corehq.apps.importer.util import SpreadsheetFile, ImporterConfig
 import corehq.apps.importer.util as importer_util
 from corehq.apps.importer.tasks import bulk_import_async
 from django.views.decorators.http import require_POST
@@ -44,11 +44,11 @@ def excel_config(request, domain):
     # views if your worker changes, so we have to store it elsewhere
     # using the soil framework.
 
-    if extension not in ExcelFile.ALLOWED_EXTENSIONS:
+    if extension not in SpreadsheetFile.ALLOWED_EXTENSIONS:
         return render_error(request, domain,
                             'The Excel file you chose could not be processed. '
                             'Please check that it is saved as a Microsoft '
-                            'Excel 97/2000 .xls file.')
+                            'Excel .xls or .xlsx file, or as a .csv file.')
 
     # stash content in the default storage for subsequent views
     file_ref = expose_download(uploaded_file_handle.read(), expiry=1*60*60)
@@ -59,9 +59,9 @@ def excel_config(request, domain):
         return _spreadsheet_expired(request, domain)
 
     columns = spreadsheet.get_header_columns()
-    row_count = spreadsheet.get_num_rows()
 
-    if row_count == 0:
+    # only look at the first row so large files don't have to be read in full
+    if not spreadsheet.get_first_row():
         return render_error(request, domain,
                             'Your spreadsheet is empty. '
                             'Please try again with a different spreadsheet.')
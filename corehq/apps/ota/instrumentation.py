@@ -0,0 +1,217 @@
+"""
+Timing, size and db call counts for OTA restores and each of the
+fixture generators they run.
+
+A sample of restores (settings.RESTORE_TIMING_SAMPLE_RATE) is recorded
+to RestoreTiming / FixtureGeneratorTiming. Fixture generators opt in
+with the @instrumented_fixture_generator decorator, which does nothing
+unless the current restore is being recorded.
+"""
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+import logging
+import random
+import threading
+import time
+from xml.etree import ElementTree
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def get_current_timer():
+    return getattr(_local, 'timer', None)
+
+
+def _count_couch_request():
+    timer = get_current_timer()
+    if timer is not None:
+        timer.couch_requests += 1
+
+
+def _install_couch_request_counter():
+    from couchdbkit.resource import CouchdbResource
+    request = CouchdbResource.request
+    if getattr(request, 'counts_requests', False):
+        return
+
+    @wraps(request)
+    def counting_request(self, *args, **kwargs):
+        _count_couch_request()
+        return request(self, *args, **kwargs)
+    counting_request.counts_requests = True
+    CouchdbResource.request = counting_request
+
+
+class Measurement(object):
+    def __init__(self, timer):
+        self.timer = timer
+        self.duration = None
+        self.size = None
+        self.couch_requests = None
+        self.sql_queries = None
+
+    def __enter__(self):
+        self._start = time.time()
+        self._couch_requests = self.timer.couch_requests
+        self._sql_queries = self.timer.get_sql_query_count()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.time() - self._start
+        self.couch_requests = self.timer.couch_requests - self._couch_requests
+        self.sql_queries = self.timer.get_sql_query_count() - self._sql_queries
+
+
+class RestoreTimer(object):
+
+    def __init__(self, domain, username):
+        self.domain = domain
+        self.username = username
+        self.couch_requests = 0
+        self.restore = Measurement(self)
+        self.fixtures = []
+
+    def get_sql_query_count(self):
+        return sum([len(connection.queries) for connection in connections.all()])
+
+    @contextmanager
+    def measure_fixture(self, generator):
+        with Measurement(self) as measurement:
+            yield measurement
+        self.fixtures.append((generator, measurement))
+
+    def save(self):
+        from corehq.apps.ota.models import RestoreTiming, FixtureGeneratorTiming
+        restore = RestoreTiming.objects.create(
+            domain=self.domain,
+            username=self.username,
+            duration=self.restore.duration,
+            size=self.restore.size,
+            couch_requests=self.restore.couch_requests,
+            sql_queries=self.restore.sql_queries,
+        )
+        for generator, measurement in self.fixtures:
+            FixtureGeneratorTiming.objects.create(
+                restore=restore,
+                generator=generator,
+                duration=measurement.duration,
+                size=measurement.size or 0,
+                couch_requests=measurement.couch_requests,
+                sql_queries=measurement.sql_queries,
+            )
+
+
+def should_record_restore():
+    return random.random() < getattr(settings, 'RESTORE_TIMING_SAMPLE_RATE', 0)
+
+
+@contextmanager
+def restore_timer(domain, username):
+    """
+    Yields a RestoreTimer if this restore is sampled, otherwise None.
+    Set `timer.restore.size` before leaving the block to record the
+    response size.
+    """
+    if not should_record_restore():
+        yield None
+        return
+
+    _install_couch_request_counter()
+    debug_cursors = [(connection, connection.use_debug_cursor) for connection in connections.all()]
+    for connection, _ in debug_cursors:
+        # so that connection.queries gets populated outside of DEBUG
+        connection.use_debug_cursor = True
+
+    timer = _local.timer = RestoreTimer(domain, username)
+    try:
+        with timer.restore:
+            yield timer
+    finally:
+        _local.timer = None
+        for connection, use_debug_cursor in debug_cursors:
+            connection.use_debug_cursor = use_debug_cursor
+
+    try:
+        timer.save()
+    except Exception:
+        logger.exception("Unable to save restore timing for %s" % username)
+
+
+def instrumented_fixture_generator(fn):
+    """
+    Records the time, db calls and serialized size of a fixture generator
+    when it runs as part of a sampled restore.
+    """
+    name = '%s.%s' % (fn.__module__, fn.__name__)
+
+    @wraps(fn)
+    def _inner(user, version, last_sync):
+        timer = get_current_timer()
+        if timer is None:
+            return fn(user, version, last_sync)
+
+        with timer.measure_fixture(name) as measurement:
+            fixtures = list(fn(user, version, last_sync))
+        measurement.size = sum([len(ElementTree.tostring(fixture)) for fixture in fixtures])
+        return fixtures
+    return _inner
+
+
+PERCENTILES = (50, 90, 99)
+MEASURES = ('duration', 'size', 'couch_requests', 'sql_queries')
+
+
+def percentiles(values, pcts=PERCENTILES):
+    """
+    Nearest-rank percentiles of values
+    """
+    values = sorted(values)
+    if not values:
+        return [None for pct in pcts]
+    return [values[max(int(round(pct / 100. * len(values))) - 1, 0)] for pct in pcts]
+
+
+def _summarize(rows):
+    summary = {'count': len(rows)}
+    for i, measure in enumerate(MEASURES):
+        summary[measure] = percentiles([row[i] for row in rows if row[i] is not None])
+    summary['duration'] = [round(value, 3) if value is not None else None for value in summary['duration']]
+    return summary
+
+
+def restore_timing_stats(since, domain=None):
+    """
+    Percentiles of each measure per domain for the restores recorded since
+    `since`, broken down by fixture generator. Slowest domains (by 90th
+    percentile duration) first.
+    """
+    from corehq.apps.ota.models import RestoreTiming, FixtureGeneratorTiming
+    restores = RestoreTiming.objects.filter(date__gte=since)
+    fixtures = FixtureGeneratorTiming.objects.filter(restore__date__gte=since)
+    if domain:
+        restores = restores.filter(domain=domain)
+        fixtures = fixtures.filter(restore__domain=domain)
+
+    restores_by_domain = defaultdict(list)
+    for row in restores.values_list('domain', *MEASURES):
+        restores_by_domain[row[0]].append(row[1:])
+    fixtures_by_domain = defaultdict(lambda: defaultdict(list))
+    for row in fixtures.values_list('restore__domain', 'generator', *MEASURES):
+        fixtures_by_domain[row[0]][row[1]].append(row[2:])
+
+    stats = []
+    for domain, rows in restores_by_domain.items():
+        summary = _summarize(rows)
+        summary['domain'] = domain
+        summary['generators'] = []
+        for generator, generator_rows in sorted(fixtures_by_domain[domain].items()):
+            generator_summary = _summarize(generator_rows)
+            generator_summary['generator'] = generator
+            summary['generators'].append(generator_summary)
+        stats.append(summary)
+    return sorted(stats, key=lambda summary: summary['duration'][1], reverse=True)
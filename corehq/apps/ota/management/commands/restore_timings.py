@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from optparse import make_option
+from django.core.management.base import BaseCommand
+from corehq.apps.ota.instrumentation import restore_timing_stats, PERCENTILES
+
+
+def _format(values, fmt):
+    return ' / '.join(['-' if value is None else fmt % value for value in values])
+
+
+class Command(BaseCommand):
+    args = '[domain]'
+    help = ("Percentiles (%s) of sampled OTA restore timings per domain and fixture generator, "
+            "slowest domains first" % '/'.join(map(str, PERCENTILES)))
+    option_list = BaseCommand.option_list + (
+        make_option('--days',
+                    action='store',
+                    type='int',
+                    dest='days',
+                    default=7,
+                    help='Only include restores from the last N days'),
+        make_option('--limit',
+                    action='store',
+                    type='int',
+                    dest='limit',
+                    default=20,
+                    help='Number of domains to show'),
+    )
+
+    def handle(self, *args, **options):
+        domain = args[0] if args else None
+        since = datetime.utcnow() - timedelta(days=options['days'])
+        for summary in restore_timing_stats(since, domain=domain)[:options['limit']]:
+            print "%s (%d restores)" % (summary['domain'], summary['count'])
+            self.print_summary('restore', summary)
+            for generator in summary['generators']:
+                self.print_summary(generator['generator'], generator)
+            print
+
+    def print_summary(self, name, summary):
+        print "    %-60s time (s): %s  size (KB): %s  couch: %s  sql: %s" % (
+            name,
+            _format(summary['duration'], '%.2f'),
+            _format([size / 1024. if size is not None else None for size in summary['size']], '%.1f'),
+            _format(summary['couch_requests'], '%d'),
+            _format(summary['sql_queries'], '%d'),
+        )
@@ -0,0 +1,70 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+
+        # Adding model 'RestoreTiming'
+        db.create_table('ota_restoretiming', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('domain', self.gf('django.db.models.fields.CharField')(max_length=255, db_index=True)),
+            ('username', self.gf('django.db.models.fields.CharField')(max_length=255)),
+            ('date', self.gf('django.db.models.fields.DateTimeField')(default=datetime.datetime.utcnow, db_index=True)),
+            ('duration', self.gf('django.db.models.fields.FloatField')()),
+            ('size', self.gf('django.db.models.fields.IntegerField')(null=True)),
+            ('couch_requests', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('sql_queries', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal('ota', ['RestoreTiming'])
+
+        # Adding model 'FixtureGeneratorTiming'
+        db.create_table('ota_fixturegeneratortiming', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('restore', self.gf('django.db.models.fields.related.ForeignKey')(related_name='fixture_timings', to=orm['ota.RestoreTiming'])),
+            ('generator', self.gf('django.db.models.fields.CharField')(max_length=255, db_index=True)),
+            ('duration', self.gf('django.db.models.fields.FloatField')()),
+            ('size', self.gf('django.db.models.fields.IntegerField')()),
+            ('couch_requests', self.gf('django.db.models.fields.IntegerField')(default=0)),
+            ('sql_queries', self.gf('django.db.models.fields.IntegerField')(default=0)),
+        ))
+        db.send_create_signal('ota', ['FixtureGeneratorTiming'])
+
+
+    def backwards(self, orm):
+
+        # Deleting model 'RestoreTiming'
+        db.delete_table('ota_restoretiming')
+
+        # Deleting model 'FixtureGeneratorTiming'
+        db.delete_table('ota_fixturegeneratortiming')
+
+
+    models = {
+        'ota.fixturegeneratortiming': {
+            'Meta': {'object_name': 'FixtureGeneratorTiming'},
+            'couch_requests': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'duration': ('django.db.models.fields.FloatField', [], {}),
+            'generator': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'restore': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'fixture_timings'", 'to': "orm['ota.RestoreTiming']"}),
+            'size': ('django.db.models.fields.IntegerField', [], {}),
+            'sql_queries': ('django.db.models.fields.IntegerField', [], {'default': '0'})
+        },
+        'ota.restoretiming': {
+            'Meta': {'object_name': 'RestoreTiming'},
+            'couch_requests': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'date': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.utcnow', 'db_index': 'True'}),
+            'domain': ('django.db.models.fields.CharField', [], {'max_length': '255', 'db_index': 'True'}),
+            'duration': ('django.db.models.fields.FloatField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'size': ('django.db.models.fields.IntegerField', [], {'null': 'True'}),
+            'sql_queries': ('django.db.models.fields.IntegerField', [], {'default': '0'}),
+            'username': ('django.db.models.fields.CharField', [], {'max_length': '255'})
+        }
+    }
+
+    complete_apps = ['ota']
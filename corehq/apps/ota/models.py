@@ -0,0 +1,27 @@
+from datetime import datetime
+from django.db import models
+
+
+class RestoreTiming(models.Model):
+    """
+    Timing and size of a (sampled) OTA restore. See ota.instrumentation.
+    """
+    domain = models.CharField(max_length=255, db_index=True)
+    username = models.CharField(max_length=255)
+    date = models.DateTimeField(default=datetime.utcnow, db_index=True)
+    duration = models.FloatField()  # seconds
+    size = models.IntegerField(null=True)  # bytes in the response
+    couch_requests = models.IntegerField(default=0)
+    sql_queries = models.IntegerField(default=0)
+
+
+class FixtureGeneratorTiming(models.Model):
+    """
+    The share of a restore spent in one of settings.FIXTURE_GENERATORS
+    """
+    restore = models.ForeignKey(RestoreTiming, related_name='fixture_timings')
+    generator = models.CharField(max_length=255, db_index=True)
+    duration = models.FloatField()  # seconds
+    size = models.IntegerField()  # bytes of serialized fixture xml
+    couch_requests = models.IntegerField(default=0)
+    sql_queries = models.IntegerField(default=0)
@@ -1,4 +1,5 @@
 from corehq.apps.domain.models import Domain
+from corehq.apps.ota.instrumentation import restore_timer
 from corehq.apps.users.models import CouchUser
 from django_digest.decorators import *
 from casexml.apps.phone.restore import RestoreConfig
@@ -48,4 +49,8 @@ def get_restore_response(domain, couch_user, since=None, version='1.0',
         items=items,
         stock_settings=stock_settings,
     )
-    return restore_config.get_response()
+    with restore_timer(domain, couch_user.username) as timer:
+        response = restore_config.get_response()
+        if timer and not getattr(response, 'streaming', False):
+            timer.restore.size = len(response.content)
+    return response
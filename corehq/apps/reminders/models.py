@@ -1,7 +1,10 @@
+import logging
 import pytz
 from pytz import timezone
 from datetime import timedelta, datetime, date, time
 import re
+import uuid
+from copy import deepcopy
 from couchdbkit.ext.django.schema import *
 from casexml.apps.case.models import CommCareCase, CommCareCaseGroup
 from corehq.apps.sms.models import CommConnectCase
@@ -11,11 +14,16 @@ from corehq.apps.groups.models import Group
 from dimagi.utils.parsing import string_to_datetime, json_format_datetime
 from dateutil.parser import parse
 from corehq.apps.reminders.util import get_form_name
-from couchdbkit.exceptions import ResourceConflict
+from couchdbkit.exceptions import ResourceConflict, BulkSaveError
 from couchdbkit.resource import ResourceNotFound
 from corehq.apps.sms.util import create_task, close_task, update_task
 from corehq.apps.smsforms.app import submit_unfinished_form
 from dimagi.utils.couch import LockableMixIn
+from dimagi.utils.couch.database import iter_docs
+from django.core.cache import cache
+from corehq.util.couch_helpers import paginate_view
+from corehq.util.lru import LRUCache
+from dimagi.utils.chunked import chunked
 from random import randint
 
 METHOD_SMS = "sms"
@@ -229,6 +237,34 @@ class CaseReminderEvent(DocumentSchema):
     callback_timeout_intervals = ListProperty(IntegerProperty)
     form_unique_id = StringProperty()
 
+HANDLERS_VERSION_KEY = 'reminder-handlers-version-%s'
+HANDLERS_VERSION_TIMEOUT = 24 * 60 * 60
+
+RECALCULATION_PROGRESS_KEY = 'reminder-handler-recalculation-%s'
+RECALCULATION_PROGRESS_TIMEOUT = 7 * 24 * 60 * 60
+RECALCULATION_CHUNK_SIZE = 100
+
+# set while a reminder is queued to fire at a given next_fire
+QUEUED_KEY = 'reminder-queued-%s-%s'
+QUEUED_KEY_TIMEOUT = 10 * 60
+
+# CASE_CRITERIA handlers by (domain, handlers version)
+_case_criteria_handlers = LRUCache(maxsize=500)
+
+
+def get_handlers_version(domain):
+    key = HANDLERS_VERSION_KEY % domain
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        cache.set(key, version, HANDLERS_VERSION_TIMEOUT)
+    return version
+
+
+def bump_handlers_version(domain):
+    cache.set(HANDLERS_VERSION_KEY % domain, uuid.uuid4().hex, HANDLERS_VERSION_TIMEOUT)
+
+
 class CaseReminderHandler(Document):
     """
     A CaseReminderHandler defines the rules and schedule which govern how messages 
@@ -786,20 +822,34 @@ class CaseReminderHandler(Document):
         
         return  void
         """
-        now = now or self.get_now()
         reminder = self.get_reminder(case)
+        for changed_reminder in self.evaluate_case(case, reminder, now=now, schedule_changed=schedule_changed,
+                                                   prev_definition=prev_definition):
+            changed_reminder.save()
+
+    def evaluate_case(self, case, reminder, now=None, schedule_changed=False, prev_definition=None):
+        """
+        Does the work of case_changed() for a case and its current reminder for
+        this handler (None if there isn't one) without saving anything.
         
-        try:
-            if (case.user_id == case._id) or (case.user_id is None):
-                user = None
-            else:
+        return  The reminders that need to be saved: the reminder if it was retired
+                or changed, and any reminder that was spawned.
+        """
+        now = now or self.get_now()
+        original_reminder_json = deepcopy(reminder.to_json()) if reminder else None
+        to_save = []
+
+        user = None
+        if self.recipient == RECIPIENT_USER and case.user_id and case.user_id != case._id:
+            try:
                 user = CommCareUser.get_by_user_id(case.user_id)
-        except Exception:
-            user = None
+            except Exception:
+                user = None
         
         if not self.active or case.closed or case.type != self.case_type or case.doc_type.endswith("-Deleted") or (self.recipient == RECIPIENT_USER and not user):
             if reminder:
-                reminder.retire()
+                reminder.doc_type += "-Deleted"
+                to_save.append(reminder)
         else:
             start_condition_reached = case_matches_criteria(case, self.start_match_type, self.start_property, self.start_value)
             start_date = get_case_property(case, self.start_date)
@@ -823,11 +873,13 @@ class CaseReminderHandler(Document):
             if reminder is not None:
                 if not start_condition_reached:
                     # The start condition is no longer valid, so retire the reminder
-                    reminder.retire()
+                    reminder.doc_type += "-Deleted"
+                    to_save.append(reminder)
                     reminder = None
                 elif reminder.start_condition_datetime != start_condition_datetime:
                     # The start date has changed, so retire the reminder and it will be spawned again in the next block
-                    reminder.retire()
+                    reminder.doc_type += "-Deleted"
+                    to_save.append(reminder)
                     reminder = None
             
             # Spawn a reminder if need be
@@ -851,7 +903,10 @@ class CaseReminderHandler(Document):
                     else:
                         reminder.active = active
                 
-                reminder.save()
+                # most case updates don't touch the reminder, so only write it when it changed
+                if just_spawned or reminder.to_json() != original_reminder_json:
+                    to_save.append(reminder)
+        return to_save
     
     def datetime_definition_changed(self, send_immediately=False):
         """
@@ -909,19 +964,112 @@ class CaseReminderHandler(Document):
         prev_definition = params.pop("prev_definition", None)
         send_immediately = params.pop("send_immediately", False)
         super(CaseReminderHandler, self).save(**params)
+        bump_handlers_version(self.domain)
         if not self.deleted():
             if self.start_condition_type == CASE_CRITERIA:
-                cases = CommCareCase.view('hqcase/types_by_domain',
-                    reduce=False,
-                    startkey=[self.domain],
-                    endkey=[self.domain, {}],
-                    include_docs=True,
-                ).all()
-                for case in cases:
-                    self.case_changed(case, schedule_changed=schedule_changed, prev_definition=prev_definition)
+                self.start_case_recalculation(schedule_changed=schedule_changed, prev_definition=prev_definition)
             elif self.start_condition_type == ON_DATETIME:
                 self.datetime_definition_changed(send_immediately=send_immediately)
     
+    def start_case_recalculation(self, schedule_changed=False, prev_definition=None):
+        """
+        Queues a background job that re-evaluates every case in the domain
+        against this revision of the handler, and restarts the recalculation
+        progress for it. The job checks the handler's revision before each
+        chunk, so a job still running for an earlier revision stops at its
+        next chunk and no longer records progress. If that job hadn't
+        finished applying a schedule change, this one applies it too.
+        """
+        from corehq.apps.reminders.tasks import recalculate_case_reminders
+        progress = self.get_recalculation_progress()
+        if progress and not progress['complete'] and progress['schedule_changed'] and not schedule_changed:
+            schedule_changed = True
+            prev_definition = progress['prev_definition']
+        elif prev_definition is not None:
+            prev_definition = prev_definition.to_json()
+
+        total = CommCareCase.get_db().view('hqcase/types_by_domain',
+            startkey=[self.domain],
+            endkey=[self.domain, {}],
+            reduce=True,
+        ).one()
+        self.set_recalculation_progress({
+            'rev': self._rev,
+            'total': total['value'] if total else 0,
+            'processed': 0,
+            'complete': False,
+            'schedule_changed': schedule_changed,
+            'prev_definition': prev_definition,
+        })
+        recalculate_case_reminders.delay(self._id, self._rev, schedule_changed, prev_definition)
+
+    def get_recalculation_progress(self):
+        """
+        The total and processed number of cases of the handler's latest
+        recalculation job, or None if there hasn't been one lately.
+        """
+        return cache.get(RECALCULATION_PROGRESS_KEY % self._id)
+
+    def set_recalculation_progress(self, progress):
+        cache.set(RECALCULATION_PROGRESS_KEY % self._id, progress, RECALCULATION_PROGRESS_TIMEOUT)
+
+    def update_recalculation_progress(self, processed=0, complete=False):
+        """
+        Records progress of the recalculation job for this revision of the
+        handler. Progress that belongs to a job for another revision is left
+        alone.
+        """
+        progress = self.get_recalculation_progress()
+        if progress and progress.get('rev') == self._rev:
+            progress['processed'] += processed
+            progress['complete'] = progress['complete'] or complete
+            self.set_recalculation_progress(progress)
+
+    def iter_case_recalculation(self, schedule_changed=False, prev_definition=None, cursor=None):
+        """
+        Re-evaluates the domain's cases in chunks, starting after `cursor`
+        (a position in the hqcase/types_by_domain view) if given, and yields
+        the cursor of the last case after each chunk so that the caller can
+        resume from there.
+        """
+        rows = paginate_view(CommCareCase.get_db(), 'hqcase/types_by_domain', RECALCULATION_CHUNK_SIZE,
+                             cursor=cursor, startkey=[self.domain], endkey=[self.domain, {}])
+        for chunk in chunked(rows, RECALCULATION_CHUNK_SIZE):
+            self._recalculate_cases([row['id'] for row in chunk], schedule_changed, prev_definition)
+            self.update_recalculation_progress(processed=len(chunk))
+            yield {'startkey': chunk[-1]['key'], 'startkey_docid': chunk[-1]['id']}
+
+    def _recalculate_cases(self, case_ids, schedule_changed, prev_definition):
+        now = self.get_now()
+        cases = dict([(doc['_id'], CommCareCase.wrap(doc)) for doc in
+                      iter_docs(CommCareCase.get_db(), case_ids)])
+        if not cases:
+            return
+        reminders = dict([(reminder.case_id, reminder) for reminder in CaseReminder.view(
+            'reminders/by_domain_handler_case',
+            keys=[[self.domain, self._id, case_id] for case_id in cases],
+            include_docs=True,
+        )])
+
+        to_save = []
+        for case_id, case in cases.items():
+            reminder = reminders.get(case_id)
+            if reminder is not None:
+                reminder._handler = self
+                reminder._case = case
+            to_save.extend(self.evaluate_case(case, reminder, now=now, schedule_changed=schedule_changed,
+                                              prev_definition=prev_definition))
+        if not to_save:
+            return
+        try:
+            CaseReminder.bulk_save(to_save)
+        except BulkSaveError as e:
+            # reminders that fired or were updated since they were loaded
+            conflicted_ids = set([error['id'] for error in e.errors])
+            for case_id in set([r.case_id for r in to_save if r._id in conflicted_ids]):
+                self.case_changed(cases[case_id], schedule_changed=schedule_changed,
+                                  prev_definition=prev_definition)
+
     @classmethod
     def get_handlers(cls, domain, case_type=None):
         key = [domain]
@@ -933,6 +1081,25 @@ class CaseReminderHandler(Document):
             include_docs=True,
         )
 
+    @classmethod
+    def get_case_criteria_handlers(cls, domain):
+        """
+        The domain's CASE_CRITERIA handlers (including inactive ones, which
+        still need to retire their reminders), kept in memory until one of
+        the domain's handlers is saved or deleted.
+        """
+        key = (domain, get_handlers_version(domain))
+        handlers = _case_criteria_handlers.get(key)
+        if handlers is None:
+            handlers = [handler for handler in cls.get_handlers(domain)
+                        if handler.start_condition_type == CASE_CRITERIA]
+            _case_criteria_handlers.set(key, handlers)
+        return handlers
+
+    def delete(self):
+        super(CaseReminderHandler, self).delete()
+        bump_handlers_version(self.domain)
+
     @classmethod
     def get_referenced_forms(cls, domain):
         handlers = cls.get_handlers(domain=domain).all()
@@ -956,22 +1123,82 @@ class CaseReminderHandler(Document):
     @classmethod
     def fire_reminders(cls, now=None):
         now = now or cls.get_now()
-        for reminder in cls.get_all_reminders(due_before=now):
-            if reminder.acquire_lock(now) and now >= reminder.next_fire:
-                handler = reminder.handler
-                if handler.fire(reminder):
-                    handler.set_next_fire(reminder, now)
-                    try:
-                        reminder.save()
-                    except ResourceConflict:
-                        # Submitting a form updates the case, which can update the reminder.
-                        # Grab the latest version of the reminder and set the next fire if it's still in use.
-                        reminder = CaseReminder.get(reminder._id)
-                        if not reminder.retired:
-                            handler.set_next_fire(reminder, now)
+        reminder_ids = [row['id'] for row in CaseReminder.get_db().view('reminders/by_next_fire',
+            startkey=[None],
+            endkey=[None, json_format_datetime(now)],
+            include_docs=False,
+        )]
+        cls.fire_reminders_by_id(reminder_ids, now=now)
+
+    @classmethod
+    def fire_reminders_by_id(cls, reminder_ids, now=None):
+        """
+        Fires the given reminders that are still due. Their handlers, cases
+        and users are loaded in bulk up front rather than once per reminder,
+        and the lag between each reminder's scheduled and actual fire time
+        is logged. Reminders that aren't fired are marked as no longer queued
+        so that they can be queued again on the next run.
+        """
+        now = now or cls.get_now()
+        docs = [doc for doc in iter_docs(CaseReminder.get_db(), reminder_ids) if doc['doc_type'] == 'CaseReminder']
+        # keyed by next_fire as it was queued, before wrapping reformats it
+        queued_keys = dict([(doc['_id'], QUEUED_KEY % (doc['_id'], doc.get('next_fire'))) for doc in docs])
+        reminders = [CaseReminder.wrap(doc) for doc in docs]
+        handlers = dict([(doc['_id'], cls.wrap(doc)) for doc in
+                         iter_docs(cls.get_db(), list(set([r.handler_id for r in reminders])))])
+        case_docs = dict([(doc['_id'], doc) for doc in
+                          iter_docs(CommCareCase.get_db(), list(set([r.case_id for r in reminders if r.case_id])))])
+        user_ids = set([r.user_id for r in reminders if r.user_id and r.handler_id in handlers and
+                        handlers[r.handler_id].recipient == RECIPIENT_USER])
+        user_docs = dict([(doc['_id'], doc) for doc in iter_docs(CouchUser.get_db(), list(user_ids))
+                          if doc['doc_type'] == 'CommCareUser'])
+
+        lags = []
+        fired_ids = set()
+        for reminder in reminders:
+            if not reminder.active or reminder.error:
+                # deactivated since it was queued
+                continue
+            if reminder.handler_id in handlers:
+                reminder._handler = handlers[reminder.handler_id]
+            if reminder.case_id in case_docs:
+                reminder._case = CommCareCase.wrap(deepcopy(case_docs[reminder.case_id]))
+            if reminder.user_id in user_docs:
+                reminder._user = CommCareUser.wrap(deepcopy(user_docs[reminder.user_id]))
+
+            if not reminder.acquire_lock(now):
+                continue
+            try:
+                if now >= reminder.next_fire:
+                    lags.append(now - reminder.next_fire)
+                    handler = reminder.handler
+                    fired = handler.fire(reminder)
+                    # the case and user may have changed while firing
+                    reminder._case = reminder._user = None
+                    if fired:
+                        handler.set_next_fire(reminder, now)
+                        try:
                             reminder.save()
+                        except ResourceConflict:
+                            # Submitting a form updates the case, which can update the reminder.
+                            # Grab the latest version of the reminder and set the next fire if it's still in use.
+                            reminder = CaseReminder.get(reminder._id)
+                            if not reminder.retired:
+                                handler.set_next_fire(reminder, now)
+                                reminder.save()
+                        fired_ids.add(reminder._id)
+            except Exception:
+                # don't let one reminder hold up the rest of the batch
+                logging.exception("Error firing reminder %s" % reminder._id)
+            finally:
                 reminder.release_lock()
 
+        cache.delete_many([key for reminder_id, key in queued_keys.items() if reminder_id not in fired_ids])
+        if lags:
+            lag_seconds = [lag.days * 86400 + lag.seconds for lag in lags]
+            logging.info("Fired %d reminders, firing lag in seconds: mean %d, max %d" % (
+                len(lag_seconds), sum(lag_seconds) / len(lag_seconds), max(lag_seconds)))
+
     def retire(self):
         reminders = self.get_reminders()
         self.doc_type += "-Deleted"
@@ -1012,8 +1239,14 @@ class CaseReminder(Document, LockableMixIn):
     error = BooleanProperty(default=False)
     error_msg = StringProperty()
     
+    _handler = None
+    _case = None
+    _user = None
+
     @property
     def handler(self):
+        if self._handler is not None:
+            return self._handler
         return CaseReminderHandler.get(self.handler_id)
 
     @property
@@ -1022,7 +1255,9 @@ class CaseReminder(Document, LockableMixIn):
 
     @property
     def case(self):
-        if self.case_id is not None:
+        if self._case is not None:
+            return self._case
+        elif self.case_id is not None:
             return CommCareCase.get(self.case_id)
         else:
             return None
@@ -1030,6 +1265,8 @@ class CaseReminder(Document, LockableMixIn):
     @property
     def user(self):
         if self.handler.recipient == RECIPIENT_USER:
+            if self._user is not None:
+                return self._user
             try:
                 return CommCareUser.get_by_user_id(self.user_id)
             except Exception:
@@ -1051,6 +1288,8 @@ class CaseReminder(Document, LockableMixIn):
         if handler.recipient == RECIPIENT_USER:
             return self.user
         elif handler.recipient == RECIPIENT_CASE:
+            if self._case is not None:
+                return CommConnectCase.wrap_as_commconnect_case(self._case)
             return CommConnectCase.get(self.case_id)
         elif handler.recipient == RECIPIENT_SURVEY_SAMPLE:
             return CommCareCaseGroup.get(self.sample_id)
@@ -1,30 +1,29 @@
 import logging
 from casexml.apps.case.models import CommCareCase
 from casexml.apps.case.signals import case_post_save
-from corehq.apps.reminders.models import CaseReminderHandler, CASE_CRITERIA
+from django.conf import settings
+from django.core.cache import cache
+from corehq.apps.reminders.models import CaseReminderHandler
 
-def get_subcases(case):
-    indices = case.reverse_indices
-    subcases = []
-    for index in indices:
-        if index.identifier == "parent":
-            subcases.append(CommCareCase.get(index.referenced_id))
-    return subcases
+CASE_CHANGED_KEY = 'reminders-case-changed-%s'
+CASE_CHANGED_KEY_TIMEOUT = 5 * 60
 
 def case_changed_receiver(sender, case, **kwargs):
+    """
+    Queues the case to have its reminders re-evaluated rather than doing it
+    on the case save path. Saves of the same case made before that happens
+    are coalesced into one evaluation, which reloads the case.
+    """
     try:
-        subcases = None
-        handlers = CaseReminderHandler.get_handlers(case.domain)
-        for handler in handlers:
-            if handler.start_condition_type == CASE_CRITERIA:
-                handler.case_changed(case)
-                if handler.uses_parent_case_property:
-                    if subcases is None:
-                        subcases = get_subcases(case)
-                    for subcase in subcases:
-                        handler.case_changed(subcase)
+        if not CaseReminderHandler.get_case_criteria_handlers(case.domain):
+            return
+        key = CASE_CHANGED_KEY % case._id
+        # if the cache is unavailable, queue it anyway rather than drop it
+        if cache.add(key, True, CASE_CHANGED_KEY_TIMEOUT) or cache.get(key) is None:
+            from corehq.apps.reminders.tasks import case_changed
+            case_changed.apply_async(args=[case.domain, case._id],
+                                     countdown=getattr(settings, 'REMINDERS_CASE_CHANGED_DELAY', 0))
     except Exception:
         logging.exception("Error processing reminders case_changed_receiver for case %s" % case._id)
 
 case_post_save.connect(case_changed_receiver, CommCareCase)
-
@@ -64,6 +64,39 @@ var Reminder = function (o, parentModel) {
     self.name = ko.observable(o.name);
     self.caseType = ko.observable(o.caseType);
     self.url = ko.observable(o.url);
+    self.recalculationProgress = ko.observable(o.recalculationProgress);
+
+    self.recalculationText = ko.computed(function () {
+        var progress = self.recalculationProgress();
+        if (!progress) {
+            return '';
+        }
+        return progress.processed + ' / ' + progress.total;
+    });
+
+    self.pollRecalculationProgress = function () {
+        if (!self.recalculationProgress()) {
+            return;
+        }
+        setTimeout(function () {
+            $.ajax({
+                url: '',
+                type: 'post',
+                dataType: 'json',
+                data: {
+                    action: 'progress',
+                    reminderId: self.id
+                },
+                success: function (data) {
+                    if (data.success) {
+                        self.recalculationProgress(data.reminder.recalculationProgress);
+                        self.pollRecalculationProgress();
+                    }
+                }
+            });
+        }, 5000);
+    };
+    self.pollRecalculationProgress();
 
     self.activate = function (_, event) {
         self.processReminder('activate', event.target);
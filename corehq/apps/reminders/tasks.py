@@ -1,8 +1,121 @@
-from datetime import timedelta
-from celery.task import periodic_task
-from corehq.apps.reminders.models import CaseReminderHandler
+from collections import defaultdict
+from datetime import datetime, timedelta
+from celery.task import periodic_task, task
+from couchdbkit.exceptions import ResourceNotFound
+from casexml.apps.case.models import CommCareCase
+from corehq.apps.reminders.models import CaseReminderHandler, CaseReminder, QUEUED_KEY, QUEUED_KEY_TIMEOUT
+from corehq.apps.reminders.signals import CASE_CHANGED_KEY
+from dimagi.utils.chunked import chunked
+from dimagi.utils.couch.database import iter_docs
+from dimagi.utils.parsing import json_format_datetime, string_to_datetime
 from django.conf import settings
+from django.core.cache import cache
 
-@periodic_task(run_every=timedelta(minutes=1), queue=getattr(settings, 'CELERY_PERIODIC_QUEUE','celery'))
+FIRE_REMINDERS_INTERVAL = timedelta(minutes=1)
+FIRE_BUCKET_SECONDS = 10
+FIRE_BATCH_SIZE = 100
+
+@periodic_task(run_every=FIRE_REMINDERS_INTERVAL, queue=getattr(settings, 'CELERY_PERIODIC_QUEUE','celery'))
 def fire_reminders():
-    CaseReminderHandler.fire_reminders()
\ No newline at end of file
+    enqueue_due_reminders()
+
+def enqueue_due_reminders(now=None):
+    """
+    Queues a fire_reminder_batch task for each domain, time bucket and
+    batch of the reminders that are due before the next run. Reminders due
+    later in the interval are queued with an eta at the end of their
+    FIRE_BUCKET_SECONDS bucket, so they fire close to their scheduled time
+    rather than on the next run. A reminder is only queued once per
+    scheduled fire time.
+    """
+    now = now or datetime.utcnow()
+    rows = CaseReminder.get_db().view('reminders/by_next_fire',
+        startkey=[None],
+        endkey=[None, json_format_datetime(now + FIRE_REMINDERS_INTERVAL)],
+        include_docs=False,
+    )
+    keys = dict([(QUEUED_KEY % (row['id'], row['key'][1]), row) for row in rows])
+    already_queued = cache.get_many(keys.keys())
+
+    batches = defaultdict(list)
+    for key, row in keys.items():
+        if key in already_queued:
+            continue
+        seconds_until_due = (string_to_datetime(row['key'][1]).replace(tzinfo=None) - now).total_seconds()
+        bucket = max(int(-(-seconds_until_due // FIRE_BUCKET_SECONDS)), 0)
+        batches[(row['value'], bucket)].append(row['id'])
+
+    for (domain, bucket), reminder_ids in batches.items():
+        eta = now + timedelta(seconds=bucket * FIRE_BUCKET_SECONDS) if bucket else None
+        for ids in chunked(reminder_ids, FIRE_BATCH_SIZE):
+            fire_reminder_batch.apply_async(args=[list(ids)], eta=eta)
+    cache.set_many(dict([(key, True) for key in keys if key not in already_queued]), QUEUED_KEY_TIMEOUT)
+
+@task
+def fire_reminder_batch(reminder_ids):
+    CaseReminderHandler.fire_reminders_by_id(reminder_ids)
+
+def get_subcases(case):
+    subcase_ids = [index.referenced_id for index in case.reverse_indices
+                   if index.identifier == "parent"]
+    return [CommCareCase.wrap(doc) for doc in iter_docs(CommCareCase.get_db(), subcase_ids)]
+
+@task
+def case_changed(domain, case_id):
+    # saves of the case from here on need to queue another evaluation
+    cache.delete(CASE_CHANGED_KEY % case_id)
+    try:
+        case = CommCareCase.wrap(CommCareCase.get_db().get(case_id))
+    except ResourceNotFound:
+        return
+    subcases = None
+    for handler in CaseReminderHandler.get_case_criteria_handlers(domain):
+        handler.case_changed(case)
+        if handler.uses_parent_case_property:
+            if subcases is None:
+                subcases = get_subcases(case)
+            for subcase in subcases:
+                handler.case_changed(subcase)
+
+RECALCULATION_CHUNKS_PER_TASK = 50
+
+def get_current_handler(handler_id, rev):
+    """
+    The handler if `rev` is still its latest revision and it hasn't been
+    deleted, otherwise None.
+    """
+    try:
+        doc = CaseReminderHandler.get_db().get(handler_id)
+    except ResourceNotFound:
+        return None
+    if doc['_rev'] != rev or doc['doc_type'] != 'CaseReminderHandler':
+        return None
+    return CaseReminderHandler.wrap(doc)
+
+@task(default_retry_delay=60, max_retries=10)
+def recalculate_case_reminders(handler_id, rev, schedule_changed=False, prev_definition=None, cursor=None):
+    """
+    Re-evaluates the domain's cases for a saved CASE_CRITERIA handler, a
+    limited number of chunks per task. Each task queues the next one from
+    where it left off, and a failed task is retried from its last finished
+    chunk. Stops before the next chunk once the handler has been saved again.
+    """
+    handler = get_current_handler(handler_id, rev)
+    if handler is None:
+        return
+    prev_handler = CaseReminderHandler.wrap(prev_definition) if prev_definition else None
+    try:
+        chunks = 0
+        for cursor in handler.iter_case_recalculation(schedule_changed, prev_handler, cursor):
+            chunks += 1
+            if chunks == RECALCULATION_CHUNKS_PER_TASK:
+                break
+            if get_current_handler(handler_id, rev) is None:
+                return
+        else:
+            handler.update_recalculation_progress(complete=True)
+            return
+    except Exception as e:
+        raise recalculate_case_reminders.retry(
+            args=[handler_id, rev, schedule_changed, prev_definition, cursor], exc=e)
+    recalculate_case_reminders.delay(handler_id, rev, schedule_changed, prev_definition, cursor)
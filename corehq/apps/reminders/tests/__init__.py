@@ -7,6 +7,9 @@ from corehq.apps.sms.models import CallLog, ExpectedCallbackEventLog, CALLBACK_R
 from corehq.apps.sms.mixin import VerifiedNumber
 from dimagi.utils.parsing import json_format_datetime
 from dimagi.utils.couch import LOCK_EXPIRATION
+from corehq.apps.reminders.tests.test_case_changed import *
+from corehq.apps.reminders.tests.test_fire_reminders import *
+from corehq.apps.reminders.tests.test_recalculation import *
 
 class ReminderTestCase(TestCase):
     """
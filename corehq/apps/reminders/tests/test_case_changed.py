@@ -0,0 +1,143 @@
+from datetime import datetime, time
+from couchdbkit.exceptions import ResourceNotFound
+from couchdbkit.ext.django.schema import Document
+from django.core.cache import cache
+from django.test.testcases import TestCase
+import mock
+from casexml.apps.case.models import CommCareCase
+from corehq.apps.reminders import tasks
+from corehq.apps.reminders.models import *
+from corehq.apps.reminders.signals import case_changed_receiver, CASE_CHANGED_KEY
+from corehq.apps.users.models import CommCareUser
+
+
+class CaseChangedCoalescingTestCase(TestCase):
+    domain = 'case-changed-coalescing'
+    case_id = 'case-changed-coalescing-case'
+
+    def setUp(self):
+        cache.delete(CASE_CHANGED_KEY % self.case_id)
+        self.case = mock.Mock(domain=self.domain, _id=self.case_id)
+
+    def tearDown(self):
+        cache.delete(CASE_CHANGED_KEY % self.case_id)
+
+    def test_queued_once(self):
+        with mock.patch.object(CaseReminderHandler, 'get_case_criteria_handlers', return_value=[object()]), \
+                mock.patch.object(tasks.case_changed, 'apply_async') as apply_async:
+            case_changed_receiver(CommCareCase, self.case)
+            case_changed_receiver(CommCareCase, self.case)
+        apply_async.assert_called_once_with(args=[self.domain, self.case_id], countdown=mock.ANY)
+
+    def test_no_case_criteria_handlers(self):
+        with mock.patch.object(CaseReminderHandler, 'get_case_criteria_handlers', return_value=[]), \
+                mock.patch.object(tasks.case_changed, 'apply_async') as apply_async:
+            case_changed_receiver(CommCareCase, self.case)
+        self.assertFalse(apply_async.called)
+        self.assertEqual(None, cache.get(CASE_CHANGED_KEY % self.case_id))
+
+    def test_task_clears_key(self):
+        db = mock.Mock()
+        db.get.side_effect = ResourceNotFound
+        with mock.patch.object(CaseReminderHandler, 'get_case_criteria_handlers', return_value=[object()]), \
+                mock.patch.object(tasks.case_changed, 'apply_async') as apply_async, \
+                mock.patch.object(CommCareCase, 'get_db', return_value=db):
+            case_changed_receiver(CommCareCase, self.case)
+            tasks.case_changed(self.domain, self.case_id)
+            # saves after the evaluation started are queued again
+            case_changed_receiver(CommCareCase, self.case)
+        self.assertEqual(2, apply_async.call_count)
+
+
+class CaseCriteriaHandlersTestCase(TestCase):
+    domain = 'case-criteria-handlers'
+
+    def setUp(self):
+        bump_handlers_version(self.domain)
+        self.handler = CaseReminderHandler(domain=self.domain, start_condition_type=CASE_CRITERIA)
+        self.other_handler = CaseReminderHandler(domain=self.domain, start_condition_type=ON_DATETIME)
+
+    def _get(self):
+        with mock.patch.object(CaseReminderHandler, 'get_handlers',
+                               return_value=[self.handler, self.other_handler]) as get_handlers:
+            self.assertEqual([self.handler], CaseReminderHandler.get_case_criteria_handlers(self.domain))
+        return get_handlers.call_count
+
+    def test_cached(self):
+        self.assertEqual(1, self._get())
+        self.assertEqual(0, self._get())
+
+    def test_invalidated_on_save(self):
+        self._get()
+        with mock.patch.object(Document, 'save'), \
+                mock.patch.object(CaseReminderHandler, 'start_case_recalculation'):
+            self.handler.save()
+        self.assertEqual(1, self._get())
+
+    def test_invalidated_on_delete(self):
+        self._get()
+        with mock.patch.object(Document, 'delete'):
+            self.handler.delete()
+        self.assertEqual(1, self._get())
+
+
+class UnchangedReminderTestCase(TestCase):
+    """
+    Case updates that don't affect the reminder don't write it.
+    """
+    @classmethod
+    def setUpClass(cls):
+        cls.domain = "test"
+        cls.case_type = "unchanged_case_type"
+        cls.handler = CaseReminderHandler(
+            domain=cls.domain,
+            case_type=cls.case_type,
+            method="test",
+            start_property='start_sending',
+            start_value="ok",
+            start_date=None,
+            start_offset=1,
+            start_match_type=MATCH_EXACT,
+            until='stop_sending',
+            default_lang='en',
+            max_iteration_count=REPEAT_SCHEDULE_INDEFINITELY,
+            schedule_length=3,
+            event_interpretation=EVENT_AS_OFFSET,
+            events = [
+                CaseReminderEvent(
+                    day_num = 0
+                   ,fire_time = time(0,0,0)
+                   ,message={"en":"Unchanged"}
+                   ,callback_timeout_intervals=[]
+                )
+            ]
+        )
+        cls.handler.save()
+        cls.user_id = "USER-ID-109353"
+        cls.user = CommCareUser.create(cls.domain, 'chw.bob7', '****', uuid=cls.user_id)
+        cls.case = CommCareCase(
+            domain=cls.domain,
+            type=cls.case_type,
+            user_id=cls.user_id,
+        )
+        cls.case.save()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.user.delete()
+
+    def test_ok(self):
+        CaseReminderHandler.now = datetime(year=2011, month=7, day=7, hour=19, minute=8)
+        self.case.set_case_property('start_sending', 'ok')
+        self.case.save()
+        reminder = self.handler.get_reminder(self.case)
+        self.assertNotEqual(reminder, None)
+
+        self.case.set_case_property('irrelevant_1', 'ok')
+        self.case.save()
+        self.assertEqual(reminder._rev, self.handler.get_reminder(self.case)._rev)
+
+        self.case.set_case_property('stop_sending', 'ok')
+        self.case.save()
+        self.assertNotEqual(reminder._rev, self.handler.get_reminder(self.case)._rev)
+        self.assertFalse(self.handler.get_reminder(self.case).active)
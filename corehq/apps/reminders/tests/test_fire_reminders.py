@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+from django.test.testcases import TestCase
+import mock
+from casexml.apps.case.models import CommCareCase
+from corehq.apps.reminders import models, tasks
+from corehq.apps.reminders.models import CaseReminder, CaseReminderHandler, RECIPIENT_USER
+from corehq.apps.reminders.tasks import enqueue_due_reminders, QUEUED_KEY
+from corehq.apps.users.models import CommCareUser
+from dimagi.utils.parsing import json_format_datetime
+
+NOW = datetime(2013, 1, 1, 12, 0)
+
+
+def _row(reminder_id, next_fire, domain='domain1'):
+    return {'id': reminder_id, 'key': [None, json_format_datetime(next_fire)], 'value': domain}
+
+
+class EnqueueDueRemindersTestCase(TestCase):
+
+    def _enqueue(self, rows, already_queued=None):
+        db = mock.Mock()
+        db.view.return_value = rows
+        with mock.patch.object(CaseReminder, 'get_db', return_value=db), \
+                mock.patch.object(tasks, 'cache') as cache, \
+                mock.patch.object(tasks.fire_reminder_batch, 'apply_async') as apply_async:
+            cache.get_many.return_value = already_queued or {}
+            enqueue_due_reminders(NOW)
+        batches = sorted([(sorted(call[1]['args'][0]), call[1]['eta']) for call in apply_async.call_args_list])
+        return batches, cache
+
+    def test_buckets(self):
+        batches, _ = self._enqueue([
+            _row('overdue', NOW - timedelta(minutes=5)),
+            _row('due', NOW),
+            _row('soon', NOW + timedelta(seconds=5)),
+            _row('later1', NOW + timedelta(seconds=25)),
+            _row('later2', NOW + timedelta(seconds=30)),
+            _row('other-domain', NOW + timedelta(seconds=25), domain='domain2'),
+        ])
+        self.assertEqual([
+            (['due', 'overdue'], None),
+            (['later1', 'later2'], NOW + timedelta(seconds=30)),
+            (['other-domain'], NOW + timedelta(seconds=30)),
+            (['soon'], NOW + timedelta(seconds=10)),
+        ], batches)
+
+    def test_batch_size(self):
+        with mock.patch.object(tasks, 'FIRE_BATCH_SIZE', 2):
+            batches, _ = self._enqueue([_row('r%d' % i, NOW) for i in range(3)])
+        self.assertEqual([(['r0', 'r1'], None), (['r2'], None)], sorted(batches))
+
+    def test_queued_once(self):
+        rows = [_row('queued', NOW), _row('new', NOW)]
+        queued_key = QUEUED_KEY % ('queued', rows[0]['key'][1])
+        new_key = QUEUED_KEY % ('new', rows[1]['key'][1])
+        batches, cache = self._enqueue(rows, already_queued={queued_key: True})
+        self.assertEqual([(['new'], None)], batches)
+        cache.set_many.assert_called_once_with({new_key: True}, tasks.QUEUED_KEY_TIMEOUT)
+
+
+class FireRemindersByIdTestCase(TestCase):
+    domain = 'fire-reminders-by-id'
+
+    def setUp(self):
+        handler = CaseReminderHandler(domain=self.domain, recipient=RECIPIENT_USER).to_json()
+        handler['_id'] = 'handler1'
+        case = CommCareCase(domain=self.domain).to_json()
+        case['_id'] = 'case1'
+        user = CommCareUser(domain=self.domain, username='fire-user').to_json()
+        user['_id'] = 'user1'
+        self.docs = dict([(doc['_id'], doc) for doc in [handler, case, user]])
+        for reminder_id in ['reminder1', 'reminder2']:
+            self.docs[reminder_id] = CaseReminder(
+                _id=reminder_id,
+                domain=self.domain,
+                handler_id='handler1',
+                case_id='case1',
+                user_id='user1',
+                active=True,
+                next_fire=NOW - timedelta(minutes=1),
+            ).to_json()
+        self.fired = []
+        self.locked = set()
+
+    def _fire(self, reminder):
+        self.fired.append(reminder._id)
+        if reminder._id == 'reminder1' and self.fail_first:
+            raise Exception('gateway is down')
+        return True
+
+    def _fire_reminders(self, fail_first=False):
+        self.fail_first = fail_first
+        patches = {
+            'iter_docs': mock.patch.object(models, 'iter_docs',
+                side_effect=lambda db, ids: [self.docs[id] for id in ids if id in self.docs]),
+            'fire': mock.patch.object(CaseReminderHandler, 'fire', side_effect=self._fire),
+            'set_next_fire': mock.patch.object(CaseReminderHandler, 'set_next_fire'),
+            'get_handler': mock.patch.object(CaseReminderHandler, 'get'),
+            'get_case': mock.patch.object(CommCareCase, 'get'),
+            'get_user': mock.patch.object(CommCareUser, 'get_by_user_id'),
+            'acquire_lock': mock.patch.object(CaseReminder, 'acquire_lock',
+                lambda reminder, now: reminder._id not in self.locked),
+            'release_lock': mock.patch.object(CaseReminder, 'release_lock'),
+            'save': mock.patch.object(CaseReminder, 'save'),
+            'log_exception': mock.patch.object(models.logging, 'exception'),
+            'cache': mock.patch.object(models, 'cache'),
+        }
+        self.mocks = dict([(name, patch.start()) for name, patch in patches.items()])
+        try:
+            CaseReminderHandler.fire_reminders_by_id(['reminder1', 'reminder2'], now=NOW)
+        finally:
+            for patch in patches.values():
+                patch.stop()
+
+    def _requeued(self):
+        self.assertEqual(1, self.mocks['cache'].delete_many.call_count)
+        return sorted(self.mocks['cache'].delete_many.call_args[0][0])
+
+    def _queued_key(self, reminder_id):
+        return QUEUED_KEY % (reminder_id, self.docs[reminder_id]['next_fire'])
+
+    def test_bulk_loaded(self):
+        loaded = []
+
+        def _fire(reminder):
+            loaded.append((reminder.handler._id, reminder.case._id, reminder.user._id))
+            return True
+        self._fire = _fire
+        self._fire_reminders()
+        self.assertEqual([('handler1', 'case1', 'user1')] * 2, loaded)
+        # one lookup each for the reminders, their handlers, cases and users
+        self.assertEqual(4, self.mocks['iter_docs'].call_count)
+        for name in ['get_handler', 'get_case', 'get_user']:
+            self.assertFalse(self.mocks[name].called)
+        self.assertEqual(2, self.mocks['save'].call_count)
+
+    def test_error_firing_one_reminder(self):
+        self._fire_reminders(fail_first=True)
+        self.assertEqual(['reminder1', 'reminder2'], self.fired)
+        self.assertEqual(1, self.mocks['log_exception'].call_count)
+        # only the reminder that fired is saved, but both locks are released
+        self.assertEqual(1, self.mocks['save'].call_count)
+        self.assertEqual(2, self.mocks['release_lock'].call_count)
+        # the reminder that failed can be queued again
+        self.assertEqual([self._queued_key('reminder1')], self._requeued())
+
+    def test_unfired_requeued(self):
+        # another worker holds the first reminder, and the second isn't due
+        # yet on this worker's clock
+        self.locked.add('reminder1')
+        self.docs['reminder2']['next_fire'] = json_format_datetime(NOW + timedelta(seconds=5))
+        self._fire_reminders()
+        self.assertEqual([], self.fired)
+        self.assertEqual([self._queued_key('reminder1'), self._queued_key('reminder2')], self._requeued())
+
+    def test_fired_not_requeued(self):
+        self._fire_reminders()
+        self.assertEqual(['reminder1', 'reminder2'], self.fired)
+        self.assertEqual([], self._requeued())
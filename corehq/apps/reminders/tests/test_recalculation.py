@@ -0,0 +1,141 @@
+from couchdbkit.exceptions import ResourceNotFound
+from django.core.cache import cache
+from django.test.testcases import TestCase
+import mock
+from corehq.apps.reminders import models, tasks
+from corehq.apps.reminders.models import CaseReminderHandler, RECALCULATION_PROGRESS_KEY
+from corehq.apps.reminders.tasks import recalculate_case_reminders, get_current_handler
+
+DOMAIN = 'case-recalculation'
+HANDLER_ID = 'recalculation-handler'
+REV = '1-a'
+CASE_IDS = ['case%d' % i for i in range(5)]
+ROWS = [{'id': case_id, 'key': [DOMAIN, 'case_type'], 'value': None} for case_id in CASE_IDS]
+
+
+def _paginate_view(db, view_name, chunk_size, cursor=None, **kwargs):
+    if cursor is None:
+        return iter(ROWS)
+    return iter(ROWS[CASE_IDS.index(cursor['startkey_docid']) + 1:])
+
+
+def _cursor(case_id):
+    return {'startkey': [DOMAIN, 'case_type'], 'startkey_docid': case_id}
+
+
+class GetCurrentHandlerTestCase(TestCase):
+
+    def _get(self, doc=None):
+        db = mock.Mock()
+        if doc is None:
+            db.get.side_effect = ResourceNotFound
+        else:
+            db.get.return_value = dict({'_id': HANDLER_ID, 'domain': DOMAIN}, **doc)
+        with mock.patch.object(CaseReminderHandler, 'get_db', return_value=db):
+            return get_current_handler(HANDLER_ID, REV)
+
+    def test_current(self):
+        self.assertEqual(REV, self._get({'_rev': REV, 'doc_type': 'CaseReminderHandler'})._rev)
+
+    def test_not_current(self):
+        self.assertEqual(None, self._get({'_rev': '2-b', 'doc_type': 'CaseReminderHandler'}))
+        self.assertEqual(None, self._get({'_rev': REV, 'doc_type': 'CaseReminderHandler-Deleted'}))
+        self.assertEqual(None, self._get())
+
+
+class CaseRecalculationTestCase(TestCase):
+
+    def setUp(self):
+        cache.delete(RECALCULATION_PROGRESS_KEY % HANDLER_ID)
+        self.handler = self._handler(REV)
+        self.set_progress(REV)
+        self.recalculated = []
+        self.current_revs = []
+        self.fail_on = None
+        self.patches = [
+            mock.patch.object(models, 'paginate_view', side_effect=_paginate_view),
+            mock.patch.object(models, 'RECALCULATION_CHUNK_SIZE', 2),
+            mock.patch.object(tasks, 'RECALCULATION_CHUNKS_PER_TASK', 2),
+            mock.patch.object(CaseReminderHandler, '_recalculate_cases', side_effect=self._recalculate_cases),
+            mock.patch.object(tasks, 'get_current_handler', side_effect=self._get_current_handler),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        cache.delete(RECALCULATION_PROGRESS_KEY % HANDLER_ID)
+
+    def _handler(self, rev):
+        return CaseReminderHandler.wrap({
+            '_id': HANDLER_ID,
+            '_rev': rev,
+            'doc_type': 'CaseReminderHandler',
+            'domain': DOMAIN,
+        })
+
+    def set_progress(self, rev):
+        self.handler.set_recalculation_progress({
+            'rev': rev,
+            'total': len(CASE_IDS),
+            'processed': 0,
+            'complete': False,
+            'schedule_changed': False,
+            'prev_definition': None,
+        })
+
+    def _recalculate_cases(self, case_ids, schedule_changed, prev_definition):
+        if self.fail_on in case_ids:
+            raise Exception('couch went away')
+        self.recalculated.append(case_ids)
+
+    def _get_current_handler(self, handler_id, rev):
+        current_rev = self.current_revs.pop(0) if self.current_revs else REV
+        return self._handler(rev) if current_rev == rev else None
+
+    def progress(self):
+        progress = self.handler.get_recalculation_progress()
+        return progress['processed'], progress['complete']
+
+    def test_chunks(self):
+        cursors = list(self.handler.iter_case_recalculation())
+        self.assertEqual([['case0', 'case1'], ['case2', 'case3'], ['case4']], self.recalculated)
+        self.assertEqual([_cursor('case1'), _cursor('case3'), _cursor('case4')], cursors)
+        self.assertEqual((5, False), self.progress())
+
+    def test_resume(self):
+        with mock.patch.object(recalculate_case_reminders, 'delay') as delay:
+            recalculate_case_reminders(HANDLER_ID, REV)
+        self.assertEqual([['case0', 'case1'], ['case2', 'case3']], self.recalculated)
+        delay.assert_called_once_with(HANDLER_ID, REV, False, None, _cursor('case3'))
+        self.assertEqual((4, False), self.progress())
+
+        with mock.patch.object(recalculate_case_reminders, 'delay') as delay:
+            recalculate_case_reminders(HANDLER_ID, REV, False, None, _cursor('case3'))
+        self.assertEqual(['case4'], self.recalculated[-1])
+        self.assertFalse(delay.called)
+        self.assertEqual((5, True), self.progress())
+
+    def test_retry_from_last_chunk(self):
+        self.fail_on = 'case2'
+        with mock.patch.object(recalculate_case_reminders, 'retry', return_value=Exception('retry')) as retry:
+            self.assertRaises(Exception, recalculate_case_reminders, HANDLER_ID, REV)
+        self.assertEqual([HANDLER_ID, REV, False, None, _cursor('case1')], retry.call_args[1]['args'])
+        self.assertEqual((2, False), self.progress())
+
+    def test_superseded(self):
+        # the handler is saved again while the first chunk is being recalculated
+        self.current_revs = [REV, '2-b']
+        with mock.patch.object(recalculate_case_reminders, 'delay') as delay:
+            recalculate_case_reminders(HANDLER_ID, REV)
+        self.assertEqual([['case0', 'case1']], self.recalculated)
+        self.assertFalse(delay.called)
+
+    def test_superseded_progress(self):
+        # progress for the new revision's job isn't touched by the old one
+        self.set_progress('2-b')
+        with mock.patch.object(recalculate_case_reminders, 'delay'):
+            recalculate_case_reminders(HANDLER_ID, REV, False, None, _cursor('case1'))
+            recalculate_case_reminders(HANDLER_ID, REV, False, None, _cursor('case3'))
+        self.assertEqual((0, False), self.progress())
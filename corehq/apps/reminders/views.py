@@ -1324,12 +1324,21 @@ class RemindersListView(BaseMessagingSectionView):
         return CaseReminderHandler.get(self.reminder_id)
 
     def _fmt_reminder_data(self, reminder):
+        progress = reminder.get_recalculation_progress()
+        if progress and not progress['complete']:
+            recalculation_progress = {
+                'processed': progress['processed'],
+                'total': progress['total'],
+            }
+        else:
+            recalculation_progress = None
         return {
             'id': reminder._id,
             'isActive': reminder.active,
             'caseType': reminder.case_type,
             'name': reminder.nickname,
             'url': reverse(EditScheduledReminderView.urlname, args=[self.domain, reminder._id]),
+            'recalculationProgress': recalculation_progress,
         }
 
     def get_action_response(self, active):
@@ -1350,6 +1359,11 @@ class RemindersListView(BaseMessagingSectionView):
         action = self.request.POST.get('action')
         if action in ['activate', 'deactivate']:
             return HttpResponse(json.dumps(self.get_action_response(action == 'activate')))
+        if action == 'progress':
+            return HttpResponse(json.dumps({
+                'success': True,
+                'reminder': self._fmt_reminder_data(self.reminder),
+            }))
         raise {
             'success': False,
         }
@@ -2,12 +2,14 @@ import logging
 from xml.etree import ElementTree
 from corehq.apps.domain.models import Domain
 from corehq.apps.callcenter.indicator_sets import CallCenter
+from corehq.apps.ota.instrumentation import instrumented_fixture_generator
 from corehq.apps.users.models import CommCareUser
 
 
 logger = logging.getLogger(__name__)
 
 
+@instrumented_fixture_generator
 def indicators(user, version, last_sync):
     if isinstance(user, CommCareUser):
         pass
@@ -1,19 +1,25 @@
-from StringIO import StringIO
+import copy
 from datetime import date
+import json
+from multiprocessing.pool import ThreadPool
 import os
 import tempfile
 import uuid
 from corehq.apps.app_manager.models import Application
+from corehq.apps.export.transforms import clear_transform_caches, prefetch_transforms
 from corehq.apps.reports.display import xmlns_to_name
 from corehq.apps.reports.models import FormExportSchema
-from corehq.elastic import stream_es_query
+from corehq.elastic import es_query, stream_es_query
 from corehq.pillows.mappings.xform_mapping import XFORM_INDEX
-import couchexport
 from couchexport.export import get_headers, get_writer, format_tables, create_intermediate_tables, export_raw
 from couchexport.models import FakeSavedExportSchema, Format, SavedExportSchema
+from dimagi.utils.chunked import chunked
 
 from soil import DownloadBase
 
+# number of docs whose transform ids are resolved together
+TRANSFORM_CHUNK_SIZE = 500
+
 class BulkExport(object):
 
     @property
@@ -36,10 +42,17 @@ class BulkExport(object):
         self.export_objects = []
 
     def generate_bulk_file(self):
+        """
+        Writes the export to a new temp file and returns its path.
+
+        Docs are streamed from each export's config and written out as they
+        are formatted, so memory use doesn't grow with the size of the export.
+        The ids that transform columns look up are resolved a chunk of docs
+        at a time.
+        """
         configs = list()
         schemas = list()
         checkpoints = list()
-        file = StringIO()
 
         for export_object in self.export_objects:
             config, schema, checkpoint = export_object.get_export_components(filter=self.export_filter)
@@ -52,22 +65,32 @@ class BulkExport(object):
         # generate the headers for the bulk excel file
         headers = self.generate_table_headers(schemas, checkpoints)
 
-        writer.open(headers, file)
-
-        # now that the headers are set, lets build the rows
-        for i, config in enumerate(configs):
-            for doc in config.get_docs():
-                if self.export_objects[i].transform:
-                    doc = self.export_objects[i].transform(doc)
-                table = format_tables(create_intermediate_tables(doc, schemas[i]),
-                                    include_headers=isinstance(self, CustomBulkExport), separator=self.separator)
-                if isinstance(self, CustomBulkExport):
-                    table = self.export_objects[i].trim(table, doc)
-                table = self.export_objects[i].parse_tables(table)
-                writer.write(table)
-
-        writer.close()
-        return file
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as file:
+            writer.open(headers, file)
+
+            # now that the headers are set, lets build the rows
+            try:
+                for i, config in enumerate(configs):
+                    export_object = self.export_objects[i]
+                    for docs in chunked(config.get_docs(), TRANSFORM_CHUNK_SIZE):
+                        prefetch_transforms(export_object, docs)
+                        for doc in docs:
+                            writer.write(self.format_doc(export_object, schemas[i], doc))
+            finally:
+                clear_transform_caches()
+
+            writer.close()
+        return path
+
+    def format_doc(self, export_object, schema, doc):
+        if export_object.transform:
+            doc = export_object.transform(doc)
+        table = format_tables(create_intermediate_tables(doc, schema),
+                              include_headers=isinstance(self, CustomBulkExport), separator=self.separator)
+        if isinstance(self, CustomBulkExport):
+            table = export_object.trim(table, doc)
+        return export_object.parse_tables(table)
 
     def generate_table_headers(self, schemas, checkpoints):
         return []
@@ -159,10 +182,11 @@ class BulkExportHelper(object):
         return True
 
     def prepare_export(self, export_tags, export_filter):
+        from corehq.apps.reports.tasks import bulk_export_async
         self.generate_bulk_files(export_tags, export_filter)
 
         download = DownloadBase()
-        couchexport.tasks.bulk_export_async.delay(
+        bulk_export_async.delay(
             self,
             download.download_id,
             domain=self.domain
@@ -204,27 +228,15 @@ class CustomBulkExportHelper(BulkExportHelper):
         bulk_export.domain = self.domain
         self.bulk_files = [bulk_export]
 
-def save_metadata_export_to_tempfile(domain, datespan=None, user_ids=None):
-    """
-    Saves the domain's form metadata to a file. Returns the filename.
-    """
-    headers = ("domain", "instanceID", "received_on", "type",
-               "timeStart", "timeEnd", "deviceID", "username",
-               "userID", "xmlns", "version")
+METADATA_HEADERS = ("domain", "instanceID", "received_on", "type",
+                    "timeStart", "timeEnd", "deviceID", "username",
+                    "userID", "xmlns", "version")
 
-    def _form_data_to_row(formdata):
-        def _key_to_val(formdata, key):
-            if key == "type":
-                return xmlns_to_name(domain, formdata.get("xmlns"), app_id=None)
-            if key == "version":
-                return formdata["form"].get("@version")
-            if key in ["domain", "received_on", "xmlns"]:
-                return formdata.get(key)
-            return formdata["form"].get("meta", {}).get(key)
-        return [_key_to_val(formdata, key) for key in headers]
+# number of received_on ranges the metadata export is split into
+METADATA_EXPORT_SHARDS = 8
 
-    fd, path = tempfile.mkstemp()
 
+def _metadata_query(datespan=None, user_ids=None):
     q = {
         "query": {"match_all": {}},
         "sort": [{"received_on" : {"order": "desc"}}],
@@ -244,11 +256,105 @@ def save_metadata_export_to_tempfile(domain, datespan=None, user_ids=None):
 
     if user_ids is not None:
         q["filter"]["and"].append({"terms": {"form.meta.userID": user_ids}})
+    return q
+
+
+def _received_on_shards(domain, q, shards):
+    """
+    Splits the received_on range of the forms matching `q` into `shards`
+    contiguous ranges, newest first.
+    """
+    stats_q = copy.deepcopy(q)
+    stats_q.pop("sort")
+    stats_q["facets"] = {"received_on": {"statistical": {"field": "received_on"}}}
+    stats = es_query(params={"domain.exact": domain}, q=stats_q,
+                     es_url=XFORM_INDEX + '/xform/_search', size=0)["facets"]["received_on"]
+    if not stats["count"]:
+        return []
 
-    results = stream_es_query(params={"domain.exact": domain}, q=q, es_url=XFORM_INDEX + '/xform/_search', size=999999)
-    data = (_form_data_to_row(res["_source"]) for res in results)
+    start, end = int(stats["min"]), int(stats["max"])
+    shards = max(min(shards, end - start), 1)
+    bounds = [start + (end - start) * i / shards for i in range(shards)] + [end]
+    ranges = [{"from": bounds[i], "to": bounds[i + 1], "include_upper": i == shards - 1}
+              for i in range(shards)]
+    return list(reversed(ranges))
 
-    with os.fdopen(fd, 'w') as temp:
-        export_raw((("forms", headers),), (("forms", data),), temp)
+
+def save_metadata_export_to_tempfile(domain, datespan=None, user_ids=None, shards=METADATA_EXPORT_SHARDS):
+    """
+    Saves the domain's form metadata to a file. Returns the filename.
+
+    The forms' received_on range is split into shards that are read from
+    ES concurrently into intermediate files, which are then written out
+    in order.
+    """
+    form_names = {}
+
+    def _xmlns_to_name(xmlns):
+        if xmlns not in form_names:
+            form_names[xmlns] = xmlns_to_name(domain, xmlns, app_id=None)
+        return form_names[xmlns]
+
+    def _es_field(key):
+        if key == "version":
+            return "form.@version"
+        if key in ["domain", "received_on", "xmlns"]:
+            return key
+        return "form.meta.%s" % key
+
+    es_fields = [_es_field(key) for key in METADATA_HEADERS if key != "type"]
+
+    def _form_data_to_row(fields):
+        def _key_to_val(fields, key):
+            if key == "type":
+                return _xmlns_to_name(fields.get("xmlns"))
+            return fields.get(_es_field(key))
+        return [_key_to_val(fields, key) for key in METADATA_HEADERS]
+
+    q = _metadata_query(datespan, user_ids)
+
+    def _save_shard(shard):
+        received_on_range, shard_path = shard
+        shard_q = copy.deepcopy(q)
+        shard_q["filter"]["and"].append({"range": {"received_on": received_on_range}})
+        results = stream_es_query(params={"domain.exact": domain}, q=shard_q,
+                                  es_url=XFORM_INDEX + '/xform/_search', fields=es_fields, chunksize=500)
+        with open(shard_path, 'w') as shard_file:
+            for res in results:
+                shard_file.write(json.dumps(_form_data_to_row(res.get("fields", {}))) + '\n')
+
+    def _rows(shard_paths):
+        for shard_path in shard_paths:
+            with open(shard_path) as shard_file:
+                for line in shard_file:
+                    yield json.loads(line)
+
+    shard_ranges = _received_on_shards(domain, q, shards)
+    # create the shard files up front so they're cleaned up even if a
+    # worker fails part way through
+    shard_paths = []
+    try:
+        for _range in shard_ranges:
+            fd, shard_path = tempfile.mkstemp()
+            os.close(fd)
+            shard_paths.append(shard_path)
+
+        pool = ThreadPool(max(len(shard_ranges), 1))
+        try:
+            pool.map(_save_shard, zip(shard_ranges, shard_paths))
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            # the other shards may still be writing when one fails
+            pool.join()
+
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as temp:
+            export_raw((("forms", METADATA_HEADERS),), (("forms", _rows(shard_paths)),), temp)
+    finally:
+        for shard_path in shard_paths:
+            os.remove(shard_path)
 
     return path
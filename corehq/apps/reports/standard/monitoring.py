@@ -10,7 +10,7 @@ import pytz
 from corehq.apps.reports import util
 from corehq.apps.reports.standard import ProjectReportParametersMixin, \
     DatespanMixin, ProjectReport, DATE_FORMAT
-from corehq.apps.reports.filters.forms import CompletionOrSubmissionTimeFilter, FormsByApplicationFilter, SingleFormByApplicationFilter
+from corehq.apps.reports.filters.forms import CompletionOrSubmissionTimeFilter, FormsByApplicationFilter, SingleFormByApplicationFilter, MISSING_APP_ID
 from corehq.apps.reports.datatables import DataTablesHeader, DataTablesColumn, DTSortType, DataTablesColumnGroup
 from corehq.apps.reports.generic import GenericTabularReport
 from corehq.apps.reports.util import make_form_couch_key, friendly_timedelta, format_datatables_data
@@ -100,41 +100,22 @@ class CaseActivityReport(WorkerMonitoringReportTableBase):
             self.report = report
             self.user = user
 
-        @memoized
+        def _count(self, facet):
+            return self.report.case_counts[facet].get(self.user.get('user_id'), 0)
+
         def active_count(self):
             """Open clients seen in the last 120 days"""
-            return self.report.get_number_cases(
-                user_id=self.user.get('user_id'),
-                modified_after=self.report.utc_now - self.report.milestone,
-                modified_before=self.report.utc_now,
-                closed=False,
-            )
+            return self._count('active')
 
-        @memoized
         def inactive_count(self):
             """Open clients not seen in the last 120 days"""
-            return self.report.get_number_cases(
-                user_id=self.user.get('user_id'),
-                modified_before=self.report.utc_now - self.report.milestone,
-                closed=False,
-            )
+            return self._count('inactive')
 
-        def modified_count(self, startdate=None, enddate=None):
-            enddate = enddate or self.report.utc_now
-            return self.report.get_number_cases(
-                user_id=self.user.get('user_id'),
-                modified_after=startdate,
-                modified_before=enddate,
-            )
+        def modified_count(self, landmark):
+            return self._count('modified_%d' % landmark.days)
 
-        def closed_count(self, startdate=None, enddate=None):
-            enddate = enddate or self.report.utc_now
-            return self.report.get_number_cases(
-                user_id=self.user.get('user_id'),
-                modified_after=startdate,
-                modified_before=enddate,
-                closed=True
-            )
+        def closed_count(self, landmark):
+            return self._count('closed_%d' % landmark.days)
 
         def header(self):
             return self.report.get_user_link(self.user)
@@ -150,11 +131,11 @@ class CaseActivityReport(WorkerMonitoringReportTableBase):
         def inactive_count(self):
             return sum([row.inactive_count() for row in self.rows])
 
-        def modified_count(self, startdate=None, enddate=None):
-            return sum([row.modified_count(startdate, enddate) for row in self.rows])
+        def modified_count(self, landmark):
+            return sum([row.modified_count(landmark) for row in self.rows])
 
-        def closed_count(self, startdate=None, enddate=None):
-            return sum([row.closed_count(startdate, enddate) for row in self.rows])
+        def closed_count(self, landmark):
+            return sum([row.closed_count(landmark) for row in self.rows])
 
         def header(self):
             return self._header
@@ -231,9 +212,9 @@ class CaseActivityReport(WorkerMonitoringReportTableBase):
                 cells.append(util.format_datatables_data(text=text, sort_key=value))
 
             for landmark in self.landmarks:
-                value = row.modified_count(self.utc_now - landmark)
+                value = row.modified_count(landmark)
                 active = row.active_count()
-                closed = row.closed_count(self.utc_now - landmark)
+                closed = row.closed_count(landmark)
                 total = active + closed
 
                 try:
@@ -254,26 +235,58 @@ class CaseActivityReport(WorkerMonitoringReportTableBase):
         self.total_row = format_row(total_row)
         return map(format_row, rows)
 
-    def get_number_cases(self, user_id, modified_after=None, modified_before=None, closed=None):
-        key = [self.domain, {} if closed is None else closed, self.case_type or {}, user_id]
+    def _modified_filter(self, modified_after=None, modified_before=None, closed=None):
+        date_range = {"include_upper": True}
+        if modified_after is not None:
+            date_range["from"] = json_format_datetime(modified_after)
+        if modified_before is not None:
+            date_range["to"] = json_format_datetime(modified_before)
+        case_filter = [{"range": {"modified_on": date_range}}]
+        if closed is not None:
+            case_filter.append({"term": {"closed": closed}})
+        return {"and": case_filter}
+
+    def es_case_counts(self, dict_only=False):
+        """
+            One query for every user and landmark: a terms facet on user_id
+            for each (landmark, modified/closed) pair plus the active and
+            inactive milestone counts.
+        """
+        q = {"query": {
+                "bool": {
+                    "must": [
+                        {"match": {"domain.exact": self.domain}}]}}}
+        if self.case_type:
+            q["query"]["bool"]["must"].append({"match": {"type.exact": self.case_type}})
+        q["filter"] = {"and": [{"terms": {"user_id": self.user_ids}}]}
 
-        if modified_after is None:
-            start = ""
-        else:
-            start = json_format_datetime(modified_after)
+        milestone_start = self.utc_now - self.milestone
+        facet_filters = {
+            'active': self._modified_filter(milestone_start, self.utc_now, closed=False),
+            'inactive': self._modified_filter(modified_before=milestone_start, closed=False),
+        }
+        for landmark in self.landmarks:
+            facet_filters['modified_%d' % landmark.days] = \
+                self._modified_filter(self.utc_now - landmark, self.utc_now)
+            facet_filters['closed_%d' % landmark.days] = \
+                self._modified_filter(self.utc_now - landmark, self.utc_now, closed=True)
 
-        if modified_before is None:
-            end = {}
-        else:
-            end = json_format_datetime(modified_before)
+        facets = dict([(name, {"terms": {"field": "user_id", "size": len(self.user_ids)},
+                               "facet_filter": facet_filter})
+                       for name, facet_filter in facet_filters.items()])
+        return es_query(q=q, facets=facets, es_url=CASE_INDEX + '/case/_search', size=0, dict_only=dict_only)
 
-        return get_db().view('case/by_date_modified',
-            startkey=key + [start],
-            endkey=key + [end],
-            group=True,
-            group_level=0,
-            wrapper=lambda row: row['value']
-        ).one() or 0
+    @property
+    @memoized
+    def case_counts(self):
+        """
+            facet name => {user_id: number of cases}
+        """
+        if not self.user_ids:
+            return defaultdict(dict)
+        facets = self.es_case_counts()["facets"]
+        return dict([(name, dict([(t["term"], t["count"]) for t in facet["terms"]]))
+                     for name, facet in facets.items()])
 
 
 class SubmissionsByFormReport(WorkerMonitoringReportTableBase, MultiFormDrilldownMixin, DatespanMixin):
@@ -313,11 +326,12 @@ class SubmissionsByFormReport(WorkerMonitoringReportTableBase, MultiFormDrilldow
     def rows(self):
         rows = []
         totals = [0]*(len(self.all_relevant_forms)+1)
+        submission_counts = self.submission_counts if self.all_relevant_forms and self.users else {}
         for user in self.users:
             row = []
             if self.all_relevant_forms:
-                for form in self.all_relevant_forms.values():
-                    row.append(self._get_num_submissions(user.get('user_id'), form['xmlns'], form['app_id']))
+                for form_key in self.all_relevant_forms.keys():
+                    row.append(submission_counts[form_key].get(user.get('user_id'), 0))
                 row_sum = sum(row)
                 row = [self.get_user_link(user)] + \
                     [self.table_cell(row_data) for row_data in row] + \
@@ -330,14 +344,46 @@ class SubmissionsByFormReport(WorkerMonitoringReportTableBase, MultiFormDrilldow
             self.total_row = [_("All Users")] + totals
         return rows
 
-    def _get_num_submissions(self, user_id, xmlns, app_id):
-        key = make_form_couch_key(self.domain, user_id=user_id, xmlns=xmlns, app_id=app_id)
-        data = get_db().view('reports_forms/all_forms',
-            reduce=True,
-            startkey=key+[self.datespan.startdate_param_utc],
-            endkey=key+[self.datespan.enddate_param_utc],
-        ).first()
-        return data['value'] if data else 0
+    def _form_filter(self, form):
+        form_filter = [{"term": {"xmlns.exact": form['xmlns']}}]
+        if form['app_id'] == MISSING_APP_ID:
+            form_filter.append({"missing": {"field": "app_id"}})
+        elif form['app_id']:
+            form_filter.append({"term": {"app_id": form['app_id']}})
+        return {"and": form_filter}
+
+    def es_submissions_by_form(self, dict_only=False):
+        """
+            One query for the whole user x form matrix: a terms facet on
+            the submitting user for each selected form.
+        """
+        q = {"query": {
+                "bool": {
+                    "must": [
+                        {"match": {"domain.exact": self.domain}},
+                        {"range": {
+                            "received_on": {
+                                "from": self.datespan.startdate_param_utc,
+                                "to": self.datespan.enddate_param_utc,
+                                "include_upper": True}}}]}}}
+        q["filter"] = {"and": ADD_TO_ES_FILTER["forms"][:] + [{"terms": {"form.meta.userID": self.user_ids}}]}
+        facets = {}
+        for i, form in enumerate(self.all_relevant_forms.values()):
+            facets["form_%d" % i] = {
+                "terms": {"field": "form.meta.userID", "size": len(self.user_ids)},
+                "facet_filter": self._form_filter(form),
+            }
+        return es_query(q=q, facets=facets, es_url=XFORM_INDEX + '/xform/_search', size=0, dict_only=dict_only)
+
+    @property
+    @memoized
+    def submission_counts(self):
+        """
+            form key => {user_id: number of submissions}
+        """
+        facets = self.es_submissions_by_form()["facets"]
+        return dict([(form_key, dict([(t["term"], t["count"]) for t in facets["form_%d" % i]["terms"]]))
+                     for i, form_key in enumerate(self.all_relevant_forms.keys())])
 
 
 class DailyFormStatsReport(WorkerMonitoringReportTableBase, CompletionOrSubmissionTimeMixin, DatespanMixin):
@@ -374,31 +420,56 @@ class DailyFormStatsReport(WorkerMonitoringReportTableBase, CompletionOrSubmissi
         return headers
 
     @property
-    def rows(self):
-        key = make_form_couch_key(self.domain, by_submission_time=self.by_submission_time)
-        results = get_db().view("reports_forms/all_forms",
-            reduce=False,
-            startkey=key+[self.datespan.startdate_param_utc if self.by_submission_time else self.datespan.startdate_param],
-            endkey=key+[self.datespan.enddate_param_utc if self.by_submission_time else self.datespan.enddate_param]
-        ).all()
+    def es_date_field(self):
+        return "received_on" if self.by_submission_time else "form.meta.timeEnd"
 
+    @property
+    def es_time_zone(self):
+        tz_offset = self.timezone.localize(self.datespan.enddate).strftime("%z")
+        return "%s:%s" % (tz_offset[0:3], tz_offset[3:5])
+
+    def es_daily_submissions(self, dict_only=False):
+        """
+            One date histogram facet per user, bucketed by day in the
+            report's timezone.
+        """
+        q = {"query": {
+                "bool": {
+                    "must": [
+                        {"match": {"domain.exact": self.domain}},
+                        {"range": {
+                            self.es_date_field: {
+                                "from": self.datespan.startdate_param_utc if self.by_submission_time else self.datespan.startdate_param,
+                                "to": self.datespan.enddate_param_utc if self.by_submission_time else self.datespan.enddate_param,
+                                "include_upper": True}}}]}}}
+        q["filter"] = {"and": ADD_TO_ES_FILTER["forms"][:] + [{"terms": {"form.meta.userID": self.user_ids}}]}
+        facets = {}
+        for user_id in self.user_ids:
+            facets[user_id] = {
+                "date_histogram": {
+                    "field": self.es_date_field,
+                    "interval": "day",
+                    "time_zone": self.es_time_zone,
+                },
+                "facet_filter": {"term": {"form.meta.userID": user_id}},
+            }
+        return es_query(q=q, facets=facets, es_url=XFORM_INDEX + '/xform/_search', size=0, dict_only=dict_only)
+
+    @property
+    def rows(self):
         user_map = dict([(user.get('user_id'), i) for (i, user) in enumerate(self.users)])
         date_map = dict([(date.strftime(DATE_FORMAT), i+1) for (i,date) in enumerate(self.dates)])
         rows = [[0]*(2+len(date_map)) for _tmp in range(len(self.users))]
         total_row = [0]*(2+len(date_map))
 
-        for result in results:
-            _tmp, _domain, date = result['key']
-            date = dateutil.parser.parse(date)
-            tz_offset = self.timezone.localize(self.datespan.enddate).strftime("%z")
-            date = date + datetime.timedelta(hours=int(tz_offset[0:3]), minutes=int(tz_offset[0]+tz_offset[3:5]))
-            date = date.isoformat()
-            val = result['value']
-            user_id = val.get("user_id")
-            if user_id in self.user_ids:
-                date_key = date_map.get(date[0:10], None)
+        facets = self.es_daily_submissions()["facets"] if self.users else {}
+        for user_id, facet in facets.items():
+            for entry in facet["entries"]:
+                # entry times are already shifted into the report's timezone
+                date = datetime.datetime.utcfromtimestamp(entry["time"] / 1000)
+                date_key = date_map.get(date.strftime(DATE_FORMAT), None)
                 if date_key:
-                    rows[user_map[user_id]][date_key] += 1
+                    rows[user_map[user_id]][date_key] += entry["count"]
 
         for i, user in enumerate(self.users):
             rows[i][0] = self.get_user_link(user)
@@ -1,4 +1,7 @@
 from datetime import datetime, timedelta
+import os
+import tempfile
+import zipfile
 from celery.schedules import crontab
 from celery.task import periodic_task, task
 from celery.utils.log import get_task_logger
@@ -11,6 +14,7 @@ from corehq.elastic import get_es, ES_URLS, stream_es_query, es_query
 from corehq.pillows.mappings.app_mapping import APP_INDEX
 from corehq.pillows.mappings.domain_mapping import DOMAIN_INDEX
 from couchexport.groupexports import export_for_group
+from couchexport.models import Format
 from dimagi.utils.couch.database import get_db
 from dimagi.utils.logging import notify_exception
 from couchexport.tasks import cache_file_to_be_served
@@ -80,6 +84,37 @@ def create_metadata_export(download_id, domain, format, filename, datespan=None,
 
     return cache_file_to_be_served(tmp_path, FakeCheckpoint(domain), download_id, format, filename)
 
+@task
+def bulk_export_async(bulk_export_helper, download_id, filename="bulk_export", expiry=10*60*60, domain=None):
+    """
+    Writes the helper's bulk files to disk and caches the result to be
+    served, zipping them together if the helper asks for a zip export.
+    Only one bulk file is held on disk at a time while building the zip.
+    """
+    if bulk_export_helper.zip_export:
+        filename = "%s_%s" % (domain, filename) if domain else filename
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'wb') as file:
+            zf = zipfile.ZipFile(file, 'w', zipfile.ZIP_DEFLATED, allowZip64=True)
+            try:
+                for bulk_file in bulk_export_helper.bulk_files:
+                    try:
+                        bulk_path = bulk_file.generate_bulk_file()
+                    except Exception as e:
+                        logging.exception("Failed to add file to bulk export archive: %s" % e)
+                        continue
+                    try:
+                        zf.write(bulk_path, bulk_file.filename)
+                    finally:
+                        os.remove(bulk_path)
+            finally:
+                zf.close()
+        return cache_file_to_be_served(path, bulk_export_helper, download_id, Format.ZIP, filename, expiry=expiry)
+    else:
+        export_object = bulk_export_helper.bulk_files[0]
+        return cache_file_to_be_served(export_object.generate_bulk_file(), bulk_export_helper, download_id,
+                                       export_object.format, export_object.filename, expiry=expiry)
+
 @periodic_task(run_every=crontab(hour="*", minute="0", day_of_week="*"), queue=getattr(settings, 'CELERY_PERIODIC_QUEUE','celery'))
 def daily_reports():    
     # this should get called every hour by celery
@@ -126,7 +161,7 @@ def update_calculated_properties():
         {"term": {"doc_type": "Domain"}},
         {"term": {"is_snapshot": False}}
     ]}}
-    results = stream_es_query(q=q, es_url=ES_URLS["domains"], size=999999, chunksize=500, fields=["name"])
+    results = stream_es_query(q=q, es_url=ES_URLS["domains"], chunksize=500, fields=["name"])
     all_stats = _all_domain_stats()
     for r in results:
         dom = r["fields"]["name"]
@@ -164,7 +199,7 @@ def is_app_active(app_id, domain):
 def apps_update_calculated_properties():
     es = get_es()
     q = {"filter": {"and": [{"missing": {"field": "copy_of"}}]}}
-    results = stream_es_query(q=q, es_url=ES_URLS["apps"], size=999999, chunksize=500)
+    results = stream_es_query(q=q, es_url=ES_URLS["apps"], chunksize=500, fields=["domain"])
     for r in results:
-        calced_props = {"cp_is_active": is_app_active(r["_id"], r["_source"]["domain"])}
+        calced_props = {"cp_is_active": is_app_active(r["_id"], r["fields"]["domain"])}
         es.post("%s/app/%s/_update" % (APP_INDEX, r["_id"]), data={"doc": calced_props})
@@ -9,6 +9,10 @@ try:
     from corehq.apps.reports.tests.test_data_sources import *
     from .test_pillows_xforms import *
     from .test_pillows_cases import *
+    from .test_pillow_batching import *
+    from .test_monitoring import *
+    from .test_metadata_export import *
+    from .test_elastic import *
 except ImportError, e:
     # for some reason the test harness squashes these so log them here for clarity
     # otherwise debugging is a pain
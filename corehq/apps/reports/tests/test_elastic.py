@@ -0,0 +1,63 @@
+from django.test import TestCase
+import mock
+from corehq import elastic
+from corehq.elastic import stream_es_query, ESError
+
+
+class FakeScrollES(object):
+    """
+    Serves the pages of a scroll, one per request, and records which
+    scrolls were cleared.
+    """
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+        self.cleared = []
+
+    def get(self, path, params=None, data=None):
+        self.requests.append((path, params, data))
+        page = len(self.requests) - 1
+        if isinstance(self.pages[page], Exception):
+            return {"error": str(self.pages[page])}
+        return {"_scroll_id": "scroll-%d" % page, "hits": {"hits": self.pages[page]}}
+
+    def delete(self, path, data=None):
+        self.cleared.append((path, data))
+
+
+class StreamESQueryTest(TestCase):
+
+    def _stream(self, pages, **kwargs):
+        es = FakeScrollES(pages)
+        with mock.patch.object(elastic, 'get_es', return_value=es):
+            try:
+                hits = list(stream_es_query(es_url='xforms/xform/_search', **kwargs))
+            except ESError:
+                hits = None
+        return es, hits
+
+    def testScan(self):
+        es, hits = self._stream([[], [{'_id': 1}, {'_id': 2}], [{'_id': 3}], []], chunksize=2)
+        self.assertEqual([1, 2, 3], [hit['_id'] for hit in hits])
+        self.assertEqual({"scroll": elastic.SCROLL_KEEPALIVE, "search_type": "scan"}, es.requests[0][1])
+        self.assertEqual(2, es.requests[0][2]['size'])
+        # each page is fetched with the scroll id from the one before
+        self.assertEqual(['scroll-0', 'scroll-1', 'scroll-2'], [data for _, _, data in es.requests[1:]])
+        self.assertEqual([('_search/scroll', 'scroll-3')], es.cleared)
+
+    def testSortedQueryDoesNotScan(self):
+        es, hits = self._stream([[{'_id': 1}], []], q={"sort": [{"received_on": "desc"}]})
+        self.assertEqual({"scroll": elastic.SCROLL_KEEPALIVE}, es.requests[0][1])
+
+    def testSizeClearsScroll(self):
+        es, hits = self._stream([[], [{'_id': 1}, {'_id': 2}], [{'_id': 3}]], size=2)
+        self.assertEqual([1, 2], [hit['_id'] for hit in hits])
+        # stopped before the scroll ran out
+        self.assertEqual(2, len(es.requests))
+        self.assertEqual([('_search/scroll', 'scroll-1')], es.cleared)
+
+    def testErrorClearsScroll(self):
+        es, hits = self._stream([[], [{'_id': 1}], Exception('SearchContextMissingException')])
+        self.assertEqual(None, hits)
+        self.assertEqual([('_search/scroll', 'scroll-1')], es.cleared)
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import time
+from django.test import TestCase
+import mock
+from corehq.apps.reports import export
+from corehq.apps.reports.export import save_metadata_export_to_tempfile
+
+DOMAIN = 'metadata-export-test'
+
+
+class MetadataExportTest(TestCase):
+
+    def setUp(self):
+        self.temp_paths = []
+        mkstemp = tempfile.mkstemp
+
+        def _mkstemp():
+            fd, path = mkstemp()
+            self.temp_paths.append(path)
+            return fd, path
+
+        self.exported_rows = []
+
+        def _export_raw(headers, data, temp):
+            [(_table, rows)] = data
+            self.exported_rows.extend(rows)
+
+        stats = {"facets": {"received_on": {"count": 3, "min": 0, "max": 100}}}
+        self.patches = [
+            mock.patch.object(export.tempfile, 'mkstemp', side_effect=_mkstemp),
+            mock.patch.object(export, 'export_raw', side_effect=_export_raw),
+            mock.patch.object(export, 'es_query', return_value=stats),
+            mock.patch.object(export, 'xmlns_to_name', side_effect=lambda domain, xmlns, app_id: xmlns),
+            mock.patch.object(export, 'stream_es_query', side_effect=self._stream_es_query),
+        ]
+        for patch in self.patches:
+            patch.start()
+        self.failing_shard = None
+        self.slow_shard = None
+        self.finished_shards = []
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        for path in self.temp_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _stream_es_query(self, params, q, es_url, fields, chunksize):
+        shard_from = q["filter"]["and"][-1]["range"]["received_on"]["from"]
+        if shard_from == self.failing_shard:
+            raise Exception('ES went away')
+        return self._hits(shard_from)
+
+    def _hits(self, shard_from):
+        if shard_from == self.slow_shard:
+            time.sleep(0.2)
+        yield {"fields": {"xmlns": "form-%d" % shard_from, "received_on": shard_from}}
+        self.finished_shards.append(shard_from)
+
+    def testShardsWrittenNewestFirst(self):
+        path = save_metadata_export_to_tempfile(DOMAIN, shards=2)
+        self.assertEqual(['form-50', 'form-0'],
+                         [row[list(export.METADATA_HEADERS).index("type")] for row in self.exported_rows])
+        # only the export itself is left behind
+        self.assertEqual([path], [p for p in self.temp_paths if os.path.exists(p)])
+
+    def testShardFilesRemovedOnFailure(self):
+        self.failing_shard = 0
+        self.assertRaises(Exception, save_metadata_export_to_tempfile, DOMAIN, shards=2)
+        self.assertEqual(2, len(self.temp_paths))
+        self.assertEqual([], [p for p in self.temp_paths if os.path.exists(p)])
+
+    def testOtherShardsFinishBeforeCleanup(self):
+        self.failing_shard = 0
+        self.slow_shard = 50
+        self.assertRaises(Exception, save_metadata_export_to_tempfile, DOMAIN, shards=2)
+        # the slow shard wasn't left writing to a file that's been removed
+        self.assertEqual([50], self.finished_shards)
+        self.assertEqual([], [p for p in self.temp_paths if os.path.exists(p)])
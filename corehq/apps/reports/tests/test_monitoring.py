@@ -0,0 +1,168 @@
+import calendar
+from datetime import datetime, timedelta
+from django.test import TestCase
+from django.utils.datastructures import SortedDict
+import mock
+import pytz
+from corehq.apps.reports.filters.forms import MISSING_APP_ID
+from corehq.apps.reports.standard import monitoring
+from corehq.apps.reports.standard.monitoring import SubmissionsByFormReport, DailyFormStatsReport, \
+    CaseActivityReport
+from dimagi.utils.dates import DateSpan
+
+DOMAIN = 'monitoring-test'
+USERS = [
+    {'user_id': 'user1', 'raw_username': 'one', 'username_in_report': 'one'},
+    {'user_id': 'user2', 'raw_username': 'two', 'username_in_report': 'two'},
+]
+
+
+class MonitoringReportStubMixin(object):
+    """
+    Skips the request handling of a report so that only the query building
+    and the mapping of facet results to rows are exercised.
+    """
+    domain = DOMAIN
+    users = USERS
+    user_ids = [user['user_id'] for user in USERS]
+    datespan = DateSpan(datetime(2013, 1, 1), datetime(2013, 1, 3))
+
+    def __init__(self):
+        pass
+
+    def get_user_link(self, user):
+        return user['user_id']
+
+
+def _terms(counts):
+    return {"terms": [{"term": term, "count": count} for term, count in counts.items()]}
+
+
+class SubmissionsByFormStub(MonitoringReportStubMixin, SubmissionsByFormReport):
+    all_relevant_forms = SortedDict([
+        ('app1 form1', {'xmlns': 'form1', 'app_id': 'app1', 'name': 'Form 1'}),
+        ('missing form2', {'xmlns': 'form2', 'app_id': MISSING_APP_ID, 'name': 'Form 2'}),
+    ])
+
+
+class SubmissionsByFormReportTest(TestCase):
+
+    def setUp(self):
+        self.report = SubmissionsByFormStub()
+
+    def testQuery(self):
+        with mock.patch.object(monitoring, 'es_query') as es_query:
+            self.report.es_submissions_by_form()
+        facets = es_query.call_args[1]['facets']
+        self.assertEqual(['form_0', 'form_1'], sorted(facets))
+        self.assertEqual({"and": [{"term": {"xmlns.exact": "form1"}}, {"term": {"app_id": "app1"}}]},
+                         facets['form_0']['facet_filter'])
+        self.assertEqual({"and": [{"term": {"xmlns.exact": "form2"}}, {"missing": {"field": "app_id"}}]},
+                         facets['form_1']['facet_filter'])
+
+    def testRows(self):
+        response = {"facets": {
+            "form_0": _terms({'user1': 3, 'user2': 1}),
+            "form_1": _terms({'user1': 2}),
+        }}
+        with mock.patch.object(monitoring, 'es_query', return_value=response):
+            rows = self.report.rows
+        self.assertEqual([
+            ['user1', 3, 2, 5],
+            ['user2', 1, 0, 1],
+        ], [[row[0]] + [cell['sort_key'] for cell in row[1:]] for row in rows])
+        self.assertEqual(['All Users', 4, 2, 6], self.report.total_row)
+
+
+def _day_entry(year, month, day, count):
+    return {"time": calendar.timegm(datetime(year, month, day).timetuple()) * 1000, "count": count}
+
+
+class DailyFormStatsStub(MonitoringReportStubMixin, DailyFormStatsReport):
+    timezone = pytz.utc
+    by_submission_time = True
+
+
+class DailyFormStatsReportTest(TestCase):
+
+    def setUp(self):
+        self.report = DailyFormStatsStub()
+
+    def testQuery(self):
+        with mock.patch.object(monitoring, 'es_query') as es_query:
+            self.report.es_daily_submissions()
+        facets = es_query.call_args[1]['facets']
+        self.assertEqual(['user1', 'user2'], sorted(facets))
+        self.assertEqual({"field": "received_on", "interval": "day", "time_zone": "+00:00"},
+                         facets['user1']['date_histogram'])
+        self.assertEqual({"term": {"form.meta.userID": "user1"}}, facets['user1']['facet_filter'])
+
+    def testCompletionTimeInReportTimezone(self):
+        self.report.by_submission_time = False
+        self.report.timezone = pytz.timezone('Africa/Nairobi')
+        self.assertEqual("form.meta.timeEnd", self.report.es_date_field)
+        self.assertEqual("+03:00", self.report.es_time_zone)
+
+    def testRows(self):
+        response = {"facets": {
+            "user1": {"entries": [_day_entry(2013, 1, 2, 3), _day_entry(2013, 1, 3, 1)]},
+            # days outside the report's span are ignored
+            "user2": {"entries": [_day_entry(2012, 12, 31, 4), _day_entry(2013, 1, 1, 2)]},
+        }}
+        with mock.patch.object(monitoring, 'es_query', return_value=response):
+            rows = self.report.rows
+        self.assertEqual([
+            ['user1', 0, 3, 1, 4],
+            ['user2', 2, 0, 0, 2],
+        ], [[row[0]] + [cell['sort_key'] for cell in row[1:]] for row in rows])
+        self.assertEqual(['All Users', 2, 3, 1, 6], self.report.total_row)
+
+
+class CaseActivityStub(MonitoringReportStubMixin, CaseActivityReport):
+    case_type = ''
+    utc_now = datetime(2013, 6, 1)
+    landmarks = [timedelta(days=30)]
+    milestone = timedelta(days=120)
+
+
+class CaseActivityReportTest(TestCase):
+
+    def setUp(self):
+        self.report = CaseActivityStub()
+
+    def testQuery(self):
+        with mock.patch.object(monitoring, 'es_query') as es_query:
+            self.report.es_case_counts()
+        facets = es_query.call_args[1]['facets']
+        self.assertEqual(['active', 'closed_30', 'inactive', 'modified_30'], sorted(facets))
+        self.assertEqual({"and": [
+            {"range": {"modified_on": {"from": "2013-02-01T00:00:00Z", "to": "2013-06-01T00:00:00Z",
+                                       "include_upper": True}}},
+            {"term": {"closed": False}},
+        ]}, facets['active']['facet_filter'])
+        self.assertEqual({"and": [
+            {"range": {"modified_on": {"to": "2013-02-01T00:00:00Z", "include_upper": True}}},
+            {"term": {"closed": False}},
+        ]}, facets['inactive']['facet_filter'])
+        self.assertEqual({"and": [
+            {"range": {"modified_on": {"from": "2013-05-02T00:00:00Z", "to": "2013-06-01T00:00:00Z",
+                                       "include_upper": True}}},
+            {"term": {"closed": True}},
+        ]}, facets['closed_30']['facet_filter'])
+
+    def testRows(self):
+        response = {"facets": {
+            "modified_30": _terms({'user1': 4}),
+            "closed_30": _terms({'user1': 1}),
+            "active": _terms({'user1': 3}),
+            "inactive": _terms({'user1': 2, 'user2': 5}),
+        }}
+        with mock.patch.object(monitoring, 'es_query', return_value=response):
+            rows = self.report.rows
+        # modified, active, closed, proportion for the landmark, then active and inactive
+        self.assertEqual([
+            ['user1', 4, 3, 1, 100., 3, 2],
+            ['user2', 0, 0, 0, '--', 0, 5],
+        ], [[row[0]] + [cell['sort_key'] for cell in row[1:]] for row in rows])
+        self.assertEqual(['All Users', 4, 3, 1, 100., 3, 7],
+                         [self.report.total_row[0]] + [cell['sort_key'] for cell in self.report.total_row[1:]])
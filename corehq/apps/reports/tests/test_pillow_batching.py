@@ -0,0 +1,133 @@
+import time
+from django.utils.unittest.case import TestCase
+import mock
+from corehq.pillows.base import BulkIndexError, get_bulk_errors
+from corehq.pillows.xform import XFormPillow
+
+
+class BatchingPillow(XFormPillow):
+    """
+    XFormPillow with every call out to couch and elastic recorded instead.
+    """
+    batch_size = 3
+    batch_timeout = 0.05
+
+    def __init__(self, **kwargs):
+        super(BatchingPillow, self).__init__(create_index=False, online=False, **kwargs)
+        self.changes_seen = 0
+        self.batches = []
+        self.checkpoints = []
+        self.transported = []
+        self.fail_batches = False
+
+    def process_batch(self, changes):
+        if self.fail_batches:
+            raise Exception('bulk request failed')
+        self.batches.append([change['id'] for change in changes])
+
+    def set_checkpoint(self, change):
+        self.checkpoints.append(change['seq'])
+
+    def change_trigger(self, changes_dict):
+        return {'_id': changes_dict['id']}
+
+    def change_transform(self, doc_dict):
+        return doc_dict
+
+    def change_transport(self, doc_dict):
+        self.transported.append(doc_dict['_id'])
+
+
+def _change(i):
+    return {'id': 'doc%d' % i, 'seq': i}
+
+
+class PillowBatchingTest(TestCase):
+
+    def setUp(self):
+        self.pillow = BatchingPillow()
+
+    def _wait_for_flush(self):
+        for _ in range(100):
+            if self.pillow._batch_timer is None:
+                return
+            time.sleep(0.01)
+        self.fail('batch timer never fired')
+
+    def testFlushOnSize(self):
+        for i in range(4):
+            self.pillow.processor(_change(i))
+        self.assertEqual([['doc0', 'doc1', 'doc2']], self.pillow.batches)
+        self.assertEqual([2], self.pillow.checkpoints)
+        self.assertEqual(3, self.pillow.changes_seen)
+        # the fourth change is waiting on a new timer
+        self.assertEqual([_change(3)], self.pillow._change_batch)
+        self.pillow.flush_batch()
+
+    def testFlushOnTimeout(self):
+        self.pillow.processor(_change(0))
+        self.pillow.processor(_change(1))
+        self.assertEqual([], self.pillow.batches)
+        self.assertEqual([], self.pillow.checkpoints)
+
+        self._wait_for_flush()
+        self.assertEqual([['doc0', 'doc1']], self.pillow.batches)
+        self.assertEqual([1], self.pillow.checkpoints)
+
+    def testStaleTimerDoesNotFlush(self):
+        self.pillow.processor(_change(0))
+        stale_timer = self.pillow._batch_timer
+        for i in range(1, 4):
+            self.pillow.processor(_change(i))
+        # a timer that lost the race with a size flush leaves the new batch alone
+        self.pillow._flush_on_timeout(stale_timer)
+        self.assertEqual([['doc0', 'doc1', 'doc2']], self.pillow.batches)
+        self.assertEqual([_change(3)], self.pillow._change_batch)
+        self.pillow.flush_batch()
+
+    def testNoBatchingWithoutCheckpoint(self):
+        with mock.patch('pillowtop.listener.AliasedElasticPillow.processor') as processor:
+            self.pillow.processor(_change(0), do_set_checkpoint=False)
+        processor.assert_called_once_with(_change(0), do_set_checkpoint=False)
+        self.assertEqual([], self.pillow._change_batch)
+
+    def testFallbackToSingleChanges(self):
+        self.pillow.fail_batches = True
+        for i in range(3):
+            self.pillow.processor(_change(i))
+        self.assertEqual(['doc0', 'doc1', 'doc2'], self.pillow.transported)
+        self.assertEqual([2], self.pillow.checkpoints)
+        # the fallback doesn't count the changes a second time
+        self.assertEqual(3, self.pillow.changes_seen)
+
+    def testBulkErrors(self):
+        response = {'items': [
+            {'index': {'_id': 'doc0', 'ok': True}},
+            {'index': {'_id': 'doc1', 'error': 'MapperParsingException[failed to parse]'}},
+        ]}
+        self.assertEqual([response['items'][1]['index']], get_bulk_errors(response))
+
+        es = mock.Mock()
+        es.post.return_value = response
+        with mock.patch.object(self.pillow, 'get_es', return_value=es):
+            self.assertEqual(response, self.pillow.send_bulk('{}\n'))
+        self.assertEqual(['doc1'], self.pillow.failed_bulk_ids)
+
+        es.post.return_value = {'error': 'ElasticSearchParseException[Failed to derive xcontent]', 'status': 400}
+        with mock.patch.object(self.pillow, 'get_es', return_value=es):
+            self.assertRaises(BulkIndexError, self.pillow.send_bulk, '{}\n')
+
+    def testRejectedDocsProcessedSingly(self):
+        es = mock.Mock()
+        es.post.return_value = {'items': [
+            {'index': {'_id': 'doc0', 'ok': True}},
+            {'index': {'_id': 'doc1', 'error': 'MapperParsingException[failed to parse]'}},
+            {'index': {'_id': 'doc2', 'ok': True}},
+        ]}
+        send = lambda changes: self.pillow.send_bulk('{}\n')
+        with mock.patch.object(self.pillow, 'get_es', return_value=es), \
+                mock.patch('pillowtop.listener.AliasedElasticPillow.process_bulk', side_effect=send):
+            self.pillow.process_bulk([_change(i) for i in range(3)])
+        # only the rejected doc is sent again
+        self.assertEqual(1, es.post.call_count)
+        self.assertEqual(['doc1'], self.pillow.transported)
@@ -7,6 +7,7 @@ from corehq.pillows.base import restore_property_dict, VALUE_TAG
 from corehq.pillows.mappings.reportxform_mapping import REPORT_XFORM_MAPPING
 
 from corehq.pillows.reportxform import ReportXFormPillow
+from corehq.pillows.xform import is_valid_date
 
 
 CONCEPT_XFORM =  {
@@ -123,6 +124,26 @@ CONCEPT_XFORM =  {
 
 
 
+class IsValidDateTest(TestCase):
+
+    def testValidDates(self):
+        for txt in ['2013-09-01',
+                    '2013-09-01T11:22:40',
+                    '2013-09-01T11:22:40Z',
+                    '2013-09-01T11:22:40.123456',
+                    '2013-09-01T11:22:40.123456Z',
+                    '2013-09-01T11:22:40.123+03:00',
+                    '2013-09-01T11:22:40-0500',
+                    '2013-09-01 11:22:40',
+                    '09/01/13 11:22:40',
+                    'Sept 1 2013']:
+            self.assertTrue(is_valid_date(txt), txt)
+
+    def testInvalidDates(self):
+        for txt in [None, '', 'not a date', '2013-02-30', {'#text': '2013-09-01'}]:
+            self.assertFalse(is_valid_date(txt), txt)
+
+
 class testReportXFormProcessing(TestCase):
     def testConvertAndRestoreReportXFormDicts(self):
         pillow = ReportXFormPillow(online=False)
@@ -245,6 +266,23 @@ class testReportXFormProcessing(TestCase):
         self.assertEqual(orig['form']['really']['nested']['case'], for_indexing['form']['really']['nested']['case'])
 
 
+    def testTransformLeavesSourceUntouched(self):
+        pillow = ReportXFormPillow(online=False)
+        orig = copy.deepcopy(CONCEPT_XFORM)
+        orig['domain'] = settings.ES_XFORM_FULL_INDEX_DOMAINS[0]
+        orig['form']['meta']['timeStart'] = 'not a date'
+        orig['form']['case']['@date_modified'] = ''
+        pristine = copy.deepcopy(orig)
+
+        for_indexing = pillow.change_transform(orig)
+
+        self.assertEqual(pristine, orig)
+        self.assertIsNone(for_indexing['form']['meta']['timeStart'])
+        self.assertIsNone(for_indexing['form']['case']['@date_modified'])
+        # parts of the doc that aren't rewritten are shared, not copied
+        self.assertIs(orig['form']['case']['update'], for_indexing['form']['case']['update'])
+        self.assertIs(orig['openrosa_headers'], for_indexing['openrosa_headers'])
+
     def testBlanktoNulls(self):
         orig = {
             '_id': 'blank_strings',
@@ -196,6 +196,57 @@ def send_message_via_backend(msg, backend=None, onerror=lambda: None):
         onerror()
         return False
 
+def send_messages_via_backend(msgs, onerror=lambda msg: None):
+    """
+    Sends several outbound messages. Each message goes through its
+    msg.outbound_backend as in send_message_via_backend(), but the messages
+    are grouped by backend and each group is sent with the backend's
+    send_batch(), so a backend is only loaded once and can reuse its
+    connection to the gateway across the group.
+
+    onerror - called with the message from within the except block for each
+      message that couldn't be sent
+    Returns the messages that were sent.
+    """
+    backends = {}
+    msgs_by_backend = {}
+    for msg in msgs:
+        try:
+            msg.text = clean_text(msg.text)
+        except Exception:
+            logging.exception("Could not clean text for sms dated '%s' in domain '%s'" % (msg.date, msg.domain))
+        try:
+            if msg.backend_id in backends:
+                backend = backends[msg.backend_id]
+            else:
+                backend = msg.outbound_backend
+                backend = backends.setdefault(backend._id, backend)
+            if not msg.backend_id:
+                msg.backend_id = backend._id
+            if not backend.domain_is_authorized(msg.domain):
+                raise BackendAuthorizationException("Domain '%s' is not authorized to use backend '%s'" % (msg.domain, backend._id))
+        except Exception:
+            onerror(msg)
+            continue
+        msgs_by_backend.setdefault(backend._id, []).append(msg)
+
+    sent = []
+    for backend_id, backend_msgs in msgs_by_backend.items():
+        backend = backends[backend_id]
+        for msg in backend.send_batch(backend_msgs, onerror=onerror):
+            try:
+                msg.backend_api = backend.__class__.get_api_id()
+            except Exception:
+                pass
+            try:
+                msg.save()
+                store_billable.delay(msg)
+            except Exception:
+                onerror(msg)
+            else:
+                sent.append(msg)
+    return sent
+
 def process_sms_registration(msg):
     """
     This method handles registration via sms.
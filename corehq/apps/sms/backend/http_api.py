@@ -1,6 +1,5 @@
 import re
 from urllib import urlencode
-from urllib2 import urlopen
 from corehq.apps.sms.mixin import SMSBackend
 from corehq.apps.sms.forms import BackendForm
 from corehq.apps.reminders.forms import RecordListField
@@ -8,7 +7,7 @@ from django.forms.fields import *
 from django.core.exceptions import ValidationError
 from couchdbkit.ext.django.schema import *
 from dimagi.utils.django.fields import TrimmedCharField
-from corehq.apps.sms.util import clean_phone_number, strip_plus
+from corehq.apps.sms.util import clean_phone_number, strip_plus, http_get, http_post
 from django.utils.translation import ugettext as _, ugettext_noop
 
 BANNED_URL_REGEX = (
@@ -99,7 +98,7 @@ class HttpBackend(SMSBackend):
         
         url_params = urlencode(params)
         if self.method == "GET":
-            response = urlopen("%s?%s" % (self.url, url_params)).read()
+            response = http_get("%s?%s" % (self.url, url_params))
         else:
-            response = urlopen(self.url, url_params).read()
+            response = http_post(self.url, url_params)
 
@@ -202,6 +202,7 @@ class BackendForm(Form):
     give_other_domains_access = BooleanField(required=False)
     authorized_domains = CharField(required=False)
     reply_to_phone_number = CharField(required=False)
+    max_sms_per_second = IntegerField(required=False, min_value=1)
 
     def clean_name(self):
         value = self.cleaned_data.get("name")
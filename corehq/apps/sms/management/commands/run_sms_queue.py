@@ -1,11 +1,16 @@
+from datetime import timedelta
 from optparse import make_option
 from django.core.management.base import CommandError
 from django.conf import settings
 from dimagi.utils.parsing import json_format_datetime
 from corehq.apps.sms.models import SMSLog
-from corehq.apps.sms.tasks import process_sms
+from corehq.apps.sms.tasks import process_sms, process_sms_batch
+from dimagi.utils.chunked import chunked
 from hqscripts.generic_queue import GenericEnqueuingOperation
 
+QUEUE_PAGE_SIZE = 1000
+HIGH_WATER_MARK_OVERLAP = timedelta(minutes=1)
+
 class SMSEnqueuingOperation(GenericEnqueuingOperation):
     args = ""
     help = "Runs the SMS Queue"
@@ -16,15 +21,45 @@ class SMSEnqueuingOperation(GenericEnqueuingOperation):
     def get_enqueuing_timeout(self):
         return settings.SMS_QUEUE_ENQUEUING_TIMEOUT
 
+    high_water_mark = None
+    last_full_scan = None
+
     def get_items_to_be_processed(self, utcnow):
-        # We're just querying for ids here, so no need to limit
-        entries = SMSLog.view(
-            "sms/queued_sms",
-            startkey="1970-01-01T00:00:00Z",
-            endkey=json_format_datetime(utcnow),
-            include_docs=False
-        ).all()
-        return entries
+        """
+        Pages through the queued_sms view from the high-water mark (the
+        time up to which the previous run read the queue) rather than
+        from the beginning. The whole queue is read again once per
+        enqueuing timeout, so that messages whose enqueuing lock expired
+        without them being processed get enqueued again.
+        """
+        full_scan_interval = timedelta(minutes=self.get_enqueuing_timeout())
+        if (self.high_water_mark is None or
+                utcnow - self.last_full_scan >= full_scan_interval):
+            startkey = "1970-01-01T00:00:00Z"
+            self.last_full_scan = utcnow
+        else:
+            # Read back a bit to pick up messages that were saved after the
+            # last run with a time to process just before it. Delayed
+            # messages are rescheduled from the time they were delayed (see
+            # delay_processing), so they don't fall behind the mark either.
+            startkey = json_format_datetime(self.high_water_mark -
+                HIGH_WATER_MARK_OVERLAP)
+
+        view_kwargs = {
+            "startkey": startkey,
+            "endkey": json_format_datetime(utcnow),
+        }
+        while True:
+            entries = SMSLog.get_db().view("sms/queued_sms",
+                limit=QUEUE_PAGE_SIZE, **view_kwargs).all()
+            for entry in entries:
+                yield entry
+            if len(entries) < QUEUE_PAGE_SIZE:
+                break
+            view_kwargs["startkey"] = entries[-1]["key"]
+            view_kwargs["startkey_docid"] = entries[-1]["id"]
+            view_kwargs["skip"] = 1
+        self.high_water_mark = utcnow
 
     def use_queue(self):
         return settings.SMS_QUEUE_ENABLED
@@ -32,6 +67,14 @@ class SMSEnqueuingOperation(GenericEnqueuingOperation):
     def enqueue_item(self, _id):
         process_sms.delay(_id)
 
+    def enqueue_items(self, item_ids):
+        # Publish the whole batch over one broker connection, with several
+        # messages per task so that they can be sent together
+        batch_size = settings.SMS_QUEUE_PROCESSING_BATCH_SIZE
+        with process_sms_batch.app.producer_or_acquire() as producer:
+            for ids in chunked(item_ids, batch_size):
+                process_sms_batch.apply_async(args=[list(ids)], producer=producer)
+
     def enqueue_directly(self, msg):
         """
         This method is used to try to send an SMSLog entry directly to the
@@ -294,10 +294,34 @@ class MobileBackend(Document):
 
 class SMSBackend(MobileBackend):
     backend_type = "SMS"
+    max_sms_per_second = IntegerProperty()  # (optional) The most messages to send through this backend per second, across all workers
 
     def send(msg, *args, **kwargs):
         raise NotImplementedError("send() method not implemented")
 
+    def send_batch(self, msgs, onerror=lambda msg: None):
+        """
+        Sends several messages through this backend, no faster than
+        max_sms_per_second. Backends whose gateway accepts several messages
+        per request can override this.
+
+        onerror - called with the message from within the except block for
+          each message that couldn't be sent
+        Returns the messages that were sent.
+        """
+        from corehq.apps.sms.util import wait_for_rate_limit
+        sent = []
+        for msg in msgs:
+            if self.max_sms_per_second:
+                wait_for_rate_limit("sms-backend-%s" % self._id, self.max_sms_per_second)
+            try:
+                self.send(msg)
+            except Exception:
+                onerror(msg)
+            else:
+                sent.append(msg)
+        return sent
+
 class BackendMapping(Document):
     domain = StringProperty()
     is_global = BooleanProperty()
@@ -3,13 +3,12 @@ import logging
 from datetime import datetime, timedelta
 from celery.task import task
 from time import sleep
-from redis_cache.cache import RedisCache
 from corehq.apps.sms.models import SMSLog, OUTGOING, INCOMING
-from corehq.apps.sms.api import send_message_via_backend, process_incoming
+from corehq.apps.sms.api import send_messages_via_backend, process_incoming
+from corehq.apps.sms.util import get_redis_client
 from django.conf import settings
 from corehq.apps.domain.models import Domain
 from dimagi.utils.timezones import utils as tz_utils
-from dimagi.utils.couch.cache import cache_core
 
 ERROR_TOO_MANY_UNSUCCESSFUL_ATTEMPTS = "TOO_MANY_UNSUCCESSFUL_ATTEMPTS"
 ERROR_MESSAGE_IS_STALE = "MESSAGE_IS_STALE"
@@ -37,7 +36,9 @@ def handle_successful_processing_attempt(msg):
     msg.save()
 
 def delay_processing(msg, minutes):
-    msg.datetime_to_process += timedelta(minutes=minutes)
+    # From now rather than from the old time to process, which the enqueuer
+    # has already read past
+    msg.datetime_to_process = datetime.utcnow() + timedelta(minutes=minutes)
     msg.save()
 
 def get_lock(client, key):
@@ -92,13 +93,15 @@ def message_is_stale(msg, utcnow):
     else:
         return True
 
-def handle_outgoing(msg):
-    def onerror():
+def handle_outgoing(msgs):
+    def onerror(msg):
         logging.exception("Exception while processing SMS %s" % msg._id)
-    if send_message_via_backend(msg, onerror=onerror):
-        handle_successful_processing_attempt(msg)
-    else:
-        handle_unsuccessful_processing_attempt(msg)
+    sent_ids = set([msg._id for msg in send_messages_via_backend(msgs, onerror=onerror)])
+    for msg in msgs:
+        if msg._id in sent_ids:
+            handle_successful_processing_attempt(msg)
+        else:
+            handle_unsuccessful_processing_attempt(msg)
 
 def handle_incoming(msg):
     try:
@@ -113,55 +116,99 @@ def process_sms(message_id):
     """
     message_id - _id of an SMSLog entry
     """
-    # Note that Redis error/exception notifications go out from the
-    # run_sms_queue command, so no need to send them out here
-    # otherwise we'd get too many emails.
-    rcache = cache_core.get_redis_default_cache()
-    if not isinstance(rcache, RedisCache):
-        return
-    try:
-        client = rcache.raw_client
-    except NotImplementedError:
-        return
+    process_messages([message_id])
 
-    utcnow = datetime.utcnow()
-    # Prevent more than one task from processing this SMS, just in case
-    # the message got enqueued twice.
-    message_lock = get_lock(client, "sms-queue-processing-%s" % message_id)
+@task(queue="sms_queue")
+def process_sms_batch(message_ids):
+    """
+    message_ids - _ids of SMSLog entries
+    """
+    process_messages(message_ids)
 
-    if message_lock.acquire(blocking=False):
-        msg = SMSLog.get(message_id)
+def process_message(client, message_id, utcnow, domains):
+    """
+    Processes one queued SMSLog entry whose processing lock is held.
+    domains caches Domain objects by name across a batch.
+    Returns the message if it's an outbound message that's ready to be
+    sent, otherwise None.
+    """
+    msg = SMSLog.get(message_id)
 
-        if message_is_stale(msg, utcnow):
-            set_error(msg, ERROR_MESSAGE_IS_STALE)
-            message_lock.release()
-            return
+    if message_is_stale(msg, utcnow):
+        set_error(msg, ERROR_MESSAGE_IS_STALE)
+        return None
 
+    if msg.direction == OUTGOING:
+        if msg.domain not in domains:
+            domains[msg.domain] = Domain.get_by_name(msg.domain, strict=True)
+        if handle_domain_specific_delays(msg, domains[msg.domain], utcnow):
+            return None
+
+    # Process inbound SMS from a single contact one at a time
+    recipient_block = msg.direction == INCOMING
+    if (isinstance(msg.processed, bool)
+        and not msg.processed
+        and not msg.error
+        and msg.datetime_to_process < utcnow):
         if msg.direction == OUTGOING:
-            domain_object = Domain.get_by_name(msg.domain, strict=True)
-            if handle_domain_specific_delays(msg, domain_object, utcnow):
-                message_lock.release()
-                return
-
-        # Process inbound SMS from a single contact one at a time
-        recipient_block = msg.direction == INCOMING
-        if (isinstance(msg.processed, bool)
-            and not msg.processed
-            and not msg.error
-            and msg.datetime_to_process < utcnow):
-            if recipient_block:
-                recipient_lock = get_lock(client, 
-                    "sms-queue-recipient-%s" % msg.couch_recipient)
-                recipient_lock.acquire(blocking=True)
+            return msg
 
-            if msg.direction == OUTGOING:
-                handle_outgoing(msg)
-            elif msg.direction == INCOMING:
+        if recipient_block:
+            recipient_lock = get_lock(client,
+                "sms-queue-recipient-%s" % msg.couch_recipient)
+            recipient_lock.acquire(blocking=True)
+
+        try:
+            if msg.direction == INCOMING:
                 handle_incoming(msg)
             else:
                 set_error(msg, ERROR_INVALID_DIRECTION)
-
+        finally:
             if recipient_block:
                 recipient_lock.release()
-        message_lock.release()
+    return None
 
+def process_messages(message_ids):
+    """
+    Processes queued SMSLog entries. Outbound messages that are ready to go
+    are sent together at the end, grouped by backend, rather than one
+    request at a time; inbound messages are processed in order. A message
+    that fails to process is logged and skipped.
+    """
+    # Note that Redis error/exception notifications go out from the
+    # run_sms_queue command, so no need to send them out here
+    # otherwise we'd get too many emails.
+    client = get_redis_client()
+    if client is None:
+        return
+
+    utcnow = datetime.utcnow()
+    domains = {}
+    outgoing = []
+    try:
+        for message_id in message_ids:
+            # Prevent more than one task from processing this SMS, just in case
+            # the message got enqueued twice.
+            message_lock = get_lock(client, "sms-queue-processing-%s" % message_id)
+            if not message_lock.acquire(blocking=False):
+                continue
+
+            try:
+                msg = process_message(client, message_id, utcnow, domains)
+            except Exception:
+                logging.exception("Exception while processing SMS %s" % message_id)
+                msg = None
+
+            if msg is None:
+                message_lock.release()
+            else:
+                # the lock is released once it's been sent
+                outgoing.append((msg, message_lock))
+    finally:
+        # send what's been collected even if the rest of the batch failed
+        if outgoing:
+            try:
+                handle_outgoing([msg for msg, message_lock in outgoing])
+            finally:
+                for msg, message_lock in outgoing:
+                    message_lock.release()
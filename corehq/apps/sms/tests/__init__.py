@@ -7,6 +7,7 @@ from django.conf import settings
 from couchdbkit.ext.django.schema import *
 from couchdbkit.exceptions import ResourceNotFound
 from casexml.apps.case.models import CommCareCase
+from corehq.apps.sms.tests.test_queue import *
 
 class BackendInvocationDoc(Document):
     pass
@@ -0,0 +1,252 @@
+from datetime import datetime, timedelta
+from django.test import TestCase
+import mock
+from corehq.apps.sms import api, tasks, util
+from corehq.apps.sms.api import send_messages_via_backend
+from corehq.apps.sms.management.commands import run_sms_queue
+from corehq.apps.sms.management.commands.run_sms_queue import SMSEnqueuingOperation, HIGH_WATER_MARK_OVERLAP
+from corehq.apps.sms.util import wait_for_rate_limit
+from dimagi.utils.parsing import json_format_datetime
+
+
+def _backend(backend_id, authorized=True):
+    backend = mock.Mock(_id=backend_id)
+    backend.domain_is_authorized.return_value = authorized
+    backend.send_batch.side_effect = lambda msgs, onerror: msgs
+    return backend
+
+
+def _msg(backend_id, backend, domain='sms-queue-test'):
+    return mock.Mock(backend_id=backend_id, outbound_backend=backend, domain=domain, text='hello')
+
+
+class SendMessagesViaBackendTestCase(TestCase):
+
+    def setUp(self):
+        self.patch = mock.patch.object(api, 'store_billable')
+        self.store_billable = self.patch.start()
+        self.errors = []
+
+    def tearDown(self):
+        self.patch.stop()
+
+    def _send(self, msgs):
+        return send_messages_via_backend(msgs, onerror=self.errors.append)
+
+    def test_grouped_by_backend(self):
+        backend1, backend2 = _backend('backend1'), _backend('backend2')
+        msgs = [_msg('backend1', backend1), _msg('backend2', backend2), _msg('backend1', backend1)]
+        sent = self._send(msgs)
+        self.assertEqual(set(msgs), set(sent))
+        backend1.send_batch.assert_called_once_with([msgs[0], msgs[2]], onerror=self.errors.append)
+        backend2.send_batch.assert_called_once_with([msgs[1]], onerror=self.errors.append)
+        self.assertEqual(3, self.store_billable.delay.call_count)
+        self.assertEqual([], self.errors)
+
+    def test_default_backend(self):
+        backend = _backend('default-backend')
+        msgs = [_msg(None, backend), _msg('default-backend', backend)]
+        self._send(msgs)
+        backend.send_batch.assert_called_once_with(msgs, onerror=self.errors.append)
+        self.assertEqual('default-backend', msgs[0].backend_id)
+
+    def test_errors(self):
+        backend = _backend('backend1')
+        unauthorized = _msg('backend2', _backend('backend2', authorized=False))
+        unsaved = _msg('backend1', backend)
+        unsaved.save.side_effect = Exception('couch went away')
+        msgs = [_msg('backend1', backend), unauthorized, unsaved]
+        self.assertEqual([msgs[0]], self._send(msgs))
+        self.assertEqual([unauthorized, unsaved], self.errors)
+        self.assertEqual(1, self.store_billable.delay.call_count)
+
+
+class WaitForRateLimitTestCase(TestCase):
+
+    def _wait(self, counts):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = [[count] for count in counts]
+        with mock.patch.object(util, 'get_redis_client', return_value=client), \
+                mock.patch.object(util, 'time') as time:
+            time.time.return_value = 100.25
+            wait_for_rate_limit('backend1', 2)
+        return client, time.sleep
+
+    def test_within_limit(self):
+        client, sleep = self._wait([2])
+        self.assertFalse(sleep.called)
+        client.pipeline.return_value.incr.assert_called_once_with('rate-limit-backend1-100')
+
+    def test_over_limit(self):
+        client, sleep = self._wait([3, 4, 1])
+        # waits for the next second each time the counter is full
+        self.assertEqual([mock.call(0.75)] * 2, sleep.call_args_list)
+
+    def test_no_redis(self):
+        with mock.patch.object(util, 'get_redis_client', return_value=None), \
+                mock.patch.object(util, 'time') as time:
+            wait_for_rate_limit('backend1', 2)
+        self.assertFalse(time.sleep.called)
+
+
+class ProcessMessagesTestCase(TestCase):
+
+    def setUp(self):
+        self.locks = {}
+        self.sent = []
+
+        def _get_lock(client, key):
+            if key == 'sms-queue-processing-broken-redis':
+                raise Exception('redis went away')
+            return self.locks.setdefault(key, mock.Mock())
+
+        def _process_message(client, message_id, utcnow, domains):
+            if message_id == 'broken':
+                raise Exception('couch went away')
+            return message_id if message_id.startswith('outgoing') else None
+
+        self.patches = [
+            mock.patch.object(tasks, 'get_redis_client'),
+            mock.patch.object(tasks, 'get_lock', side_effect=_get_lock),
+            mock.patch.object(tasks, 'process_message', side_effect=_process_message),
+            mock.patch.object(tasks, 'handle_outgoing', side_effect=self.sent.extend),
+            mock.patch.object(tasks.logging, 'exception'),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _released(self):
+        return sorted([key.split('-')[-1] for key, lock in self.locks.items() if lock.release.called])
+
+    def test_error_processing_one_message(self):
+        tasks.process_messages(['outgoing1', 'broken', 'incoming', 'outgoing2'])
+        self.assertEqual(['outgoing1', 'outgoing2'], self.sent)
+        self.assertEqual(['broken', 'incoming', 'outgoing1', 'outgoing2'], self._released())
+
+    def test_outgoing_sent_when_batch_fails(self):
+        self.assertRaises(Exception, tasks.process_messages, ['outgoing1', 'broken-redis', 'outgoing2'])
+        self.assertEqual(['outgoing1'], self.sent)
+        self.assertEqual(['outgoing1'], self._released())
+
+
+class DelayProcessingTestCase(TestCase):
+
+    def test_delayed_from_now(self):
+        msg = mock.Mock(datetime_to_process=datetime(2013, 1, 1))
+        before = datetime.utcnow()
+        tasks.delay_processing(msg, 5)
+        self.assertTrue(msg.datetime_to_process >= before + timedelta(minutes=5))
+        msg.save.assert_called_once_with()
+
+
+NOW = datetime(2013, 1, 1, 12, 0)
+
+
+def _entries(count, start=0):
+    return [{'id': 'msg%d' % i, 'key': json_format_datetime(NOW)} for i in range(start, start + count)]
+
+
+class HighWaterMarkTestCase(TestCase):
+
+    def setUp(self):
+        self.operation = SMSEnqueuingOperation()
+        self.db = mock.Mock()
+        self.patches = [
+            mock.patch.object(run_sms_queue.SMSLog, 'get_db', return_value=self.db),
+            mock.patch.object(run_sms_queue, 'QUEUE_PAGE_SIZE', 2),
+            mock.patch.object(SMSEnqueuingOperation, 'get_enqueuing_timeout', return_value=60),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _read(self, utcnow, pages):
+        self.db.reset_mock()
+        self.db.view.return_value.all.side_effect = pages
+        entries = list(self.operation.get_items_to_be_processed(utcnow))
+        return entries, [call[1] for call in self.db.view.call_args_list]
+
+    def test_paging(self):
+        entries, calls = self._read(NOW, [_entries(2), _entries(1, start=2)])
+        self.assertEqual(['msg0', 'msg1', 'msg2'], [entry['id'] for entry in entries])
+        self.assertEqual('1970-01-01T00:00:00Z', calls[0]['startkey'])
+        self.assertEqual(json_format_datetime(NOW), calls[0]['endkey'])
+        # the next page starts after the last entry of the previous one
+        self.assertEqual((json_format_datetime(NOW), 'msg1', 1),
+                         (calls[1]['startkey'], calls[1]['startkey_docid'], calls[1]['skip']))
+        self.assertEqual(NOW, self.operation.high_water_mark)
+
+    def test_incremental(self):
+        self._read(NOW, [[]])
+        later = NOW + timedelta(minutes=10)
+        _, calls = self._read(later, [[]])
+        self.assertEqual(json_format_datetime(NOW - HIGH_WATER_MARK_OVERLAP), calls[0]['startkey'])
+        self.assertEqual(later, self.operation.high_water_mark)
+
+    def test_full_scan(self):
+        self._read(NOW, [[]])
+        _, calls = self._read(NOW + timedelta(minutes=60), [[]])
+        self.assertEqual('1970-01-01T00:00:00Z', calls[0]['startkey'])
+
+    def test_mark_not_moved_on_error(self):
+        self._read(NOW, [[]])
+        self.db.view.return_value.all.side_effect = Exception('couch went away')
+        self.assertRaises(Exception, list, self.operation.get_items_to_be_processed(NOW + timedelta(minutes=10)))
+        self.assertEqual(NOW, self.operation.high_water_mark)
+
+
+class EnqueueBatchTestCase(TestCase):
+
+    def setUp(self):
+        self.operation = SMSEnqueuingOperation()
+        self.client = mock.Mock()
+        self.pipe = self.client.pipeline.return_value
+        self.patches = [
+            mock.patch.object(SMSEnqueuingOperation, 'get_enqueuing_timeout', return_value=60),
+            mock.patch.object(SMSEnqueuingOperation, 'enqueue_items'),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def _lock_key(self, entry):
+        return self.operation.get_enqueuing_lock_key(entry['id'], entry['key'])
+
+    def test_locked_items_enqueued(self):
+        entries = _entries(3)
+        # msg1 is already locked by an earlier run
+        self.pipe.execute.return_value = [True, None, True]
+        acquired = self.operation.enqueue_batch(entries, redis_client=self.client)
+        self.assertEqual([entries[0], entries[2]], acquired)
+        self.assertEqual([self._lock_key(entry) for entry in entries],
+                         [call[0][0] for call in self.pipe.set.call_args_list])
+        for call in self.pipe.set.call_args_list:
+            self.assertEqual({'ex': 60 * 60, 'nx': True}, call[1])
+        # one round trip to redis for the whole batch
+        self.assertEqual(1, self.pipe.execute.call_count)
+        SMSEnqueuingOperation.enqueue_items.assert_called_once_with(['msg0', 'msg2'])
+        self.assertFalse(self.pipe.delete.called)
+
+    def test_nothing_locked(self):
+        self.pipe.execute.return_value = [None, None]
+        self.assertEqual([], self.operation.enqueue_batch(_entries(2), redis_client=self.client))
+        self.assertFalse(SMSEnqueuingOperation.enqueue_items.called)
+
+    def test_locks_released_when_enqueuing_fails(self):
+        entries = _entries(3)
+        self.pipe.execute.return_value = [True, None, True]
+        SMSEnqueuingOperation.enqueue_items.side_effect = Exception('broker went away')
+        self.assertRaises(Exception, self.operation.enqueue_batch, entries, redis_client=self.client)
+        self.assertEqual([self._lock_key(entries[0]), self._lock_key(entries[2])],
+                         [call[0][0] for call in self.pipe.delete.call_args_list])
+        self.assertEqual(2, self.pipe.execute.call_count)
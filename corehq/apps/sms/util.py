@@ -1,9 +1,13 @@
 import logging
 import re
+import time
 import urllib
 import uuid
 import datetime
 
+import requests
+from redis_cache.cache import RedisCache
+from dimagi.utils.couch.cache import cache_core
 from dimagi.utils.couch.database import get_db
 from corehq.apps.users.models import CouchUser
 from django.template.loader import render_to_string
@@ -204,3 +208,64 @@ def get_contact(contact_id):
             raise Exception("Unkown contact type for contact %s" % contact_id)
     return contact
 
+
+OUTBOUND_HTTP_TIMEOUT = 60
+
+_http_session = None
+
+def get_http_session():
+    """
+    A requests session shared by the process, so that outbound sms
+    requests reuse keep-alive connections to the gateways instead of
+    opening a new one per message.
+    """
+    global _http_session
+    if _http_session is None:
+        _http_session = requests.Session()
+    return _http_session
+
+def http_get(url, params=None):
+    response = get_http_session().get(url, params=params, timeout=OUTBOUND_HTTP_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+def http_post(url, data=None):
+    """
+    data - the url encoded request body
+    """
+    response = get_http_session().post(url, data=data, timeout=OUTBOUND_HTTP_TIMEOUT,
+        headers={"Content-Type": "application/x-www-form-urlencoded"})
+    response.raise_for_status()
+    return response.content
+
+def get_redis_client():
+    """
+    The raw redis client, or None if redis isn't the configured cache.
+    """
+    rcache = cache_core.get_redis_default_cache()
+    if not isinstance(rcache, RedisCache):
+        return None
+    try:
+        return rcache.raw_client
+    except NotImplementedError:
+        return None
+
+def wait_for_rate_limit(key, max_per_second):
+    """
+    Blocks until one more event for key fits within max_per_second,
+    counted across all processes in redis. Does nothing without redis.
+    """
+    client = get_redis_client()
+    if client is None:
+        return
+    while True:
+        now = time.time()
+        second = int(now)
+        counter_key = "rate-limit-%s-%s" % (key, second)
+        pipe = client.pipeline(transaction=False)
+        pipe.incr(counter_key)
+        pipe.expire(counter_key, 2)
+        count = pipe.execute()[0]
+        if count <= max_per_second:
+            return
+        time.sleep(second + 1 - now)
@@ -1,7 +1,6 @@
 import logging
 from urllib import urlencode
-from urllib2 import urlopen
-from corehq.apps.sms.util import create_billable_for_sms, clean_phone_number
+from corehq.apps.sms.util import create_billable_for_sms, clean_phone_number, http_get
 from corehq.apps.sms.mixin import SMSBackend
 from couchdbkit.ext.django.schema import *
 from corehq.apps.tropo.forms import TropoBackendForm
@@ -36,7 +35,7 @@ class TropoBackend(SMSBackend):
             "_send_sms" : "true",
         })
         url = "https://api.tropo.com/1.0/sessions?%s" % params
-        response = urlopen(url).read()
+        response = http_get(url)
 
         create_billable_for_sms(msg, TropoBackend.get_api_id(), delay=delay, response=response)
 
@@ -26,8 +26,16 @@ class TwilioBackend(SMSBackend):
     def get_form_class(cls):
         return TwilioBackendForm
 
+    _client = None
+
+    def get_client(self):
+        # reused for every message this backend object sends
+        if self._client is None:
+            self._client = TwilioRestClient(self.account_sid, self.auth_token)
+        return self._client
+
     def send(self, msg, *args, **kwargs):
-        client = TwilioRestClient(self.account_sid, self.auth_token)
+        client = self.get_client()
         to = msg.phone_number
         from_ = clean_phone_number(self.phone_number)
         body = msg.text
@@ -1,10 +1,9 @@
 from datetime import datetime, date, timedelta
 import logging
-from corehq.apps.sms.util import clean_phone_number, clean_outgoing_sms_text, create_billable_for_sms
+from corehq.apps.sms.util import clean_phone_number, clean_outgoing_sms_text, create_billable_for_sms, http_get
 from corehq.apps.sms.api import incoming
 from corehq.apps.sms.mixin import SMSBackend
 from django.conf import settings
-from urllib2 import urlopen
 from urllib import urlencode
 import pytz
 from couchdbkit.ext.django.schema import *
@@ -77,7 +76,7 @@ class UnicelBackend(SMSBackend):
             params.append((OutboundParams.MESSAGE, encoded))
 
         try:
-            data = urlopen('%s?%s' % (OUTBOUND_URLBASE, urlencode(params))).read()
+            data = http_get('%s?%s' % (OUTBOUND_URLBASE, urlencode(params)))
         except Exception:
             data = None
 
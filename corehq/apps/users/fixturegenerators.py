@@ -1,8 +1,10 @@
 """
 Generate user-based fixtures used in OTA restore
 """
+from corehq.apps.ota.instrumentation import instrumented_fixture_generator
 
 
+@instrumented_fixture_generator
 def user_groups(user, version, last_sync):
     """
     For a given user, return a fixture containing all the groups
@@ -1,4 +1,5 @@
 import copy
+from itertools import islice
 from urllib import unquote
 import rawes
 from django.conf import settings
@@ -263,17 +264,61 @@ def es_wrapper(index, domain=None, q=None, doc_type=None, fields=None,
     return hits
 
 
-def stream_es_query(chunksize=100, **kwargs):
+SCROLL_KEEPALIVE = '5m'
+
+
+def stream_es_query(chunksize=100, scroll=SCROLL_KEEPALIVE, **kwargs):
+    """
+    Iterates over the hits of an es_query (takes the same arguments) using
+    a scroll, so every batch costs the same however deep into the results
+    it is, and the hits all come from one snapshot of the index.
+
+    chunksize is the number of hits fetched per request (per shard for
+    unsorted queries, which use a scan and skip scoring and sorting).
+    size caps the total number of hits, and fields limits what is fetched
+    for each hit to those fields.
+    """
     size = kwargs.pop("size", None)
     kwargs.pop("start_at", None)
     kwargs["size"] = chunksize
-    for i in range(0, size or SIZE_LIMIT, chunksize):
-        kwargs["start_at"] = i
-        res = es_query(**kwargs)
-        if not res["hits"]["hits"]:
-            return
-        for hit in res["hits"]["hits"]:
-            yield hit
+    es_url = kwargs.pop("es_url", None) or DOMAIN_INDEX + '/hqdomain/_search'
+    q = es_query(dict_only=True, **kwargs)
+
+    params = {"scroll": scroll}
+    if not q.get("sort"):
+        params["search_type"] = "scan"
+
+    es = get_es()
+
+    def _check(res):
+        if 'error' in res:
+            raise ESError(res['error'])
+        return res
+
+    def _hits():
+        scroll_id = None
+        try:
+            res = _check(es.get(es_url, params=params, data=q))
+            scroll_id = res.get("_scroll_id")
+            for hit in res["hits"]["hits"]:
+                yield hit
+            while True:
+                res = _check(es.get('_search/scroll', params={"scroll": scroll}, data=scroll_id))
+                scroll_id = res.get("_scroll_id", scroll_id)
+                if not res["hits"]["hits"]:
+                    return
+                for hit in res["hits"]["hits"]:
+                    yield hit
+        finally:
+            # free the scroll's search contexts now rather than when the
+            # keepalive runs out, whether we finished, stopped early or failed
+            if scroll_id:
+                try:
+                    es.delete('_search/scroll', data=scroll_id)
+                except Exception:
+                    pass
+
+    return islice(_hits(), size)
 
 
 def parse_args_for_es(request, prefix=None):
@@ -1,10 +1,33 @@
+import logging
+import threading
+from pillowtop.couchdb import CachedCouchDB
 from pillowtop.listener import AliasedElasticPillow
 from dimagi.utils.decorators.memoized import memoized
 from django.conf import settings
 
 
+pillow_logging = logging.getLogger("pillowtop")
+
+
 VALUE_TAG = '#value'
 
+
+class BulkIndexError(Exception):
+    pass
+
+
+def get_bulk_errors(response):
+    """
+    The items of an elastic _bulk response that failed. The request as a
+    whole succeeds even when some (or all) of its docs are rejected.
+    """
+    errors = []
+    for item in response.get('items', []):
+        for result in item.values():
+            if result.get('error'):
+                errors.append(result)
+    return errors
+
 def map_types(item, mapping, override_root_keys=None):
     if isinstance(item, dict):
         return convert_property_dict(item, mapping, override_root_keys=override_root_keys)
@@ -18,21 +41,25 @@ def convert_property_dict(sub_dict, mapping, override_root_keys=None):
     For mapping out ALL nested properties on cases, convert everything to a dict so as to
     prevent string=>object and object=>string mapping errors.
 
-    sub_dict: the doc dict you want to modify in place before sending to ES
+    sub_dict: the doc dict you want to convert before sending to ES. It is not modified,
+        a converted copy is returned that shares any untouched values with sub_dict
     mapping: The mapping at the level of the properties you are at - originally passing as the default mapping of the pillow
     override_root_keys: a list of keys you want explicitly skipped at the root level and are not recursed down
     """
     mapping = mapping or {}
     override_root_keys = override_root_keys or []
+    properties = mapping.get('properties', {})
 
-    for k, v in sub_dict.items():
-        if k in mapping.get('properties', {}) or k in override_root_keys:
-            continue
-        dynamic_mapping = mapping.get('dynamic', True)
-        sub_mapping = mapping.get('properties', {}).get(k, {})
-        if dynamic_mapping is not False:
-            sub_dict[k] = map_types(v, sub_mapping, override_root_keys=override_root_keys)
-    return sub_dict
+    if mapping.get('dynamic', True) is False:
+        return dict(sub_dict)
+
+    converted = {}
+    for k, v in sub_dict.iteritems():
+        if k in properties or k in override_root_keys:
+            converted[k] = v
+        else:
+            converted[k] = map_types(v, {}, override_root_keys=override_root_keys)
+    return converted
 
 def restore_property_dict(report_dict_item):
     """
@@ -77,8 +104,125 @@ class HQPillow(AliasedElasticPillow):
         }
     }
 
+    # Batching mode: when batch_size is set, changes from the _changes feed are
+    # accumulated and sent to ES in a single _bulk request once batch_size
+    # changes have been seen or batch_timeout seconds have passed since the
+    # first change in the batch. The checkpoint only moves after a batch is sent.
+    batch_size = 0
+    batch_timeout = 5
+
     def __init__(self, **kwargs):
         super(HQPillow, self).__init__(**kwargs)
+        self._change_batch = []
+        self._batch_lock = threading.RLock()
+        self._batch_timer = None
+        self.failed_bulk_ids = []
+
+    def processor(self, change, do_set_checkpoint=True):
+        if not self.batch_size or not do_set_checkpoint:
+            # reindexers drive the pillow directly and manage checkpoints themselves
+            return super(HQPillow, self).processor(change, do_set_checkpoint=do_set_checkpoint)
+
+        with self._batch_lock:
+            self._change_batch.append(change)
+            if len(self._change_batch) >= self.batch_size:
+                self.flush_batch()
+            elif self._batch_timer is None:
+                timer = threading.Timer(self.batch_timeout, self._flush_on_timeout)
+                timer.args = (timer,)
+                timer.daemon = True
+                self._batch_timer = timer
+                timer.start()
+
+    def _flush_on_timeout(self, timer):
+        with self._batch_lock:
+            # a size triggered flush may have already sent the batch this
+            # timer was started for while we were waiting on the lock
+            if self._batch_timer is timer:
+                self.flush_batch()
+
+    def flush_batch(self):
+        """
+        Transform and send all pending changes in one bulk request, then
+        checkpoint at the last change of the batch.
+        """
+        with self._batch_lock:
+            if self._batch_timer is not None:
+                self._batch_timer.cancel()
+                self._batch_timer = None
+            changes, self._change_batch = self._change_batch, []
+            if not changes:
+                return
+
+            self.changes_seen += len(changes)
+            try:
+                self.process_batch(changes)
+            except Exception, ex:
+                pillow_logging.exception(
+                    "[%s] Bulk send of %d changes failed, falling back to single changes: %s" % (
+                        self.__class__.__name__, len(changes), ex))
+                for change in changes:
+                    self.process_single_change(change)
+            self.set_checkpoint(changes[-1])
+
+    def process_single_change(self, change):
+        """
+        The trigger/transform/transport steps of processor() without its
+        bookkeeping, which flush_batch has already done for the batch.
+        """
+        try:
+            doc_dict = self.change_trigger(change)
+            if doc_dict is not None:
+                transformed = self.change_transform(doc_dict)
+                if transformed is not None:
+                    self.change_transport(transformed)
+        except Exception, ex:
+            pillow_logging.exception("[%s] Error processing change %s: %s" % (
+                self.__class__.__name__, change.get('id'), ex))
+
+    def process_batch(self, changes):
+        if self.include_docs:
+            self.process_bulk(changes)
+            return
+
+        # fetch all the docs in one request instead of one per change_trigger
+        couch_db = self.couch_db
+        self.couch_db = CachedCouchDB(couch_db.uri, readonly=True)
+        try:
+            self.couch_db.bulk_load([change['id'] for change in changes if not change.get('deleted')],
+                                    purge_existing=True)
+            self.process_bulk(changes)
+        finally:
+            self.couch_db = couch_db
+
+    def process_bulk(self, changes):
+        """
+        Sends the changes in one _bulk request, then re-processes one at a
+        time just the changes whose docs elastic rejected, rather than
+        failing (and resending) the whole batch.
+        """
+        self.failed_bulk_ids = []
+        super(HQPillow, self).process_bulk(changes)
+        failed_ids = set(self.failed_bulk_ids)
+        for change in changes:
+            if change['id'] in failed_ids:
+                self.process_single_change(change)
+
+    def send_bulk(self, payload):
+        """
+        Raises BulkIndexError if the request as a whole failed. Docs that
+        were rejected individually are logged and their ids left in
+        failed_bulk_ids.
+        """
+        response = self.get_es().post('_bulk', data=payload)
+        if response.get('error'):
+            raise BulkIndexError("Bulk request failed: %s" % response['error'])
+        errors = get_bulk_errors(response)
+        self.failed_bulk_ids = [error.get('_id') for error in errors]
+        if errors:
+            pillow_logging.error("[%s] %d of %d docs failed to index, first error: %s" % (
+                self.__class__.__name__, len(errors), len(response.get('items', [])), errors[0]['error']))
+        return response
 
     @memoized
     def calc_meta(self):
@@ -1,4 +1,3 @@
-import copy
 from casexml.apps.case.models import CommCareCase, CommCareCaseAction
 from corehq.pillows.mappings.case_mapping import CASE_MAPPING, CASE_INDEX
 from dimagi.utils.decorators.memoized import memoized
@@ -26,6 +25,8 @@ class CasePillow(HQPillow):
     es_index = CASE_INDEX
     default_mapping = CASE_MAPPING
 
+    batch_size = 100
+
     def change_trigger(self, changes_dict):
         doc_dict = super(CasePillow, self).change_trigger(changes_dict)
         if doc_dict['doc_type'] == 'CommCareCase-Deleted':
@@ -54,7 +55,7 @@ class CasePillow(HQPillow):
         return self.es_type
 
     def change_transform(self, doc_dict):
-        doc_ret = copy.deepcopy(doc_dict)
+        doc_ret = dict(doc_dict)
         if not doc_ret.get("owner_id"):
             if doc_ret.get("user_id"):
                 doc_ret["owner_id"] = doc_ret["user_id"]
@@ -1,4 +1,3 @@
-import copy
 from corehq.pillows.case import CasePillow
 from corehq.pillows.mappings.reportcase_mapping import REPORT_CASE_MAPPING, REPORT_CASE_INDEX
 from django.conf import settings
@@ -20,6 +19,4 @@ class ReportCasePillow(CasePillow):
         if self.get_domain(doc_dict) not in getattr(settings, 'ES_CASE_FULL_INDEX_DOMAINS', []):
             #full indexing is only enabled for select domains on an opt-in basis
             return None
-        doc_ret = copy.deepcopy(doc_dict)
-        convert_property_dict(doc_ret, self.default_mapping, override_root_keys=['_id', 'doc_type', '_rev', '#export_tag'])
-        return doc_ret
+        return convert_property_dict(doc_dict, self.default_mapping, override_root_keys=['_id', 'doc_type', '_rev', '#export_tag'])
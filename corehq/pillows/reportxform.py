@@ -1,6 +1,4 @@
-import copy
 from django.conf import settings
-from casexml.apps.case.xform import extract_case_blocks
 
 from corehq.pillows.base import convert_property_dict
 from .mappings.reportxform_mapping import REPORT_XFORM_INDEX, REPORT_XFORM_MAPPING
@@ -31,9 +29,9 @@ class ReportXFormPillow(XFormPillow):
             if domain not in getattr(settings, 'ES_XFORM_FULL_INDEX_DOMAINS', []):
                 #full indexing is only enabled for select domains on an opt-in basis
                 return None
-            convert_property_dict(doc_ret['form'], self.default_mapping['properties']['form'], override_root_keys=['case'])
+            doc_ret['form'] = convert_property_dict(doc_ret['form'], self.default_mapping['properties']['form'], override_root_keys=['case'])
             if 'computed_' in doc_ret:
-                convert_property_dict(doc_ret['computed_'], {})
+                doc_ret['computed_'] = convert_property_dict(doc_ret['computed_'], {})
 
             return doc_ret
         else:
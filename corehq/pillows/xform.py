@@ -1,6 +1,8 @@
-import copy
-from casexml.apps.case.xform import extract_case_blocks, get_case_ids_from_form
+from datetime import datetime
+import re
+from casexml.apps.case.xform import get_case_ids_from_form
 from corehq.pillows.mappings.xform_mapping import XFORM_MAPPING, XFORM_INDEX
+from corehq.util.lru import lru_memoized
 from .base import HQPillow
 from couchforms.models import XFormInstance
 from dateutil import parser
@@ -8,8 +10,39 @@ from dateutil import parser
 
 UNKNOWN_VERSION = 'XXX'
 UNKNOWN_UIVERSION = 'XXX'
+CASE_TAG = 'case'
 
-def is_valid_date(txt):
+# the common formats from corehq.pillows.core.DATE_FORMATS_ARR, which can be
+# checked without going through dateutil
+ISO_DATETIME_RE = re.compile(
+    r'^(\d{4})-(\d{2})-(\d{2})'
+    r'(?:[T ](\d{2}):(\d{2}):(\d{2})(?:\.\d{1,6})?(?:Z|[+-]\d{2}:?\d{2})?)?$'
+)
+SHORT_DATETIME_RE = re.compile(r'^(\d{2})/(\d{2})/(\d{2}) (\d{2}):(\d{2}):(\d{2})$')
+
+
+def _fast_is_valid_date(txt):
+    """
+    True if txt is one of the formats above and is a real date.
+    False means "don't know", not "invalid".
+    """
+    match = ISO_DATETIME_RE.match(txt)
+    if match:
+        year, month, day, hour, minute, second = match.groups()
+    else:
+        match = SHORT_DATETIME_RE.match(txt)
+        if not match:
+            return False
+        month, day, year, hour, minute, second = match.groups()
+        year = '20%s' % year
+    try:
+        datetime(int(year), int(month), int(day), int(hour or 0), int(minute or 0), int(second or 0))
+    except ValueError:
+        return False
+    return True
+
+
+def _parses_as_date(txt):
     try:
         if txt and parser.parse(txt):
             return True
@@ -17,6 +50,52 @@ def is_valid_date(txt):
         pass
     return False
 
+
+@lru_memoized(maxsize=10000)
+def _is_valid_date_string(txt):
+    return _fast_is_valid_date(txt) or _parses_as_date(txt)
+
+
+def is_valid_date(txt):
+    if not txt:
+        return False
+    if not isinstance(txt, basestring):
+        return _parses_as_date(txt)
+    return _is_valid_date_string(txt)
+
+def copy_case_block_paths(node, case_blocks):
+    """
+    Return node with every dict and list on the path to a case block, and the
+    case blocks themselves, replaced by shallow copies. Everything else is
+    shared with the original, so the copies can be modified without touching
+    the source document. The copied case blocks are appended to case_blocks.
+    """
+    if isinstance(node, dict):
+        copied = None
+        for key, value in node.iteritems():
+            if key == CASE_TAG and isinstance(value, dict):
+                new_value = dict(value)
+                case_blocks.append(new_value)
+            elif key == CASE_TAG and isinstance(value, list):
+                new_value = [dict(block) if isinstance(block, dict) else block for block in value]
+                case_blocks.extend(block for block in new_value if isinstance(block, dict))
+            elif isinstance(value, (dict, list)):
+                new_value = copy_case_block_paths(value, case_blocks)
+            else:
+                continue
+            if new_value is not value:
+                if copied is None:
+                    copied = dict(node)
+                copied[key] = new_value
+        return copied if copied is not None else node
+    elif isinstance(node, list):
+        new_list = [copy_case_block_paths(item, case_blocks) for item in node]
+        if any(new_item is not item for new_item, item in zip(new_list, node)):
+            return new_list
+        return node
+    return node
+
+
 class XFormPillow(HQPillow):
     document_class = XFormInstance
     couch_filter = "couchforms/xforms"
@@ -29,6 +108,8 @@ class XFormPillow(HQPillow):
     #for simplicity, the handlers are managed on the domain level
     handler_domain_map = {}
 
+    batch_size = 100
+
     #type level mapping
     default_mapping = XFORM_MAPPING
 
@@ -41,19 +122,24 @@ class XFormPillow(HQPillow):
             #going through with indexing this xform
             return None
         else:
-            doc_ret = copy.deepcopy(doc_dict)
+            # only copy the parts of the doc we rewrite, the rest is shared with doc_dict
+            doc_ret = dict(doc_dict)
+            case_blocks = []
+            form = doc_ret['form'] = copy_case_block_paths(doc_dict['form'], case_blocks)
+            if form is doc_dict['form']:
+                form = doc_ret['form'] = dict(form)
 
-            if 'meta' in doc_ret['form']:
-                if not is_valid_date(doc_ret['form']['meta'].get('timeEnd', None)):
-                    doc_ret['form']['meta']['timeEnd'] = None
-                if not is_valid_date(doc_ret['form']['meta'].get('timeStart', None)):
-                    doc_ret['form']['meta']['timeStart'] = None
+            if 'meta' in form:
+                meta = form['meta'] = dict(form['meta'])
+                if not is_valid_date(meta.get('timeEnd', None)):
+                    meta['timeEnd'] = None
+                if not is_valid_date(meta.get('timeStart', None)):
+                    meta['timeStart'] = None
 
                 # Some docs have their @xmlns and #text here
-                if isinstance(doc_ret['form']['meta'].get('appVersion'), dict):
-                    doc_ret['form']['meta']['appVersion'] = doc_ret['form']['meta']['appVersion'].get('#text')
+                if isinstance(meta.get('appVersion'), dict):
+                    meta['appVersion'] = meta['appVersion'].get('#text')
 
-            case_blocks = extract_case_blocks(doc_ret)
             for case_dict in case_blocks:
                 for date_modified_key in ['date_modified', '@date_modified']:
                     if not is_valid_date(case_dict.get(date_modified_key, None)):
@@ -0,0 +1,41 @@
+def paginate_view(db, view_name, chunk_size, cursor=None, **view_kwargs):
+    """
+    Iterate over every row of a couch view using keyset pagination.
+
+    Rather than paging with an ever growing `skip`, each request starts at
+    the (key, docid) of the last row returned, so every page costs the same
+    no matter how deep into the view we are.
+
+    If `cursor` is supplied (a dict with `startkey` and `startkey_docid`)
+    iteration resumes at the row immediately after it.
+    """
+    view_kwargs = dict(view_kwargs)
+    if 'key' in view_kwargs:
+        key = view_kwargs.pop('key')
+        view_kwargs['startkey'] = key
+        view_kwargs['endkey'] = key
+
+    skip = 0
+    if cursor:
+        view_kwargs['startkey'] = cursor['startkey']
+        view_kwargs['startkey_docid'] = cursor['startkey_docid']
+        skip = 1
+
+    while True:
+        view_chunk = list(db.view(
+            view_name,
+            reduce=False,
+            limit=chunk_size,
+            skip=skip,
+            **view_kwargs
+        ))
+        for item in view_chunk:
+            yield item
+
+        if len(view_chunk) < chunk_size:
+            break
+
+        last = view_chunk[-1]
+        view_kwargs['startkey'] = last['key']
+        view_kwargs['startkey_docid'] = last['id']
+        skip = 1
@@ -0,0 +1,117 @@
+from calendar import timegm
+import hashlib
+import re
+from django.utils.http import http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+BYTE_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def stream_etag(stream):
+    """
+    md5 of the contents of a seekable stream, read in chunks
+    """
+    stream.seek(0)
+    md5 = hashlib.md5()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), ''):
+        md5.update(chunk)
+    return md5.hexdigest()
+
+
+def parse_byte_range(range_header, length):
+    """
+    The (first, last) byte positions requested by a Range header with a
+    single byte range, or None if the header should be ignored (missing,
+    malformed or asking for several ranges). Raises ValueError if the
+    range can't be satisfied.
+    """
+    match = BYTE_RANGE_RE.match((range_header or '').strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # suffix range: the last N bytes
+        suffix = int(last)
+        if not suffix:
+            raise ValueError("Empty suffix range")
+        return max(length - suffix, 0), length - 1
+    first = int(first)
+    last = min(int(last), length - 1) if last else length - 1
+    if first >= length or last < first:
+        raise ValueError("Unsatisfiable range")
+    return first, last
+
+
+def iter_stream(stream, start, length):
+    stream.seek(start)
+    while length > 0:
+        chunk = stream.read(min(CHUNK_SIZE, length))
+        if not chunk:
+            return
+        length -= len(chunk)
+        yield chunk
+
+
+def _is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        etags = [tag.strip() for tag in if_none_match.split(',')]
+        return etag in etags or '*' in etags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return bool(last_modified and if_modified_since and
+                timegm(last_modified.utctimetuple()) <= if_modified_since)
+
+
+def _range_applies(request, etag):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    # a date in If-Range can't be compared byte for byte, so treat it as stale
+    return not if_range or if_range.strip() == etag
+
+
+def conditional_file_response(request, response, stream, etag=None, last_modified=None):
+    """
+    Fills in `response`, a StreamingHttpResponse whose content type and
+    disposition are already set, with the contents of a seekable `stream`,
+    honoring If-None-Match, If-Modified-Since and single byte Range requests
+    so that clients can skip unchanged files and resume interrupted
+    downloads.
+
+    `etag` should be a hash of the content; it is computed from the
+    stream if not given. The content is streamed from `stream` rather
+    than copied into the response.
+    """
+    if etag is None:
+        etag = stream_etag(stream)
+    etag = '"%s"' % etag
+    stream.seek(0, 2)
+    length = stream.tell()
+
+    response['ETag'] = etag
+    response['Accept-Ranges'] = 'bytes'
+    if last_modified:
+        response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+
+    if _is_not_modified(request, etag, last_modified):
+        response.status_code = 304
+        return response
+
+    byte_range = None
+    if request.META.get('HTTP_RANGE') and _range_applies(request, etag):
+        try:
+            byte_range = parse_byte_range(request.META['HTTP_RANGE'], length)
+        except ValueError:
+            response.status_code = 416
+            response['Content-Range'] = 'bytes */%d' % length
+            return response
+
+    if byte_range:
+        first, last = byte_range
+        response.status_code = 206
+        response['Content-Range'] = 'bytes %d-%d/%d' % (first, last, length)
+    else:
+        first, last = 0, length - 1
+    response['Content-Length'] = last - first + 1
+    response.streaming_content = iter_stream(stream, first, last - first + 1)
+    return response
@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import functools
+
+
+class LRUCache(object):
+    """
+    A dict-like cache that holds at most `maxsize` items, evicting the least
+    recently used item when full.
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def set(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+def lru_memoized(maxsize=1000):
+    """
+    Like memoized, but only remembers the `maxsize` most recently used
+    results. Only positional, hashable arguments are supported.
+    """
+    def decorator(fn):
+        cache = LRUCache(maxsize)
+        missing = object()
+
+        @functools.wraps(fn)
+        def _inner(*args):
+            value = cache.get(args, missing)
+            if value is missing:
+                value = fn(*args)
+                cache.set(args, value)
+            return value
+        _inner.cache = cache
+        return _inner
+    return decorator
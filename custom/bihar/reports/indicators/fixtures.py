@@ -2,6 +2,7 @@ from xml.etree import ElementTree
 from django.utils import translation
 from django.utils.translation import ugettext as _
 from corehq.apps.groups.models import Group
+from corehq.apps.ota.instrumentation import instrumented_fixture_generator
 from corehq.apps.users.models import CommCareUser
 from custom.bihar import BIHAR_DOMAINS
 from custom.bihar.reports.indicators.indicators import IndicatorDataProvider, IndicatorConfig, INDICATOR_SETS
@@ -13,6 +14,7 @@ hard_coded_group_filter = lambda group: bool((group.metadata or {}).get('awc-cod
 hard_coded_fixture_id = 'indicators:bihar-supervisor'
 
 
+@instrumented_fixture_generator
 def generator(user, version, last_sync):
     # todo: this appears in the beginning of all fixture generators. should fix
     if isinstance(user, CommCareUser):
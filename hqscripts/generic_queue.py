@@ -1,9 +1,12 @@
 from datetime import datetime
+import logging
+import time
 from time import sleep
 from optparse import make_option
 from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from dimagi.utils.parsing import string_to_datetime, json_format_datetime
+from dimagi.utils.chunked import chunked
 from dimagi.utils.couch.cache import cache_core
 from dimagi.utils.logging import notify_exception
 from redis_cache.cache import RedisCache
@@ -43,23 +46,60 @@ class GenericEnqueuingOperation(BaseCommand):
     def populate_queue(self):
         client = self.get_redis_client()
         utcnow = datetime.utcnow()
+        start = time.time()
+        scanned = 0
+        enqueued = []
         entries = self.get_items_to_be_processed(utcnow)
-        for entry in entries:
-            item_id = entry["id"]
-            process_datetime_str = entry["key"]
-            self.enqueue(item_id, process_datetime_str, redis_client=client)
+        for batch in chunked(entries, self.get_batch_size()):
+            batch = list(batch)
+            scanned += len(batch)
+            enqueued.extend(self.enqueue_batch(batch, redis_client=client))
+        self.log_stats(utcnow, scanned, enqueued, time.time() - start)
 
     def enqueue(self, item_id, process_datetime_str, redis_client=None):
+        self.enqueue_batch([{"id": item_id, "key": process_datetime_str}],
+            redis_client=redis_client)
+
+    def enqueue_batch(self, entries, redis_client=None):
+        """
+        Acquires the enqueuing locks for a batch of view entries in one
+        pipelined round trip to redis, then enqueues the items whose lock
+        was acquired. Returns those entries.
+        """
         client = redis_client or self.get_redis_client()
-        queue_name = self.get_queue_name()
-        enqueuing_lock = self.get_enqueuing_lock(client,
-            "%s-enqueuing-%s-%s" % (queue_name, item_id, process_datetime_str))
-        if enqueuing_lock.acquire(blocking=False):
+        lock_timeout = self.get_enqueuing_timeout() * 60
+        pipe = client.pipeline(transaction=False)
+        for entry in entries:
+            # The value mirrors redis-py's Lock (the time it expires at),
+            # and the TTL lets redis expire it by itself.
+            pipe.set(self.get_enqueuing_lock_key(entry["id"], entry["key"]),
+                time.time() + lock_timeout + 1, ex=lock_timeout, nx=True)
+        acquired = [entry for entry, locked in zip(entries, pipe.execute())
+                    if locked]
+        if acquired:
             try:
-                self.enqueue_item(item_id)
+                self.enqueue_items([entry["id"] for entry in acquired])
             except:
-                # We couldn't enqueue, so release the lock
-                enqueuing_lock.release()
+                # We couldn't enqueue, so release the locks
+                pipe = client.pipeline(transaction=False)
+                for entry in acquired:
+                    pipe.delete(self.get_enqueuing_lock_key(entry["id"], entry["key"]))
+                pipe.execute()
+                raise
+        return acquired
+
+    def log_stats(self, utcnow, scanned, enqueued, duration):
+        if not enqueued:
+            return
+        latencies = []
+        for entry in enqueued:
+            latency = utcnow - string_to_datetime(entry["key"]).replace(tzinfo=None)
+            latencies.append(max(latency.days * 86400 + latency.seconds, 0))
+        logging.info("%s: scanned %d items and enqueued %d in %.2fs "
+            "(%.0f/s), seconds past due: mean %d, max %d" % (
+            self.get_queue_name(), scanned, len(enqueued), duration,
+            len(enqueued) / max(duration, 0.001),
+            sum(latencies) / len(latencies), max(latencies)))
 
     def get_redis_client(self):
         rcache = cache_core.get_redis_default_cache()
@@ -71,9 +111,13 @@ class GenericEnqueuingOperation(BaseCommand):
             raise RedisClientError("Could not get redis connection.")
         return client
 
-    def get_enqueuing_lock(self, client, key):
-        lock_timeout = self.get_enqueuing_timeout() * 60
-        return client.lock(key, timeout=lock_timeout)
+    def get_enqueuing_lock_key(self, item_id, process_datetime_str):
+        return "%s-enqueuing-%s-%s" % (self.get_queue_name(), item_id,
+            process_datetime_str)
+
+    def get_batch_size(self):
+        """The number of items to lock and enqueue at a time."""
+        return 500
 
     def get_queue_name(self):
         """Should return the name of this queue. Used for acquiring the
@@ -87,12 +131,13 @@ class GenericEnqueuingOperation(BaseCommand):
         raise NotImplementedError("This method must be implemented.")
 
     def get_items_to_be_processed(self, utcnow):
-        """Should return the couch query result containing the items to be
-        enqueued. The result should just have the id of the item to be 
-        processed and the key from the couch view for each item. The couch 
-        view should emit a single value, which should be the timestamp that
-        the item should be processed. Since this just returns ids and keys, 
-        no limiting is necessary.
+        """Should return the couch query result (or any iterable of its
+        rows) containing the items to be enqueued. The result should just
+        have the id of the item to be processed and the key from the couch
+        view for each item. The couch view should emit a single value, which
+        should be the timestamp that the item should be processed. Rows are
+        consumed in batches of get_batch_size(), so this can be a generator
+        that pages through the view.
         utcnow - The current timestamp, in utc, at the time of the method's
             call. Retrieve all items to be processed before this timestamp."""
         raise NotImplementedError("This method must be implemented.")
@@ -102,6 +147,13 @@ class GenericEnqueuingOperation(BaseCommand):
         _id - The couch document _id of the item that is being referenced."""
         raise NotImplementedError("This method must be implemented.")
 
+    def enqueue_items(self, item_ids):
+        """Enqueues a batch of items. Override this to publish them more
+        efficiently than one enqueue_item() call at a time.
+        item_ids - The couch document _ids of the items being referenced."""
+        for item_id in item_ids:
+            self.enqueue_item(item_id)
+
     def use_queue(self):
         """If this is False, the handle() method will do nothing and return."""
         return True
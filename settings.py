@@ -423,6 +423,10 @@ FIXTURE_GENERATORS = [
     "corehq.apps.commtrack.models.product_fixture_generator",
 ]
 
+# fraction of OTA restores whose timings (overall and per fixture
+# generator) are recorded, see corehq.apps.ota.instrumentation
+RESTORE_TIMING_SAMPLE_RATE = 0.01
+
 GET_URL_BASE = 'dimagi.utils.web.get_url_base'
 
 SMS_GATEWAY_URL = "http://localhost:8001/"
@@ -492,6 +496,11 @@ SMS_QUEUE_ENQUEUING_TIMEOUT = 60
 # Number of minutes a celery task will alot for itself (via lock timeout)
 SMS_QUEUE_PROCESSING_LOCK_TIMEOUT = 5
 
+# Number of SMS the enqueuer passes to each celery task. Outbound messages
+# in a task are sent together, so keep this small enough for the task to
+# finish within the lock timeout at the slowest backend's rate limit.
+SMS_QUEUE_PROCESSING_BATCH_SIZE = 50
+
 # Number of minutes to wait before retrying an unsuccessful processing attempt
 # for a single SMS
 SMS_QUEUE_REPROCESS_INTERVAL = 5
@@ -507,6 +516,10 @@ SMS_QUEUE_DOMAIN_RESTRICTED_RETRY_INTERVAL = 15
 # messages will not be processed.
 SMS_QUEUE_STALE_MESSAGE_DURATION = 7 * 24
 
+# Number of seconds to wait after a case is saved before re-evaluating its
+# reminders, so that several saves of the same case are evaluated once.
+REMINDERS_CASE_CHANGED_DELAY = 5
+
 #auditcare parameters
 AUDIT_MODEL_SAVE = [
     'corehq.apps.app_manager.Application',